@@ -0,0 +1,253 @@
+import argparse
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, Iterator, Optional
+import numpy as np
+from model_registry import model_fingerprint
+from ecg_pipeline import BeatSegmenter, InputSpec, decode_predictions
+
+RAW_EXTENSIONS = ('.f32', '.bin', '.raw')
+TOKEN_SPLIT = re.compile(rb'[\s,;]+')
+
+# Set in pool worker processes only (see _load_worker_model)
+_worker_model = None
+_worker_spec = None
+
+
+def iter_recording(path: str, chunk_samples: int = 1 << 20, column: int = 0,
+                   raw_dtype: str = 'float32') -> Iterator[np.ndarray]:
+    """
+    Yield a recording as float32 chunks without holding the whole file in memory.
+    Supports .npy and raw binary (memory-mapped), .csv (one column) and plain
+    text with comma/whitespace separated values such as sample_ecg_data.txt.
+    """
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in ('.npy',) + RAW_EXTENSIONS:
+        if extension == '.npy':
+            signal = np.load(path, mmap_mode='r')
+        else:
+            signal = np.memmap(path, dtype=raw_dtype, mode='r')
+        if signal.ndim > 1:
+            signal = signal[:, column]
+        for start in range(0, len(signal), chunk_samples):
+            yield np.asarray(signal[start:start + chunk_samples], dtype=np.float32)
+
+    elif extension == '.csv':
+        values = []
+        with open(path) as f:
+            for line in f:
+                fields = line.split(',')
+                try:
+                    values.append(float(fields[column]))
+                except (ValueError, IndexError):
+                    continue  # header or blank line
+                if len(values) >= chunk_samples:
+                    yield np.asarray(values, dtype=np.float32)
+                    values = []
+        if values:
+            yield np.asarray(values, dtype=np.float32)
+
+    else:
+        leftover = b''
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(chunk_samples * 8)
+                if not block:
+                    break
+                tokens = TOKEN_SPLIT.split(leftover + block)
+                # The last token may be cut in half by the block boundary
+                leftover = tokens.pop()
+                tokens = [t for t in tokens if t]
+                if tokens:
+                    yield np.array(tokens, dtype=np.float32)
+        if leftover.strip():
+            yield np.array([leftover], dtype=np.float32)
+
+
+def _load_model(model_path: str):
+    from model_loader import load_model
+    model = load_model(model_path)
+    return model, InputSpec.for_model(model, model_path)
+
+
+def _load_worker_model(model_path: str) -> None:
+    global _worker_model, _worker_spec
+    _worker_model, _worker_spec = _load_model(model_path)
+
+
+def _get_worker_spec() -> InputSpec:
+    return _worker_spec
+
+
+def _predict_windows(model, spec: InputSpec, windows: np.ndarray, batch_size: int = 1024) -> np.ndarray:
+    return model.predict(spec.prepare(windows), batch_size=batch_size, verbose=0)
+
+
+def _worker_predict(windows: np.ndarray, batch_size: int = 1024) -> np.ndarray:
+    return _predict_windows(_worker_model, _worker_spec, windows, batch_size)
+
+
+def classify_recording(path: Optional[str], model_path: str = 'arrhythmia_detection_model1.h5',
+                       threshold: Optional[float] = None, batch_size: int = 1024, workers: int = 1,
+                       chunk_samples: int = 1 << 20, column: int = 0, raw_dtype: str = 'float32',
+                       progress: Optional[Callable[[int, int], None]] = None,
+                       chunks: Optional[Iterable[np.ndarray]] = None, loaded=None) -> dict:
+    """
+    Segment and classify a whole recording; returns per-beat arrays and timing.
+    `chunks` replaces reading `path` with samples already at the model's rate.
+    Window length, trigger and labels come from the model's InputSpec.
+    `loaded` is an already loaded ModelVersion (e.g. MODELS.active) to use
+    instead of reading model_path; the run keeps it even if another version
+    is installed meanwhile.
+    """
+    pool = model = None
+    if loaded is not None:
+        model_path, spec, version = loaded.path, loaded.spec, loaded.version
+    if workers > 1:
+        # Spawned, not forked: TensorFlow is not fork-safe. The parent never
+        # loads the model; segmentation takes the spec from a worker.
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_load_worker_model, initargs=(model_path,))
+        if loaded is None:
+            spec = pool.submit(_get_worker_spec).result()
+    elif loaded is not None:
+        model = loaded.model
+    else:
+        model, spec = _load_model(model_path)
+    if loaded is None:
+        version = model_fingerprint(model_path)
+    if spec.leads > 1:
+        if pool:
+            pool.shutdown()
+        raise ValueError(f"Batch classification reads single-lead recordings; the model expects {spec.leads} leads")
+    segmenter = BeatSegmenter(spec.threshold if threshold is None else threshold, spec.window, spec.peak_index)
+    starts, probabilities = [], []
+    samples = 0
+    beats_done = 0
+    started = time.perf_counter()
+
+    def segmented() -> Iterator[np.ndarray]:
+        nonlocal samples
+        pending_starts, pending = [], []
+        pending_count = 0
+        source = chunks if chunks is not None else iter_recording(path, chunk_samples, column, raw_dtype)
+        for chunk in source:
+            samples += len(chunk)
+            chunk_starts, windows = segmenter.feed(chunk)
+            if len(windows):
+                pending_starts.append(chunk_starts)
+                pending.append(windows)
+                pending_count += len(windows)
+            # Hand the model large batches rather than one per file chunk
+            if pending_count >= batch_size:
+                starts.append(np.concatenate(pending_starts))
+                yield np.concatenate(pending)
+                pending_starts, pending, pending_count = [], [], 0
+        if pending:
+            starts.append(np.concatenate(pending_starts))
+            yield np.concatenate(pending)
+
+    def record(result: np.ndarray) -> None:
+        nonlocal beats_done
+        probabilities.append(result)
+        beats_done += len(result)
+        if progress:
+            progress(beats_done, samples)
+
+    if pool:
+        predict = partial(_worker_predict, batch_size=batch_size)
+        with pool:
+            # Keep a bounded number of batches in flight so memory stays flat
+            in_flight = deque()
+            for windows in segmented():
+                in_flight.append(pool.submit(predict, windows))
+                if len(in_flight) >= 2 * workers:
+                    record(in_flight.popleft().result())
+            while in_flight:
+                record(in_flight.popleft().result())
+    else:
+        for windows in segmented():
+            record(_predict_windows(model, spec, windows, batch_size))
+
+    elapsed = time.perf_counter() - started
+    if probabilities:
+        probabilities = np.concatenate(probabilities)
+        beat_starts = np.concatenate(starts)
+    else:
+        probabilities = np.empty((0, len(spec.classes)), dtype=np.float32)
+        beat_starts = np.empty(0, dtype=np.int64)
+
+    labels, confidence = decode_predictions(probabilities) if len(probabilities) else (
+        np.empty(0, dtype=np.uint8), np.empty(0, dtype=np.float32))
+
+    return {
+        'beat_start': beat_starts,
+        'label': labels,
+        'confidence': confidence.astype(np.float16),
+        'probabilities': probabilities.astype(np.float16),
+        'samples': samples,
+        'elapsed': elapsed,
+        'class_names': spec.classes,
+        'model_version': version
+    }
+
+
+def write_results(result: dict, output: str) -> None:
+    """Write per-beat results as compressed .npz, or .csv when asked for one"""
+    labels = result['class_names']
+    class_names = np.array([labels.get(i, str(i)) for i in range(max(labels) + 1)])
+
+    if output.endswith('.csv'):
+        with open(output, 'w') as f:
+            f.write('beat_start,label,confidence\n')
+            for start, label, confidence in zip(result['beat_start'], result['label'], result['confidence']):
+                f.write(f"{start},{class_names[label]},{float(confidence):.4f}\n")
+    else:
+        np.savez_compressed(
+            output,
+            beat_start=result['beat_start'],
+            label=result['label'],
+            confidence=result['confidence'],
+            probabilities=result['probabilities'],
+            class_names=class_names,
+            model_version=result['model_version']
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Classify every beat in a long ECG recording")
+    parser.add_argument("recording", help=".txt, .csv, .npy or raw float32 (.f32/.bin/.raw) file")
+    parser.add_argument("-o", "--output", help="Output .npz (default) or .csv; defaults to <recording>.beats.npz")
+    parser.add_argument("--model", default="arrhythmia_detection_model1.h5")
+    parser.add_argument("--threshold", type=float, help="Beat trigger level (default: the model's spec)")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--workers", type=int, default=1, help="Inference processes, each with its own model copy")
+    parser.add_argument("--column", type=int, default=0, help="Signal column for .csv and 2-D .npy input")
+    parser.add_argument("--raw-dtype", default="float32", help="Sample type for raw binary input")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.recording)[0] + '.beats.npz'
+
+    result = classify_recording(
+        args.recording,
+        model_path=args.model,
+        threshold=args.threshold,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        column=args.column,
+        raw_dtype=args.raw_dtype,
+        progress=lambda beats, samples: print(f"\r{beats} beats / {samples} samples", end="", flush=True)
+    )
+    write_results(result, output)
+
+    beats = len(result['label'])
+    elapsed = max(result['elapsed'], 1e-9)
+    print(f"\nClassified {beats} beats from {result['samples']} samples in {elapsed:.2f}s "
+          f"({beats / elapsed:.1f} beats/s, {result['samples'] / elapsed:.0f} samples/s)")
+    print(f"Results written to {output}")
@@ -0,0 +1,230 @@
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterator, Optional
+import numpy as np
+from batch_classify import classify_recording
+from device_preprocessing import DevicePreprocessor, MODEL_SAMPLE_RATE
+from metrics import Counter, Gauge
+from model.jobModel import JobModel, COMPLETED, FAILED, CANCELLED
+from model_loader import DEFAULT_MODEL_PATH
+from model_registry import MODELS
+from waveform_store import WaveformArchive, WaveformReplay
+
+logger = logging.getLogger(__name__)
+
+BATCH_JOBS = Counter('batch_jobs_total', 'Batch classification jobs finished', ('status',))
+BATCH_JOBS_RUNNING = Gauge('batch_jobs_running', 'Batch classification jobs running in this process')
+
+# Beats per stored result document; well under Mongo's 16 MB limit
+RESULT_CHUNK = 10000
+
+
+class JobCancelled(Exception):
+    """Raised from the progress callback to abandon a job"""
+
+
+class JobManager:
+    """
+    Runs queued batch classification jobs (see model/jobModel.py) on a small
+    pool of threads, each calling batch_classify.classify_recording.
+
+    Jobs come from Mongo rather than an in-process queue, so jobs survive a
+    restart, several server processes can share the work, and a job whose
+    worker died is picked up again once its heartbeat is `stale_after`
+    seconds old. At most `user_limit` jobs per user run at once; the rest
+    wait in priority order. Sources are a recording file under
+    `recordings_dir` or a time range of a device in the waveform archive.
+    """
+
+    def __init__(self, workers: int = 2, user_limit: int = 1, processes: int = 1,
+                 recordings_dir: str = 'recordings', archive_root: str = 'waveforms',
+                 poll_interval: float = 2.0, stale_after: float = 120.0):
+        self.workers = workers
+        self.user_limit = user_limit
+        self.processes = processes
+        self.recordings_dir = os.path.realpath(recordings_dir)
+        self.archive = WaveformArchive(archive_root)
+        self.poll_interval = poll_interval
+        self.stale_after = stale_after
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.running: Dict[str, threading.Event] = {}
+        self._wake = threading.Event()
+        self._started = False
+        BATCH_JOBS_RUNNING.set_function(lambda: len(self.running))
+
+    @classmethod
+    def from_env(cls) -> 'JobManager':
+        return cls(
+            workers=int(os.environ.get('BATCH_JOB_WORKERS', 2)),
+            user_limit=int(os.environ.get('BATCH_JOB_USER_LIMIT', 1)),
+            processes=int(os.environ.get('BATCH_JOB_PROCESSES', 1)),
+            recordings_dir=os.environ.get('BATCH_RECORDINGS_DIR', 'recordings'),
+            archive_root=os.environ.get('WAVEFORM_ARCHIVE', 'waveforms')
+        )
+
+    def start(self) -> None:
+        # Spawned helper processes re-import the server module; only the server itself runs jobs
+        if self._started or self.workers <= 0 or multiprocessing.parent_process() is not None:
+            return
+        self._started = True
+        try:
+            JobModel.ensure_indexes()
+        except Exception as e:
+            logger.warning("Could not create job indexes", extra={"error": str(e)})
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"batch-job-{i}", daemon=True).start()
+        threading.Thread(target=self._heartbeat, name='batch-job-heartbeat', daemon=True).start()
+
+    def recording_path(self, name: str) -> str:
+        """Resolve a recording name inside recordings_dir; ValueError for anything outside it"""
+        path = os.path.realpath(os.path.join(self.recordings_dir, name))
+        if os.path.commonpath([path, self.recordings_dir]) != self.recordings_dir:
+            raise ValueError("Recording must be inside the recordings directory")
+        if not os.path.isfile(path):
+            raise ValueError(f"Recording not found: {name}")
+        return path
+
+    def archive_source(self, device_id: str, start: float, end: float) -> Dict[str, Any]:
+        if end <= start:
+            raise ValueError("'end' must be after 'start'")
+        try:
+            replay = WaveformReplay(self.archive, device_id, start, end)
+        except FileNotFoundError:
+            raise ValueError(f"No archived waveform for device {device_id}")
+        return {
+            'deviceId': device_id, 'start': start, 'end': end,
+            'sampleRate': replay.sample_rate,
+            'totalSamples': int(round(sum((last - first) * _model_rate() / rate for first, last, rate in replay.spans)))
+        }
+
+    def submit(self, user_id: str, source: Dict[str, Any], priority: int = 5,
+               options: Optional[Dict[str, Any]] = None, patient_id: Optional[str] = None) -> Dict[str, Any]:
+        job = JobModel.create(user_id, source, priority, options or {}, patient_id)
+        self._wake.set()
+        return job
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = JobModel.request_cancel(job_id)
+        # A worker in this process notices straight away; others at their next progress update
+        event = self.running.get(job_id)
+        if event:
+            event.set()
+        return job
+
+    def _heartbeat(self) -> None:
+        while True:
+            time.sleep(self.stale_after / 4)
+            try:
+                JobModel.heartbeat(list(self.running))
+            except Exception as e:
+                logger.warning("Job heartbeat failed", extra={"error": str(e)})
+
+    def _work(self) -> None:
+        while True:
+            try:
+                JobModel.requeue_stale(self.stale_after)
+                job = JobModel.claim_next(self.name, self.user_limit)
+            except Exception as e:
+                logger.warning("Could not claim a batch job", extra={"error": str(e)})
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._run(job)
+
+    def _chunks(self, source: Dict[str, Any], model_rate: float) -> Iterator[np.ndarray]:
+        """Archive samples at the model's rate, in large reads"""
+        replay = WaveformReplay(self.archive, source['deviceId'], source['start'], source['end'],
+                                chunk_samples=1 << 20)
+        preprocessor = None
+        for rate, chunk in replay.rated_chunks():
+            # The device changed its rate mid-range
+            if preprocessor is None or preprocessor.source_rate != rate:
+                preprocessor = DevicePreprocessor(rate, target_rate=model_rate)
+            yield preprocessor.process(chunk).astype(np.float32)
+
+    def _run(self, job: Dict[str, Any]) -> None:
+        job_id = job['_id']
+        cancelled = self.running[job_id] = threading.Event()
+        source, options = job['source'], job.get('options') or {}
+        last_update = 0.0
+
+        def progress(beats: int, samples: int) -> None:
+            nonlocal last_update
+            now = time.monotonic()
+            if now - last_update >= 1.0:
+                last_update = now
+                if JobModel.update_progress(job_id, beats, samples):
+                    cancelled.set()
+            if cancelled.is_set():
+                raise JobCancelled()
+
+        logger.info("Batch job started", extra={"job": job_id, "user": job['userId'], "priority": job['priority']})
+        # The job keeps the version active when it started, even across a reload
+        loaded = MODELS.active
+        model_rate = loaded.spec.sample_rate if loaded else MODEL_SAMPLE_RATE
+        try:
+            result = classify_recording(
+                self.recording_path(source['recording']) if 'recording' in source else None,
+                model_path=os.environ.get('MODEL_PATH', DEFAULT_MODEL_PATH),
+                loaded=loaded,
+                threshold=options.get('threshold'),
+                workers=self.processes,
+                column=options.get('column', 0),
+                raw_dtype=options.get('rawDtype', 'float32'),
+                progress=progress,
+                chunks=None if 'recording' in source else self._chunks(source, model_rate)
+            )
+            JobModel.update_progress(job_id, len(result['label']), result['samples'])
+            JobModel.save_results(job_id, _result_chunks(result))
+            JobModel.finish(job_id, COMPLETED, summary=_summary(result, model_rate))
+            BATCH_JOBS.inc(status=COMPLETED)
+            logger.info("Batch job completed", extra={"job": job_id, "beats": len(result['label']),
+                                                      "elapsed_s": round(result['elapsed'], 2)})
+        except JobCancelled:
+            JobModel.finish(job_id, CANCELLED)
+            BATCH_JOBS.inc(status=CANCELLED)
+            logger.info("Batch job cancelled", extra={"job": job_id})
+        except Exception as e:
+            JobModel.finish(job_id, FAILED, error=str(e))
+            BATCH_JOBS.inc(status=FAILED)
+            logger.exception("Batch job failed", extra={"job": job_id})
+        finally:
+            self.running.pop(job_id, None)
+
+
+def _model_rate() -> float:
+    return MODELS.active.spec.sample_rate if MODELS.active else MODEL_SAMPLE_RATE
+
+
+def _result_chunks(result: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    labels = result['class_names']
+    names = np.array([labels.get(i, str(i)) for i in range(max(labels) + 1)])
+    for first in range(0, len(result['label']), RESULT_CHUNK):
+        part = slice(first, first + RESULT_CHUNK)
+        yield {
+            'beatStart': result['beat_start'][part].tolist(),
+            'label': names[result['label'][part]].tolist(),
+            'confidence': np.round(result['confidence'][part].astype(np.float64), 4).tolist()
+        }
+
+
+def _summary(result: Dict[str, Any], model_rate: float) -> Dict[str, Any]:
+    labels = result['class_names']
+    counts = np.bincount(result['label'], minlength=max(labels) + 1)
+    return {
+        'beats': int(len(result['label'])),
+        'samples': int(result['samples']),
+        'sampleRate': model_rate,
+        'classes': {labels.get(i, str(i)): int(count) for i, count in enumerate(counts)},
+        'elapsedSeconds': round(result['elapsed'], 3),
+        'modelVersion': result['model_version']
+    }
+
+
+JOBS = JobManager.from_env()
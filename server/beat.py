@@ -1,88 +1,191 @@
+import argparse
+import os
 import websocket
 import time
 import threading
 import json
+import logging
+import signal
 import numpy as np
-from collections import deque
 import tensorflow as tf
 import asyncio
 import websockets
 from threading import Thread
-from tensorflow.keras.models import load_model
+from model_registry import ModelRegistry
+from prediction_cache import PredictionCache
+from prediction_sink import PredictionSink
+from waveform_store import WaveformArchive
+from log_config import configure_logging
+from profiling import profiled
+from signal_quality import SignalQualityGate
+from rhythm_stats import RhythmStats
+from broadcast_bus import BusPublisher
+from shm_slab import InferencePool
+from device_preprocessing import DevicePreprocessor, MODEL_SAMPLE_RATE, check_sample_rate
+from ecg_pipeline import StreamWindow, decode_predictions
+from metrics import DETECTOR_BEATS, DETECTOR_REJECTED, DETECTOR_QUEUE_DEPTH, observe_inference, start_metrics_server
+
+logger = logging.getLogger(__name__)
 
 
 class ECGArrhythmiaDetector:
-    def __init__(self, model_path="arrhythmia_detection_model1.h5", websocket_url="ws://192.168.0.110:81"):
+    def __init__(self, model_path="arrhythmia_detection_model1.h5", websocket_url="ws://192.168.0.110:81",
+                 device_id=None, patient_id=None, sink=None, archive=None, broadcast_port=8765,
+                 quality_gate=None, summary_interval=5.0, preprocessor=None, publisher=None,
+                 inference_workers=0):
         self.websocket_url = websocket_url
+        self.broadcast_port = broadcast_port
+        # With a bus publisher, viewers are served by broadcaster.py processes instead
+        self.publisher = publisher
+        self.device_id = device_id or websocket_url
+        self.patient_id = patient_id
+        # Optional write-behind store for predictions (see prediction_sink.py)
+        self.sink = sink
+        # Optional raw waveform archive (see waveform_store.py)
+        self.archive = archive
+        # Optional signal quality check before inference (see signal_quality.py)
+        self.quality_gate = quality_gate
+        # Resampling to the model rate, plus optional baseline/amplitude correction
+        self.preprocessor = preprocessor or DevicePreprocessor()
+        self.rejected_count = 0
+        self.summary_interval = summary_interval
+        self.sample_count = 0
         self.connected = False
         self.ws = None
-        self.data_buffer = deque(maxlen=200)
-        self.threshold = 0.55
         self.beat_count = 0
+        # Device timestamp of the newest sample, echoed for latency measurement
+        self.last_sample_ts = None
         
-        # WebSocket server properties
-        self.clients = set()
+        # WebSocket server properties: client -> message types it subscribed to
+        self.clients = {}
         
         # Load model
         print("Loading model...")
-        self.model = load_model(model_path)
-        print("Model loaded successfully")
-        
-        # Class labels
-        self.arrhythmia_classes = {
-            0: '/',
-            1: 'L',
-            2: 'N',
-            3: 'R',
-            4: 'V'
-        }
+        self.models = ModelRegistry()
+        loaded = self.models.load(model_path)
+        self.model_version = loaded.version
+        print(f"Model {self.model_version} loaded successfully")
+        # Window length, leads, trigger and labels all follow the model (see InputSpec)
+        self.apply_spec(loaded.spec)
+        # Replayed recordings re-score identical windows
+        self.cache = PredictionCache.from_env('detector')
+        # Optional out-of-process inference; windows go through shared memory (see shm_slab.py)
+        self.inference_pool = None
+        if inference_workers:
+            self.inference_pool = InferencePool(model_path, inference_workers, window=self.spec.size,
+                                                outputs=loaded.outputs)
+            threading.Thread(target=self.collect_results, daemon=True).start()
         
-        # Start WebSocket server for predictions
-        threading.Thread(target=self.start_websocket_server, daemon=True).start()
+        # Queue depths are read at scrape time, nothing to update per sample
+        DETECTOR_QUEUE_DEPTH.set_function(lambda: len(self.data_buffer), device=self.device_id, queue='window')
+        if self.sink:
+            DETECTOR_QUEUE_DEPTH.set_function(self.sink.queue.qsize, device=self.device_id, queue='sink')
+        if self.inference_pool:
+            DETECTOR_QUEUE_DEPTH.set_function(lambda: self.inference_pool.slab.in_use,
+                                              device=self.device_id, queue='inference')
+
+        # Start WebSocket server for predictions, unless fan-out is on the bus
+        if self.publisher is None:
+            threading.Thread(target=self.start_websocket_server, daemon=True).start()
+        if self.summary_interval:
+            threading.Thread(target=self.summary_loop, daemon=True).start()
+
+    def apply_spec(self, spec):
+        """Size the stream buffer, per-lead preprocessing and labels for a model's input spec"""
+        self.spec = spec
+        # One sample per lead per frame, kept interleaved so a full window is the model input
+        self.data_buffer = StreamWindow(spec.window, spec.leads)
+        self.threshold = spec.threshold
+        self.arrhythmia_classes = spec.classes
+        self.preprocessors = [
+            DevicePreprocessor(self.preprocessor.source_rate, self.preprocessor.remove_baseline,
+                               self.preprocessor.normalize, target_rate=spec.sample_rate)
+            for _ in range(spec.leads)
+        ]
+        self.preprocessor = self.preprocessors[0]
+        # Rolling heart rate, HRV, class mix and V runs (see rhythm_stats.py)
+        self.rhythm = RhythmStats(sample_rate=spec.sample_rate, labels=spec.classes)
+        if self.quality_gate:
+            # Judge the same window the model sees, at its rate
+            self.quality_gate = self.quality_gate.resized(spec.window, spec.sample_rate)
 
     async def handler(self, websocket):
-        self.clients.add(websocket)
+        # ws://host:port/ streams beats, /summary rhythm summaries, /all both
+        path = websocket.request.path.strip('/') if hasattr(websocket, 'request') else ''
+        self.clients[websocket] = {'summary': {'summary'}, 'all': {'beat', 'summary'}}.get(path, {'beat'})
         try:
             await websocket.wait_closed()
         finally:
-            self.clients.remove(websocket)
+            self.clients.pop(websocket, None)
 
     def start_websocket_server(self):
-        print("Starting prediction WebSocket server on port 8765...")
+        print(f"Starting prediction WebSocket server on port {self.broadcast_port}...")
         asyncio.run(self.run_websocket_server())
 
     async def run_websocket_server(self):
-        async with websockets.serve(self.handler, "0.0.0.0", 8765):
+        async with websockets.serve(self.handler, "0.0.0.0", self.broadcast_port):
             await asyncio.Future()
 
-    async def broadcast(self, message):
-        if self.clients:
-            await asyncio.gather(*[client.send(message) for client in self.clients.copy()])
+    async def broadcast(self, message, kind='beat'):
+        recipients = [client for client, kinds in list(self.clients.items()) if kind in kinds]
+        if recipients:
+            await asyncio.gather(*[client.send(message) for client in recipients])
 
-    def send_prediction(self, class_name, confidence):
-        message = json.dumps({
-            "beat": self.beat_count,
-            "data": list(self.data_buffer),
-            "data_length": len(self.data_buffer),
+    def publish(self, message, kind='beat'):
+        if self.publisher:
+            self.publisher.publish(f"{self.device_id}/{kind}", message)
+        else:
+            asyncio.run(self.broadcast(message, kind))
+
+    def send_prediction(self, beat, frames, class_name, confidence, sample_ts):
+        # "data" stays the trigger lead so single-lead dashboards are unaffected
+        data = frames[:, self.spec.trigger_lead].tolist()
+        message = {
+            "type": "beat",
+            "beat": beat,
+            "data": data,
+            "data_length": len(data),
             "class": class_name,
-            "confidence": float(confidence)
+            "confidence": float(confidence),
+            "device_id": self.device_id,
+            "model_version": self.model_version,
+            "quality_rejected": self.rejected_count,
+            "sample_ts": sample_ts
+        }
+        if self.spec.leads > 1:
+            message["leads"] = frames.T.tolist()
+        self.publish(json.dumps(message))
+
+    def send_summary(self):
+        message = json.dumps({
+            "type": "summary",
+            "device_id": self.device_id,
+            "patient_id": self.patient_id,
+            **self.rhythm.summary()
         })
-        asyncio.run(self.broadcast(message))
+        self.publish(message, kind='summary')
+
+    def summary_loop(self):
+        while True:
+            time.sleep(self.summary_interval)
+            if self.rhythm.beats:
+                try:
+                    self.send_summary()
+                except Exception as e:
+                    logger.warning("Summary broadcast failed", extra={"error": str(e)})
 
     def preprocess_input(self, ecg_data):
-        actual_length = len(ecg_data)
-        
-        if actual_length < 200:
-            ecg_data = np.pad(list(ecg_data), (0, 200 - actual_length), mode='constant')
-        else:
-            ecg_data = list(ecg_data)[:200]
-        
-        ecg_data = np.array(ecg_data).reshape(1, 10, 20, 1)
-        return ecg_data
+        """One window, (samples,) or (samples, leads), as a single-row model input"""
+        ecg_data = np.asarray(ecg_data, dtype=np.float32)
+        if ecg_data.ndim == 1:
+            ecg_data = ecg_data[:, None]
+        return self.spec.prepare(ecg_data[None])
     
     def predict(self, ecg_data):
         processed_data = self.preprocess_input(ecg_data)
-        prediction = self.model.predict(processed_data, verbose=0)
+        started = time.perf_counter()
+        prediction, self.model_version = self.cache.predict(self.models, processed_data)
+        observe_inference('stream', 1, time.perf_counter() - started)
         
         if prediction.shape[1] == 1:
             predicted_class = int(prediction[0][0] >= 0.5)
@@ -93,38 +196,153 @@ class ECGArrhythmiaDetector:
         
         return predicted_class, confidence
         
+    def set_sample_rate(self, sample_rate):
+        """Rebuild the preprocessing stage for a device that declares a new rate"""
+        self.preprocessors = [
+            DevicePreprocessor(sample_rate, self.preprocessor.remove_baseline, self.preprocessor.normalize,
+                               target_rate=self.spec.sample_rate)
+            for _ in range(self.spec.leads)
+        ]
+        self.preprocessor = self.preprocessors[0]
+        logger.info("Device sample rate set", extra={"device": self.device_id, "sample_rate": sample_rate})
+
+    def feed(self, values):
+        """Feed raw device samples, at the device's rate, through preprocessing and segmentation"""
+        if self.spec.leads > 1:
+            raise ValueError(f"Model expects {self.spec.leads} leads; send per-lead samples under 'leads'")
+        if not self.preprocessor.passthrough:
+            values = self.preprocessor.process(values).tolist()
+        for value in values:
+            self.process_sample(value)
+
+    def feed_leads(self, leads):
+        """Feed equal-length per-lead sample lists, at the device's rate, for multi-lead models"""
+        if len(leads) != self.spec.leads:
+            raise ValueError(f"Model expects {self.spec.leads} leads, got {len(leads)}")
+        if self.spec.leads == 1:
+            return self.feed(leads[0])
+        leads = [np.asarray(lead, dtype=np.float64) for lead in leads]
+        if not self.preprocessor.passthrough:
+            leads = [preprocessor.process(lead) for preprocessor, lead in zip(self.preprocessors, leads)]
+        for frame in np.stack(leads, axis=1):
+            self.process_sample(frame)
+
+    def process_sample(self, value):
+        """Feed one ECG sample, or one frame of per-lead samples, at the model's sample rate"""
+        self.data_buffer.append(value)
+        self.sample_count += 1
+        if self.quality_gate:
+            self.quality_gate.update(value if self.spec.leads == 1 else value[self.spec.trigger_lead])
+        
+        if (len(self.data_buffer) == self.spec.window
+                and self.data_buffer.value(self.spec.peak_index, self.spec.trigger_lead) > self.threshold):
+            if self.quality_gate:
+                acceptable, reason, _ = self.quality_gate.check()
+                if not acceptable:
+                    # Noise, saturation or lead-off: not worth a model call
+                    self.rejected_count += 1
+                    DETECTOR_REJECTED.inc(device=self.device_id, reason=reason)
+                    self.rhythm.break_chain(self.sample_count - self.spec.window + self.spec.peak_index)
+                    self.data_buffer.clear()
+                    return
+            self.classify_beat()
+
+    @profiled('detector.classify_beat')
+    def classify_beat(self):
+        """Classify the full window, publish the result and start a new window"""
+        active = self.models.active
+        if active.spec.input_shape != self.spec.input_shape:
+            # A reload brought a model with a different input; restart segmentation for it
+            logger.info("Model input changed", extra={"input_shape": active.spec.input_shape})
+            self.apply_spec(active.spec)
+            return
+
+        self.beat_count += 1
+        peak_sample = self.sample_count - self.spec.window + self.spec.peak_index
+        beat_data = self.data_buffer.frames().copy()
+        self.data_buffer.clear()
+
+        if self.inference_pool:
+            self.submit_beat(beat_data, peak_sample)
+            return
+        predicted_class, confidence = self.predict(beat_data)
+        self.record_beat(self.beat_count, peak_sample, beat_data, predicted_class, confidence, self.last_sample_ts)
+
+    def submit_beat(self, beat_data, peak_sample):
+        """Hand the window to the inference workers; collect_results() finishes the beat"""
+        context = (self.beat_count, peak_sample, beat_data, self.last_sample_ts, time.perf_counter())
+        if self.inference_pool.submit(beat_data.ravel(), context) is None:
+            # Workers are a full slab behind; shed the beat rather than stall ingest
+            self.rejected_count += 1
+            DETECTOR_REJECTED.inc(device=self.device_id, reason='inference_backlog')
+            self.rhythm.break_chain(peak_sample)
+            return
+
+    def collect_results(self):
+        pool = self.inference_pool
+        for slot, probabilities, (beat, peak_sample, beat_data, sample_ts, submitted) in pool.completed():
+            labels, confidence = decode_predictions(probabilities[None])
+            pool.release(slot)
+            observe_inference('stream_worker', 1, time.perf_counter() - submitted)
+            try:
+                self.record_beat(beat, peak_sample, beat_data, int(labels[0]), float(confidence[0]), sample_ts)
+            except Exception as e:
+                logger.warning("Error publishing beat", extra={"beat": beat, "error": str(e)})
+
+    def record_beat(self, beat, peak_sample, beat_data, predicted_class, confidence, sample_ts):
+        """Update rhythm statistics, publish and persist one classified beat"""
+        class_name = self.arrhythmia_classes.get(predicted_class, f"Class {predicted_class}")
+        self.rhythm.add_beat(peak_sample, class_name)
+        DETECTOR_BEATS.inc(device=self.device_id, **{'class': class_name})
+        logger.debug("Beat classified", extra={"beat": beat, "class": class_name,
+                                               "confidence": round(float(confidence), 3)})
+        
+        # Send prediction to web clients
+        self.send_prediction(beat, beat_data, class_name, confidence, sample_ts)
+        if self.sink:
+            self.sink.submit(
+                {"beat": beat, "class": class_name, "confidence": float(confidence),
+                 "model_version": self.model_version},
+                device_id=self.device_id,
+                patient_id=self.patient_id
+            )
+        
     def connect(self):
         def on_message(ws, message):
             try:
                 data = json.loads(message)
-                if 'value' in data:
-                    self.data_buffer.append(data['value'])
-                    
-                    if len(self.data_buffer) == 200 and self.data_buffer[100] > self.threshold:
-                        self.beat_count += 1
-                        print(f"\n--- Beat {self.beat_count} detected ---")
-                        
-                        beat_data = list(self.data_buffer)
-                        predicted_class, confidence = self.predict(beat_data)
-                        
-                        class_name = self.arrhythmia_classes.get(predicted_class, f"Class {predicted_class}")
-                        print(f"PREDICTION: {class_name} (Confidence: {confidence:.2f})")
-                        
-                        # Send prediction to web clients
-                        self.send_prediction(class_name, confidence)
-                        self.data_buffer.clear()
+                # One sample per message, a block of them under "values", or
+                # multi-lead blocks under "leads" as one sample list per lead
+                values = data['values'] if 'values' in data else [data['value']] if 'value' in data else None
+                leads = data.get('leads')
+                if values is not None or leads is not None:
+                    self.last_sample_ts = data.get('ts')
+                    sample_rate = data.get('sample_rate')
+                    if sample_rate and sample_rate != self.preprocessor.source_rate:
+                        self.set_sample_rate(check_sample_rate(float(sample_rate)))
+                    # Archived at the rate the device is sending now, not the one it started with
+                    rate = self.preprocessor.source_rate
+                    if leads is not None:
+                        if self.archive:
+                            for index, lead in enumerate(leads):
+                                self.archive.append(f"{self.device_id}:lead{index}", lead, sample_rate=rate)
+                        self.feed_leads(leads)
+                    else:
+                        if self.archive:
+                            self.archive.append(self.device_id, values, sample_rate=rate)
+                        self.feed(values)
             except Exception as e:
-                print(f"Error processing message: {e}")
+                logger.warning("Error processing message", extra={"error": str(e)})
         
         def on_error(ws, error):
-            print(f"WebSocket error: {error}")
+            logger.error("WebSocket error", extra={"error": str(error)})
         
         def on_close(ws, close_status_code, close_msg):
-            print("ECG WebSocket connection closed")
+            logger.info("ECG WebSocket connection closed")
             self.connected = False
         
         def on_open(ws):
-            print("Connected to ECG WebSocket server")
+            logger.info("Connected to ECG WebSocket server")
             self.connected = True
         
         self.ws = websocket.WebSocketApp(
@@ -142,6 +360,14 @@ class ECGArrhythmiaDetector:
         if self.ws:
             self.ws.close()
             self.connected = False
+        if self.sink:
+            self.sink.close()
+        if self.publisher:
+            self.publisher.close()
+        if self.inference_pool:
+            self.inference_pool.close()
+        if self.archive:
+            self.archive.close()
 
     def wait_for_connection(self, timeout=10):
         start_time = time.time()
@@ -150,11 +376,53 @@ class ECGArrhythmiaDetector:
         return self.connected
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream ECG from a device and broadcast beat predictions")
+    parser.add_argument("--device-url", default=os.environ.get("ECG_DEVICE_URL", "ws://192.168.0.110:81"))
+    parser.add_argument("--model", default=os.environ.get("MODEL_PATH", "arrhythmia_detection_model1.h5"),
+                        help="Keras model, or a .tflite build from quantize_model.py")
+    parser.add_argument("--broadcast-port", type=int, default=int(os.environ.get("ECG_BROADCAST_PORT", 8765)))
+    parser.add_argument("--bus", default=os.environ.get("ECG_BUS_URL"),
+                        help="Publish to this bus (unix:///path or redis://) for broadcaster.py instead of serving viewers")
+    parser.add_argument("--device-id", help="Defaults to the device URL")
+    parser.add_argument("--patient-id")
+    parser.add_argument("--no-store", action="store_true", help="Do not persist predictions or raw waveforms")
+    parser.add_argument("--sample-rate", type=float, default=float(os.environ.get("ECG_SAMPLE_RATE", MODEL_SAMPLE_RATE)),
+                        help="Device sample rate in Hz; resampled to the model's rate (devices may also declare it)")
+    parser.add_argument("--remove-baseline", action="store_true", help="Subtract baseline wander before segmentation")
+    parser.add_argument("--normalize", action="store_true", help="Scale the signal to a unit peak amplitude")
+    parser.add_argument("--inference-workers", type=int, default=int(os.environ.get("ECG_INFERENCE_WORKERS", 0)),
+                        help="Run the model in this many worker processes fed through shared memory (0 runs it inline)")
+    parser.add_argument("--no-quality-gate", action="store_true", help="Classify every window, even noisy ones")
+    parser.add_argument("--summary-interval", type=float, default=5.0,
+                        help="Seconds between rhythm summary frames on /summary (0 disables)")
+    parser.add_argument("--metrics-port", type=int, default=int(os.environ.get("ECG_METRICS_PORT", 9108)),
+                        help="Serve Prometheus metrics on this port (0 disables)")
+    args = parser.parse_args()
+
+    configure_logging()
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+
     detector = ECGArrhythmiaDetector(
-        model_path="arrhythmia_detection_model1.h5", 
-        websocket_url="ws://192.168.0.110:81"
+        model_path=args.model, 
+        websocket_url=args.device_url,
+        device_id=args.device_id,
+        patient_id=args.patient_id,
+        sink=None if args.no_store else PredictionSink(),
+        archive=None if args.no_store else WaveformArchive("waveforms", sample_rate=args.sample_rate),
+        broadcast_port=args.broadcast_port,
+        quality_gate=None if args.no_quality_gate else SignalQualityGate(),
+        summary_interval=args.summary_interval,
+        preprocessor=DevicePreprocessor(args.sample_rate, args.remove_baseline, args.normalize),
+        publisher=BusPublisher(args.bus) if args.bus else None,
+        inference_workers=args.inference_workers
     )
     
+    # kill -HUP reloads --model in the background and swaps it in when warm;
+    # inference workers keep the model they started with
+    if not args.inference_workers:
+        signal.signal(signal.SIGHUP, lambda signum, frame: detector.models.load_async(args.model))
+
     try:
         print("Connecting to ECG data server...")
         detector.connect()
@@ -0,0 +1,142 @@
+import json
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from device_preprocessing import MIN_DEVICE_RATE, MAX_DEVICE_RATE
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib parser is the fallback
+    orjson = None
+
+BINARY_CONTENT_TYPE = 'application/octet-stream'
+# Kinds np.asarray gives a list of JSON numbers (bools were always accepted)
+NUMERIC_KINDS = 'biuf'
+
+
+class PayloadError(ValueError):
+    """A request body that cannot be a beat; the message is safe to return as a 400"""
+
+
+def loads(body: bytes) -> Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError as e:
+            raise PayloadError(f"Malformed JSON body: {e}")
+    try:
+        return json.loads(body)
+    except ValueError as e:
+        raise PayloadError(f"Malformed JSON body: {e}")
+
+
+def _first_non_number(values) -> Optional[str]:
+    """Location of the first element that is not a number, for the error message"""
+    for i, value in enumerate(values):
+        if isinstance(value, list):
+            inner = _first_non_number(value)
+            if inner is not None:
+                return f"[{i}]{inner}"
+        elif not isinstance(value, (int, float)):
+            return f"[{i}]"
+    return None
+
+
+def _check_finite(values: np.ndarray, field: str) -> None:
+    finite = np.isfinite(values)
+    if not finite.all():
+        index = np.unravel_index(int(np.argmin(finite)), values.shape)
+        position = ''.join(f"[{i}]" for i in index)
+        raise PayloadError(f"'{field}{position}' is not a finite number (or overflows float32).")
+
+
+def beat_array(beat_data: Any, leads: int = 1, field: str = 'beatData') -> np.ndarray:
+    """
+    Validate decoded beatData and return it as float32: (samples,) for one
+    lead, (leads, samples) otherwise. The checks run over whole arrays; only
+    a failing payload is walked element by element to say where it failed.
+    """
+    expected = "a list of numbers" if leads == 1 else f"{leads} equal-length lists of numbers, one per lead"
+    if not isinstance(beat_data, list):
+        raise PayloadError(f"Invalid data format. '{field}' must be {expected}.")
+    try:
+        values = np.asarray(beat_data)
+    except ValueError:
+        # Ragged nesting
+        raise PayloadError(f"Invalid data format. '{field}' must be {expected}.")
+
+    if values.dtype.kind not in NUMERIC_KINDS and values.size:
+        where = _first_non_number(beat_data)
+        if where is not None:
+            raise PayloadError(f"Invalid data format. '{field}{where}' is not a number; '{field}' must be {expected}.")
+        # Only numbers, but some too large for int64; let them overflow to inf below
+        values = np.asarray(beat_data, dtype=np.float64)
+
+    if values.size == 0:
+        values = values.reshape((0,) if leads == 1 else (leads, 0))
+    if leads == 1 and values.ndim != 1:
+        raise PayloadError(f"Invalid data format. '{field}' must be {expected}.")
+    if leads > 1 and (values.ndim != 2 or values.shape[0] != leads):
+        raise PayloadError(f"Invalid data format. '{field}' must be {expected}, got shape {list(values.shape)}.")
+
+    with np.errstate(over='ignore'):
+        # Out-of-range values become inf and are reported just below
+        values = values.astype(np.float32)
+    _check_finite(values, field)
+    return values
+
+
+def beat_from_binary(body: bytes, leads: int = 1) -> np.ndarray:
+    """
+    Raw little-endian float32 samples, leads interleaved per sample as the
+    model consumes them; returned shaped like beat_array().
+    """
+    if len(body) % 4:
+        raise PayloadError(f"Binary body is {len(body)} bytes; expected float32 samples (a multiple of 4 bytes).")
+    values = np.frombuffer(body, dtype='<f4')
+    if len(values) % leads:
+        raise PayloadError(f"Binary body has {len(values)} values; expected a multiple of {leads} (one per lead).")
+    values = values.reshape(-1, leads).T if leads > 1 else values
+    _check_finite(values, 'body')
+    return values.astype(np.float32)
+
+
+def _flag(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
+
+
+def decode_predict_request(request, leads: int = 1) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Parse a /predict body into (beat array, options). JSON bodies carry
+    beatData and options together; application/octet-stream bodies are raw
+    float32 with the options (sampleRate, removeBaseline, normalize) in the
+    query string.
+    """
+    if request.mimetype == BINARY_CONTENT_TYPE:
+        beat = beat_from_binary(request.get_data(cache=False), leads)
+        options = request.args
+        sample_rate = options.get("sampleRate")
+        if sample_rate is not None:
+            try:
+                sample_rate = float(sample_rate)
+            except ValueError:
+                sample_rate = -1.0
+    else:
+        data = loads(request.get_data(cache=False))
+        if not isinstance(data, dict) or "beatData" not in data:
+            raise PayloadError("Invalid input. Expected 'beatData' key with a list of values.")
+        beat = beat_array(data["beatData"], leads)
+        options = data
+        sample_rate = data.get("sampleRate")
+        if sample_rate is not None and (isinstance(sample_rate, bool) or not isinstance(sample_rate, (int, float))):
+            sample_rate = -1.0
+
+    if sample_rate is not None and not MIN_DEVICE_RATE <= sample_rate <= MAX_DEVICE_RATE:
+        raise PayloadError(f"Invalid 'sampleRate'. Expected {MIN_DEVICE_RATE:g} to {MAX_DEVICE_RATE:g} Hz.")
+
+    return beat, {
+        'sampleRate': sample_rate,
+        'removeBaseline': _flag(options.get("removeBaseline")),
+        'normalize': _flag(options.get("normalize"))
+    }
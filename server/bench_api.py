@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from uuid import uuid4
+import numpy as np
+
+BENCH_PASSWORD = "bench-password"
+
+# Relative weights of each scenario in the traffic mix
+DEFAULT_MIX = {
+    'login': 5,
+    'register': 1,
+    'autocomplete': 10,
+    'list_reports': 5,
+    'reports_by_user': 25,
+    'timeline': 10,
+    'get_report': 15,
+    'update_status': 10,
+    'add_report': 5,
+    'edit_report': 5,
+    'predict': 10,
+    'predict_binary': 0,
+    'user_by_email': 3,
+    'user_by_numeric_id': 3,
+    'user_by_id': 3,
+    'hello': 1
+}
+
+
+def seed(db, reports: int, patients: int, doctors: int, batch: int = 10000) -> dict:
+    """Fill the users and patients collections with realistic-looking data"""
+    from flask_bcrypt import generate_password_hash
+
+    # One hash for everyone; bcrypt per user would dominate seeding time
+    password_hash = generate_password_hash(BENCH_PASSWORD).decode('utf-8')
+    db.users.delete_many({})
+    db.patients.delete_many({})
+
+    users = []
+    for i in range(patients):
+        users.append({'email': f'patient{i}@bench.local', 'username': f'patient{i}', 'password': password_hash,
+                      'type': 'patient', 'user_id': 1001 + i})
+    for i in range(doctors):
+        users.append({'email': f'doctor{i}@bench.local', 'username': f'doctor{i}', 'password': password_hash,
+                      'type': 'doctor', 'user_id': 1001 + patients + i, 'licenseNumber': f'LIC{i:05d}'})
+    db.users.insert_many(users)
+
+    rng = random.Random(0)
+    today = datetime.now()
+    # Report dates are stored as whole-day datetimes, as the API writes them
+    midnight = datetime(today.year, today.month, today.day)
+    for start in range(0, reports, batch):
+        docs = []
+        for _ in range(start, min(start + batch, reports)):
+            patient = rng.randrange(patients)
+            docs.append({
+                'id': str(uuid4()),
+                'patientId': str(1001 + patient),
+                'patientName': f'patient{patient}',
+                'doctorName': f'doctor{rng.randrange(doctors)}',
+                'heartClass': rng.choice(['L', 'N', 'R', 'V']),
+                'description': 'Seeded benchmark report',
+                'date': midnight - timedelta(days=rng.randrange(730)),
+                'status': rng.choice(['pending', 'completed']),
+                'result': '',
+                'revision': 1,
+                'updatedAt': today
+            })
+        db.patients.insert_many(docs)
+        print(f"\rSeeded {min(start + batch, reports)}/{reports} reports", end="", flush=True)
+    print()
+
+    return {
+        'patients': patients,
+        'doctors': doctors,
+        'user_oids': [str(u['_id']) for u in db.users.find({}, {'_id': 1}).limit(1000)],
+        'report_ids': [r['id'] for r in db.patients.aggregate([{'$sample': {'size': 1000}}, {'$project': {'id': 1}}])]
+    }
+
+
+def scenarios(ctx: dict, beats: np.ndarray) -> dict:
+    """Each scenario issues one request and returns (route label, response)"""
+    def patient_id():
+        return str(1001 + random.randrange(ctx['patients']))
+
+    def report_id():
+        return random.choice(ctx['report_ids'])
+
+    def timeline_range():
+        # A random window of up to 90 days within the seeded two years
+        end = datetime.now() - timedelta(days=random.randrange(730))
+        start = end - timedelta(days=random.randrange(1, 91))
+        return f"from={start.strftime('%Y-%m-%d')}&to={end.strftime('%Y-%m-%d')}&limit=50"
+
+    return {
+        'login': lambda c: ('POST /api/v1/login', c.post('/api/v1/login', json={
+            'email': f'patient{random.randrange(ctx["patients"])}@bench.local', 'password': BENCH_PASSWORD})),
+        'register': lambda c: ('POST /api/v1/register', c.post('/api/v1/register', json={
+            'email': f'bench-{uuid4()}@bench.local', 'username': 'bench', 'password': BENCH_PASSWORD})),
+        'autocomplete': lambda c: ('GET /api/v1/patients/autocomplete', c.get(
+            f'/api/v1/patients/autocomplete?search=patient{random.randrange(100)}&limit=5')),
+        'list_reports': lambda c: ('GET /api/v1/patients', c.get('/api/v1/patients')),
+        'reports_by_user': lambda c: ('GET /api/v1/patients/user/<user_id>', c.get(
+            f'/api/v1/patients/user/{patient_id()}')),
+        'timeline': lambda c: ('GET /api/v1/patients/user/<user_id>/timeline', c.get(
+            f'/api/v1/patients/user/{patient_id()}/timeline?{timeline_range()}')),
+        'get_report': lambda c: ('GET /api/v1/patients/<patient_id>', c.get(f'/api/v1/patients/{patient_id()}')),
+        'update_status': lambda c: ('PUT /api/v1/patients/<patient_id>/status', c.put(
+            f'/api/v1/patients/{report_id()}/status', json={'status': random.choice(['pending', 'completed'])})),
+        'add_report': lambda c: ('POST /api/v1/patients', c.post('/api/v1/patients', json={
+            'patientId': patient_id(), 'patientName': 'bench', 'doctorName': 'doctor0', 'heartClass': 'N'})),
+        'edit_report': lambda c: ('PUT /api/v1/patients/<patient_id>', c.put(
+            f'/api/v1/patients/{report_id()}', json={'description': f'edited {time.time()}'})),
+        'predict': lambda c: ('POST /predict', c.post('/predict', json={
+            'beatData': beats[random.randrange(len(beats))].tolist()})),
+        'predict_binary': lambda c: ('POST /predict (float32)', c.post(
+            '/predict', data=beats[random.randrange(len(beats))].astype('<f4').tobytes(),
+            content_type='application/octet-stream')),
+        'user_by_email': lambda c: ('POST /api/v1/users/email', c.post('/api/v1/users/email', json={
+            'email': f'doctor{random.randrange(ctx["doctors"])}@bench.local'})),
+        'user_by_numeric_id': lambda c: ('GET /api/v1/users/numeric/<numeric_id>', c.get(
+            f'/api/v1/users/numeric/{patient_id()}')),
+        'user_by_id': lambda c: ('GET /api/v1/users/<user_id>', c.get(
+            f'/api/v1/users/{random.choice(ctx["user_oids"])}')),
+        'hello': lambda c: ('GET /', c.get('/')),
+    }
+
+
+def parse_mix(text: str) -> dict:
+    mix = dict(DEFAULT_MIX)
+    if text:
+        for item in text.split(','):
+            name, weight = item.split('=')
+            mix[name.strip()] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def run(app, ctx: dict, beats: np.ndarray, mix: dict, requests: int, threads: int) -> dict:
+    available = scenarios(ctx, beats)
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    timings = defaultdict(list)
+    errors = defaultdict(int)
+    shed = defaultdict(int)
+    lock = threading.Lock()
+
+    def worker(count: int) -> None:
+        client = app.test_client()
+        local_timings = defaultdict(list)
+        local_errors = defaultdict(int)
+        local_shed = defaultdict(int)
+        for name in random.choices(names, weights, k=count):
+            started = time.perf_counter()
+            route, response = available[name](client)
+            local_timings[route].append(time.perf_counter() - started)
+            if response.status_code == 503:
+                # Turned away by the inference admission gate: load shedding, not a failure
+                local_shed[route] += 1
+            elif response.status_code >= 500:
+                local_errors[route] += 1
+        with lock:
+            for route, values in local_timings.items():
+                timings[route].extend(values)
+            for route, value in local_errors.items():
+                errors[route] += value
+            for route, value in local_shed.items():
+                shed[route] += value
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        per_thread = [requests // threads + (1 if i < requests % threads else 0) for i in range(threads)]
+        list(pool.map(worker, per_thread))
+    elapsed = time.perf_counter() - started
+
+    routes = {}
+    for route, values in sorted(timings.items()):
+        ms = np.asarray(values) * 1000.0
+        routes[route] = {
+            'requests': len(values),
+            'errors': errors.get(route, 0),
+            'shed_503': shed.get(route, 0),
+            'throughput_rps': len(values) / elapsed,
+            'p50_ms': float(np.percentile(ms, 50)),
+            'p95_ms': float(np.percentile(ms, 95)),
+            'p99_ms': float(np.percentile(ms, 99)),
+            'max_ms': float(ms.max())
+        }
+    return {'elapsed_s': elapsed, 'throughput_rps': requests / elapsed, 'routes': routes}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test every REST route against a seeded database")
+    parser.add_argument("--reports", type=int, default=1000, help="Seeded report documents (1k to 1M)")
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--doctors", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--mix", help="Override weights, e.g. predict=0,list_reports=1")
+    parser.add_argument("--mongo-uri", default="mongodb://localhost:27017/heartdisease_bench",
+                        help="Scratch database that will be wiped and seeded")
+    parser.add_argument("--mongomock", action="store_true", help="Use an in-memory mongomock stand-in")
+    parser.add_argument("--no-seed", action="store_true", help="Reuse the data already in --mongo-uri")
+    parser.add_argument("--output", help="Write the JSON report here as well")
+    args = parser.parse_args()
+
+    import pymongo
+    from pymongo.errors import PyMongoError
+
+    use_mock = args.mongomock
+    if not use_mock:
+        try:
+            pymongo.MongoClient(args.mongo_uri, serverSelectionTimeoutMS=1000).admin.command('ping')
+        except PyMongoError:
+            print("No MongoDB reachable, falling back to mongomock")
+            use_mock = True
+
+    if use_mock:
+        import flask_pymongo
+        import mongomock
+        # Must happen before server.py creates its clients; Flask-PyMongo
+        # wraps its own MongoClient subclass, so it needs swapping separately
+        mongomock.patch(servers=(('localhost', 27017),)).start()
+        flask_pymongo.MongoClient = pymongo.MongoClient
+
+    # server.py and PatientModel read the database from MONGO_URI at import time
+    os.environ['MONGO_URI'] = args.mongo_uri
+    # All load comes from one address; measure the handlers, not the per-client limits
+    os.environ.setdefault('RATE_LIMITS', 'off')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import server
+    from synthetic_ecg import synthetic_beats
+
+    db = pymongo.MongoClient(args.mongo_uri).get_default_database()
+    if args.no_seed:
+        ctx = {
+            'patients': args.patients,
+            'doctors': args.doctors,
+            'user_oids': [str(u['_id']) for u in db.users.find({}, {'_id': 1}).limit(1000)],
+            'report_ids': [r['id'] for r in db.patients.find({}, {'id': 1}).limit(1000)]
+        }
+    else:
+        ctx = seed(db, args.reports, args.patients, args.doctors)
+
+    registered = {f"{sorted(rule.methods - {'HEAD', 'OPTIONS'})[0]} {rule.rule}"
+                  for rule in server.app.url_map.iter_rules() if rule.endpoint != 'static'}
+    mix = parse_mix(args.mix)
+
+    report = run(server.app, ctx, synthetic_beats(256), mix, args.requests, args.threads)
+    report['dataset'] = {'reports': db.patients.estimated_document_count(), 'backend': 'mongomock' if use_mock else 'mongodb'}
+
+    untested = sorted(registered - set(report['routes']))
+    if untested:
+        report['untested_routes'] = untested
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,230 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from typing import Any, Callable, Dict, List
+import numpy as np
+from ecg_pipeline import preprocess_batch
+from synthetic_ecg import load_sample_beat, synthetic_beats
+
+DEFAULT_BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024]
+
+# Metric direction for the regression gate
+LOWER_IS_BETTER = ('latency_ms', 'cold_start', 'memory_mb')
+HIGHER_IS_BETTER = ('beats_per_s',)
+
+_COLD_START_SCRIPT = """
+import json, resource, sys, time
+started = time.perf_counter()
+import numpy as np
+if sys.argv[1].endswith('.tflite'):
+    # Only what TFLiteModel itself loads, so quantized figures are not full TensorFlow's
+    try:
+        import tflite_runtime.interpreter
+        loader = 'tflite_runtime'
+    except ImportError:
+        import tensorflow as tf
+        loader = 'tensorflow.lite'
+else:
+    import tensorflow as tf
+    loader = 'keras'
+from model_loader import load_model
+from ecg_pipeline import InputSpec
+imported = time.perf_counter()
+model = load_model(sys.argv[1])
+loaded = time.perf_counter()
+spec = InputSpec.for_model(model, sys.argv[1])
+model.predict(np.zeros((1,) + spec.input_shape, dtype=np.float32), verbose=0)
+first = time.perf_counter()
+rss_kb = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmRSS'))
+print(json.dumps({
+    'loader': loader,
+    'cold_start': {
+        'import_s': imported - started,
+        'load_s': loaded - imported,
+        'first_predict_s': first - loaded,
+        'total_s': first - started
+    },
+    'memory_mb': {
+        'rss': rss_kb / 1024,
+        'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+}))
+"""
+
+
+def percentiles(samples_s: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples_s) * 1000.0
+    return {
+        'p50': float(np.percentile(ms, 50)),
+        'p95': float(np.percentile(ms, 95)),
+        'p99': float(np.percentile(ms, 99)),
+        'mean': float(ms.mean())
+    }
+
+
+def time_calls(fn: Callable, inputs: List, warmup: int) -> List[float]:
+    for i in range(warmup):
+        fn(inputs[i % len(inputs)])
+    timings = []
+    for beat in inputs:
+        started = time.perf_counter()
+        fn(beat)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def bench_cold_start(model_path: str, runs: int) -> Dict[str, Any]:
+    """
+    Load the model in fresh interpreters so nothing is cached in-process.
+    The memory figures are what one inference worker costs after loading;
+    'loader' says whether a .tflite model ran on tflite_runtime or had to
+    pull in TensorFlow for tf.lite.
+    """
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', _COLD_START_SCRIPT, model_path],
+            capture_output=True, text=True, check=True
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return {
+        'loader': results[0]['loader'],
+        **{section: {key: float(np.median([r[section][key] for r in results])) for key in results[0][section]}
+           for section in results[0] if section != 'loader'}
+    }
+
+
+def bench_latency(model, beats: np.ndarray, iterations: int, warmup: int, include_server: bool) -> Dict[str, Dict]:
+    from beat import ECGArrhythmiaDetector
+    from model_registry import ModelRegistry, ModelVersion
+    from prediction_cache import PredictionCache
+
+    # Skip __init__: it would load a second model copy and bind port 8765
+    detector = ECGArrhythmiaDetector.__new__(ECGArrhythmiaDetector)
+    detector.models = ModelRegistry()
+    detector.models.install(ModelVersion(model, 'bench'))
+    detector.spec = detector.models.active.spec
+    # Measure the model path, not cache hits on the repeated beats
+    detector.cache = PredictionCache(max_entries=0)
+
+    inputs = [beats[i % len(beats)].tolist() for i in range(iterations)]
+    entry_points = {
+        'beat.preprocess_input': detector.preprocess_input,
+        'beat.ECGArrhythmiaDetector.predict': detector.predict,
+    }
+    if include_server:
+        # Importing server.py connects to Mongo and loads its own model copy
+        import server
+        server.prediction_cache.max_entries = 0
+        entry_points['server.preprocess_input'] = server.preprocess_input
+        entry_points['server.predict'] = server.predict
+
+    return {name: percentiles(time_calls(fn, inputs, warmup)) for name, fn in entry_points.items()}
+
+
+def bench_throughput(model, beats: np.ndarray, batch_sizes: List[int], min_seconds: float) -> Dict[str, Dict]:
+    results = {}
+    for batch_size in batch_sizes:
+        batch = preprocess_batch(beats[np.arange(batch_size) % len(beats)])
+        model.predict(batch, batch_size=batch_size, verbose=0)  # warm up this shape
+
+        calls = 0
+        started = time.perf_counter()
+        while True:
+            model.predict(batch, batch_size=batch_size, verbose=0)
+            calls += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_seconds:
+                break
+        results[str(batch_size)] = {
+            'beats_per_s': calls * batch_size / elapsed,
+            'latency_ms': elapsed / calls * 1000.0
+        }
+    return results
+
+
+def flatten(results: Dict, prefix: str = '') -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, name))
+        elif isinstance(value, (int, float)):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return a line per metric that regressed by more than tolerance"""
+    regressions = []
+    base = flatten(baseline['results'])
+    for name, value in flatten(current['results']).items():
+        if name not in base or base[name] <= 0:
+            continue
+        change = (value - base[name]) / base[name]
+        if any(part in name for part in LOWER_IS_BETTER):
+            worse = change > tolerance
+        elif any(part in name for part in HIGHER_IS_BETTER):
+            worse = -change > tolerance
+        else:
+            continue
+        if worse:
+            regressions.append(f"{name}: {base[name]:.4g} -> {value:.4g} ({change:+.1%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark arrhythmia model inference entry points")
+    parser.add_argument("--model", default="arrhythmia_detection_model1.h5")
+    parser.add_argument("--iterations", type=int, default=500, help="Single-beat calls per entry point")
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--batch-sizes", type=lambda s: [int(x) for x in s.split(',')], default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--min-seconds", type=float, default=1.0, help="Minimum run time per batch size")
+    parser.add_argument("--cold-start-runs", type=int, default=3)
+    parser.add_argument("--include-server", action="store_true", help="Also time server.predict (needs Mongo)")
+    parser.add_argument("--output", default="bench_inference.json")
+    parser.add_argument("--baseline", help="Previous results file to gate against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown, e.g. 0.10 for 10%%")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    from model_loader import load_model
+
+    beats = np.vstack([load_sample_beat()[None, :], synthetic_beats(255, seed=0)])
+    model = load_model(args.model)
+
+    results = {
+        'meta': {
+            'timestamp': time.time(),
+            'model': os.path.abspath(args.model),
+            'python': platform.python_version(),
+            'tensorflow': tf.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'cpu_count': os.cpu_count()
+        },
+        'results': {
+            **bench_cold_start(args.model, args.cold_start_runs),
+            'latency_ms': bench_latency(model, beats, args.iterations, args.warmup, args.include_server),
+            'throughput': bench_throughput(model, beats, args.batch_sizes, args.min_seconds)
+        }
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results['results'], indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%}")
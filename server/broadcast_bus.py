@@ -0,0 +1,205 @@
+import argparse
+import asyncio
+import fnmatch
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+from typing import AsyncIterator, Iterable, Tuple
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUS_URL = 'unix:///tmp/ecg-bus.sock'
+
+# Frames are a 4-byte big-endian length, then "<topic>\n<payload>"
+_LENGTH = struct.Struct('>I')
+SUBSCRIBE_TOPIC = '__subscribe__'
+
+
+def encode_frame(topic: str, payload: bytes) -> bytes:
+    body = topic.encode('utf-8') + b'\n' + payload
+    return _LENGTH.pack(len(body)) + body
+
+
+def decode_frame(body: bytes) -> Tuple[str, bytes]:
+    topic, _, payload = body.partition(b'\n')
+    return topic.decode('utf-8'), payload
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Tuple[str, bytes]:
+    length, = _LENGTH.unpack(await reader.readexactly(_LENGTH.size))
+    return decode_frame(await reader.readexactly(length))
+
+
+def _unix_path(url: str) -> str:
+    parsed = urlparse(url)
+    if parsed.scheme != 'unix':
+        raise ValueError(f"Expected a unix:// bus URL, got {url!r}")
+    return parsed.path
+
+
+class BusHub:
+    """
+    Local pub/sub broker on a Unix socket. Publishers write frames; a
+    subscriber first sends one SUBSCRIBE_TOPIC frame whose payload is
+    comma-separated topic patterns (fnmatch, e.g. "*/beat") and then only
+    reads. Each subscriber has its own bounded queue, so a stalled one
+    loses frames instead of holding up publishers or other subscribers.
+    """
+
+    def __init__(self, url: str = DEFAULT_BUS_URL, subscriber_queue: int = 4096):
+        self.path = _unix_path(url)
+        self.subscriber_queue = subscriber_queue
+        self.subscribers = {}
+        self.dropped = 0
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            topic, payload = await read_frame(reader)
+            if topic == SUBSCRIBE_TOPIC:
+                await self._serve_subscriber(payload.decode('utf-8').split(','), writer)
+                return
+            while True:
+                self._publish(topic, payload)
+                topic, payload = await read_frame(reader)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _publish(self, topic: str, payload: bytes) -> None:
+        frame = None
+        for patterns, frames in self.subscribers.values():
+            if any(fnmatch.fnmatchcase(topic, pattern) for pattern in patterns):
+                frame = frame or encode_frame(topic, payload)
+                try:
+                    frames.put_nowait(frame)
+                except asyncio.QueueFull:
+                    self.dropped += 1
+
+    async def _serve_subscriber(self, patterns, writer: asyncio.StreamWriter) -> None:
+        frames = asyncio.Queue(self.subscriber_queue)
+        key = id(writer)
+        self.subscribers[key] = (patterns, frames)
+        try:
+            while True:
+                writer.write(await frames.get())
+                # Batch whatever else is already queued into the same drain
+                while not frames.empty():
+                    writer.write(frames.get_nowait())
+                await writer.drain()
+        finally:
+            del self.subscribers[key]
+
+    async def serve(self) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, self.path)
+        logger.info("Bus hub listening", extra={"path": self.path})
+        async with server:
+            await server.serve_forever()
+
+
+class BusPublisher:
+    """
+    Thread-safe, non-blocking publisher for the detector. publish() only
+    enqueues; a background thread keeps a connection to the hub (or Redis)
+    and writes frames, reconnecting as needed. When the bus is down frames
+    are dropped, never buffered without bound.
+    """
+
+    def __init__(self, url: str = DEFAULT_BUS_URL, max_queue: int = 4096):
+        self.url = url
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='bus-publisher', daemon=True)
+        self._thread.start()
+
+    def publish(self, topic: str, payload) -> None:
+        if isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        try:
+            self.queue.put_nowait((topic, payload))
+        except queue.Full:
+            self.dropped += 1
+
+    def _connect(self):
+        if self.url.startswith('redis://'):
+            import redis
+            return redis.Redis.from_url(self.url)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(_unix_path(self.url))
+        return sock
+
+    def _run(self) -> None:
+        connection = None
+        while not self._stop.is_set():
+            try:
+                topic, payload = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                if connection is None:
+                    connection = self._connect()
+                if isinstance(connection, socket.socket):
+                    connection.sendall(encode_frame(topic, payload))
+                else:
+                    connection.publish(topic, payload)
+            except Exception as e:
+                # OSError for the socket; redis-py has its own ConnectionError hierarchy
+                self.dropped += 1
+                logger.warning("Bus publish failed", extra={"url": self.url, "error": str(e)})
+                if isinstance(connection, socket.socket):
+                    connection.close()
+                connection = None
+                time.sleep(1.0)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=2)
+
+
+async def subscribe(url: str, patterns: Iterable[str] = ('*',)) -> AsyncIterator[Tuple[str, bytes]]:
+    """Yield (topic, payload) from the hub or Redis, reconnecting on failure"""
+    patterns = list(patterns)
+    retryable = (OSError, asyncio.IncompleteReadError)
+    if url.startswith('redis://'):
+        import redis.exceptions
+        # redis-py's connection errors are not OSErrors
+        retryable += (redis.exceptions.ConnectionError, redis.exceptions.TimeoutError)
+    while True:
+        try:
+            if url.startswith('redis://'):
+                import redis.asyncio as aioredis
+                pubsub = aioredis.Redis.from_url(url).pubsub()
+                await pubsub.psubscribe(*patterns)
+                async for message in pubsub.listen():
+                    if message['type'] == 'pmessage':
+                        yield message['channel'].decode('utf-8'), message['data']
+            else:
+                reader, writer = await asyncio.open_unix_connection(_unix_path(url))
+                writer.write(encode_frame(SUBSCRIBE_TOPIC, ','.join(patterns).encode('utf-8')))
+                await writer.drain()
+                while True:
+                    yield await read_frame(reader)
+        except retryable as e:
+            logger.warning("Bus subscription lost, retrying", extra={"url": url, "error": str(e)})
+            await asyncio.sleep(1.0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the local prediction bus hub")
+    parser.add_argument("--url", default=os.environ.get("ECG_BUS_URL", DEFAULT_BUS_URL))
+    args = parser.parse_args()
+
+    from log_config import configure_logging
+    configure_logging()
+    try:
+        asyncio.run(BusHub(args.url).serve())
+    except KeyboardInterrupt:
+        pass
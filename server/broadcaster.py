@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import multiprocessing
+import os
+import signal
+import sys
+from typing import Optional, Set, Tuple
+from urllib.parse import unquote
+import websockets
+from broadcast_bus import DEFAULT_BUS_URL, subscribe
+
+KINDS = {'': {'beat'}, 'summary': {'summary'}, 'all': {'beat', 'summary'}}
+
+
+def parse_path(path: str) -> Tuple[Optional[str], Set[str]]:
+    """
+    Map a viewer's URL path to (device, message kinds). "/", "/summary" and
+    "/all" cover every device; "/devices/<id>[/summary|/all]" one device,
+    with the id URL-encoded.
+    """
+    path = path.split('?')[0].strip('/')
+    if not path.startswith('devices/'):
+        return None, KINDS.get(path, {'beat'})
+    device = path[len('devices/'):]
+    for suffix in ('summary', 'all'):
+        if device.endswith('/' + suffix):
+            return unquote(device[:-len(suffix) - 1]), KINDS[suffix]
+    return unquote(device), KINDS['']
+
+
+class Broadcaster:
+    """
+    Stateless fan-out of detector output to WebSocket viewers. Everything it
+    sends comes from the bus, so any number of these can run side by side
+    behind one port (SO_REUSEPORT) and viewers can land on any of them.
+    """
+
+    def __init__(self, bus_url: str = DEFAULT_BUS_URL):
+        self.bus_url = bus_url
+        self.clients = {}
+
+    async def handler(self, websocket):
+        path = websocket.request.path if hasattr(websocket, 'request') else '/'
+        self.clients[websocket] = parse_path(path)
+        try:
+            await websocket.wait_closed()
+        finally:
+            self.clients.pop(websocket, None)
+
+    async def pump(self):
+        async for topic, payload in subscribe(self.bus_url):
+            device, _, kind = topic.rpartition('/')
+            recipients = [client for client, (wanted, kinds) in list(self.clients.items())
+                          if kind in kinds and (wanted is None or wanted == device)]
+            if recipients:
+                # Writes without awaiting each viewer; slow viewers cannot stall the rest
+                websockets.broadcast(recipients, payload.decode('utf-8'))
+
+    async def serve(self, host: str = '0.0.0.0', port: int = 8765, reuse_port: bool = False):
+        async with websockets.serve(self.handler, host, port, reuse_port=reuse_port):
+            await self.pump()
+
+
+def run_worker(bus_url: str, host: str, port: int, reuse_port: bool) -> None:
+    try:
+        asyncio.run(Broadcaster(bus_url).serve(host, port, reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fan detector predictions out to WebSocket viewers from the bus")
+    parser.add_argument("--bus", default=os.environ.get("ECG_BUS_URL", DEFAULT_BUS_URL))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("ECG_BROADCAST_PORT", 8765)))
+    parser.add_argument("--workers", type=int, default=1, help="Broadcaster processes sharing the port")
+    args = parser.parse_args()
+
+    print(f"Broadcasting {args.bus} on ws://{args.host}:{args.port} with {args.workers} worker(s)")
+    if args.workers == 1:
+        run_worker(args.bus, args.host, args.port, False)
+    else:
+        # Daemon workers are terminated on exit, including a SIGTERM to this parent
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        workers = [multiprocessing.Process(target=run_worker, args=(args.bus, args.host, args.port, True),
+                                           daemon=True)
+                   for _ in range(args.workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,96 @@
+import gzip
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+class Compress:
+    """
+    Compress large JSON/text responses with brotli or gzip, depending on
+    the client's Accept-Encoding. Small bodies are sent as-is since the
+    framing overhead outweighs the savings. Streamed responses are
+    compressed chunk by chunk, each chunk flushed so clients can decode
+    it as soon as it arrives.
+    """
+
+    COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html", "application/x-ndjson")
+
+    def __init__(self, app=None, min_size=1024, gzip_level=6, brotli_quality=4):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_size = app.config.get("COMPRESS_MIN_SIZE", self.min_size)
+        app.after_request(self.after_request)
+
+    def _choose_encoding(self):
+        accepted = request.accept_encodings
+        if brotli is not None and accepted["br"]:
+            return "br"
+        if accepted["gzip"]:
+            return "gzip"
+        return None
+
+    def after_request(self, response):
+        if (
+            response.status_code < 200
+            or response.status_code in (204, 304)
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in self.COMPRESSIBLE_TYPES
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+
+        encoding = self._choose_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.response, encoding)
+            response.headers.pop("Content-Length", None)
+            response.headers["Content-Encoding"] = encoding
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        if encoding == "br":
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.gzip_level)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def _compress_stream(self, chunks, encoding):
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            # wbits=31 writes the gzip header and trailer
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+            compress, finish = compressor.compress, compressor.flush
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                data = compress(chunk) + flush()
+                if data:
+                    yield data
+            yield finish()
+        finally:
+            # Close the inner generator (and its cursor) on client disconnect
+            if hasattr(chunks, "close"):
+                chunks.close()
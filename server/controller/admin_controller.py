@@ -0,0 +1,164 @@
+import hmac
+import os
+from functools import wraps
+from flask import request, jsonify
+from profiling import PROFILER
+from model_registry import MODELS
+from typing import Dict, Any, Tuple
+
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def admin_required(fn):
+    """
+    Guard an admin route. With ADMIN_TOKEN set the request must carry it in
+    X-Admin-Token; without it only local requests are accepted.
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = os.environ.get('ADMIN_TOKEN')
+        if token:
+            allowed = hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+        else:
+            allowed = request.remote_addr in LOCAL_ADDRESSES
+        if not allowed:
+            return jsonify({
+                'success': False,
+                'message': 'Admin access required'
+            }), 403
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+@admin_required
+def get_profiling_controller() -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to report the profiler's mode, rate and collected calls.
+    Corresponds to GET /api/v1/admin/profiling
+    """
+    return jsonify({'success': True, 'profiling': PROFILER.status()}), 200
+
+
+@admin_required
+def update_profiling_controller() -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to switch profiling mode and/or sample rate at runtime.
+    Corresponds to PUT /api/v1/admin/profiling
+    """
+    try:
+        data = request.get_json() or {}
+        rate = data.get('rate')
+        PROFILER.configure(mode=data.get('mode'), rate=float(rate) if rate is not None else None)
+        return jsonify({'success': True, 'profiling': PROFILER.status()}), 200
+
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid profiling settings: {str(e)}'
+        }), 400
+
+
+@admin_required
+def dump_profiling_controller() -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to write collected profiles to disk and reset them.
+    Corresponds to POST /api/v1/admin/profiling/dump
+    """
+    try:
+        return jsonify({'success': True, 'files': PROFILER.dump()}), 200
+
+    except OSError as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error writing profiles: {str(e)}'
+        }), 500
+
+
+@admin_required
+def get_models_controller() -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to list the active, previous, shadow and loading models.
+    Corresponds to GET /api/v1/admin/models
+    """
+    return jsonify({'success': True, 'models': MODELS.status()}), 200
+
+
+@admin_required
+def load_model_controller() -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to load a model version in the background, as the
+    active model (swapped in once warm) or as the shadow candidate.
+    Corresponds to POST /api/v1/admin/models
+    """
+    data = request.get_json() or {}
+    path = data.get('path')
+    role = data.get('role', 'active')
+
+    if not path or not os.path.isfile(path):
+        return jsonify({
+            'success': False,
+            'message': f'Model file not found: {path}'
+        }), 400
+    if role not in ('active', 'shadow'):
+        return jsonify({
+            'success': False,
+            'message': "role must be 'active' or 'shadow'"
+        }), 400
+
+    key = MODELS.load_async(path, data.get('version'), role)
+    return jsonify({'success': True, 'loading': key}), 202
+
+
+@admin_required
+def update_shadow_controller() -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to set the fraction of traffic scored by the shadow
+    model, or to drop the shadow model with {"enabled": false}.
+    Corresponds to PUT /api/v1/admin/models/shadow
+    """
+    try:
+        data = request.get_json() or {}
+        if data.get('enabled') is False:
+            MODELS.clear_shadow()
+        else:
+            if MODELS.shadow is None:
+                return jsonify({
+                    'success': False,
+                    'message': 'No shadow model loaded'
+                }), 409
+            MODELS.set_shadow_rate(float(data.get('rate', 0.1)))
+        return jsonify({'success': True, 'models': MODELS.status()}), 200
+
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid shadow settings: {str(e)}'
+        }), 400
+
+
+@admin_required
+def promote_shadow_controller() -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to make the shadow model the active model.
+    Corresponds to POST /api/v1/admin/models/shadow/promote
+    """
+    if MODELS.promote_shadow() is None:
+        return jsonify({
+            'success': False,
+            'message': 'No shadow model loaded'
+        }), 409
+    return jsonify({'success': True, 'models': MODELS.status()}), 200
+
+
+@admin_required
+def rollback_model_controller() -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to swap back to the previously active model.
+    Corresponds to POST /api/v1/admin/models/rollback
+    """
+    if MODELS.rollback() is None:
+        return jsonify({
+            'success': False,
+            'message': 'No previous model to roll back to'
+        }), 409
+    return jsonify({'success': True, 'models': MODELS.status()}), 200
@@ -0,0 +1,160 @@
+import json
+from flask import request, jsonify, Response, stream_with_context
+from batch_jobs import JOBS
+from model.jobModel import JobModel, COMPLETED, FINAL_STATES
+from typing import Dict, Any, Tuple
+
+MIN_PRIORITY = 0
+MAX_PRIORITY = 9
+
+
+def _job_response(job: Dict[str, Any], status: int) -> Tuple[Dict[str, Any], int]:
+    return jsonify({'success': True, 'job': JobModel.to_json(job)}), status
+
+
+def _not_found(job_id: str) -> Tuple[Dict[str, Any], int]:
+    return jsonify({
+        'success': False,
+        'message': f'Job {job_id} not found'
+    }), 404
+
+
+def submit_job_controller() -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to queue a batch classification of a recording file
+    or of an archived device time range.
+    Corresponds to POST /api/v1/jobs
+    """
+    try:
+        data = request.get_json() or {}
+        user_id = data.get('userId')
+        if not user_id:
+            return jsonify({
+                'success': False,
+                'message': "Missing required field: userId"
+            }), 400
+
+        priority = data.get('priority', 5)
+        if not isinstance(priority, int) or not MIN_PRIORITY <= priority <= MAX_PRIORITY:
+            return jsonify({
+                'success': False,
+                'message': f"'priority' must be an integer from {MIN_PRIORITY} to {MAX_PRIORITY}"
+            }), 400
+
+        if data.get('recording'):
+            JOBS.recording_path(data['recording'])
+            source = {'recording': data['recording']}
+        elif data.get('deviceId'):
+            source = JOBS.archive_source(data['deviceId'], float(data['start']), float(data['end']))
+        else:
+            return jsonify({
+                'success': False,
+                'message': "Provide either 'recording' or 'deviceId' with 'start' and 'end'"
+            }), 400
+
+        options = {key: data[key] for key in ('threshold', 'column', 'rawDtype') if key in data}
+        job = JOBS.submit(str(user_id), source, priority, options, data.get('patientId'))
+        return _job_response(job, 202)
+
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'message': f'Invalid job request: {str(e)}'
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error submitting job: {str(e)}'
+        }), 500
+
+
+def list_jobs_controller() -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to list a user's most recent jobs.
+    Corresponds to GET /api/v1/jobs?userId=
+    """
+    user_id = request.args.get('userId')
+    if not user_id:
+        return jsonify({
+            'success': False,
+            'message': "Missing required parameter: userId"
+        }), 400
+    try:
+        jobs = JobModel.list_for_user(user_id)
+        return jsonify({'success': True, 'jobs': [JobModel.to_json(job) for job in jobs]}), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving jobs: {str(e)}'
+        }), 500
+
+
+def get_job_controller(job_id: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to report a job's status and progress.
+    Corresponds to GET /api/v1/jobs/:job_id
+    """
+    try:
+        job = JobModel.get(job_id)
+        if not job:
+            return _not_found(job_id)
+        return _job_response(job, 200)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving job: {str(e)}'
+        }), 500
+
+
+def cancel_job_controller(job_id: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to cancel a queued or running job.
+    Corresponds to POST /api/v1/jobs/:job_id/cancel
+    """
+    try:
+        job = JOBS.cancel(job_id)
+        if not job:
+            return _not_found(job_id)
+        if job['status'] in FINAL_STATES and not job.get('cancelRequested'):
+            return jsonify({
+                'success': False,
+                'message': f"Job already {job['status']}"
+            }), 409
+        # Running jobs stop at their next progress check
+        return _job_response(job, 202 if job['status'] not in FINAL_STATES else 200)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error cancelling job: {str(e)}'
+        }), 500
+
+
+def stream_job_results_controller(job_id: str):
+    """
+    Controller function to stream a completed job's beats as NDJSON, one
+    {"beatStart", "label", "confidence"} object per line.
+    Corresponds to GET /api/v1/jobs/:job_id/results
+    """
+    job = JobModel.get(job_id)
+    if not job:
+        return _not_found(job_id)
+    if job['status'] != COMPLETED:
+        return jsonify({
+            'success': False,
+            'message': f"Job is {job['status']}; results are available once it has completed"
+        }), 409
+
+    def generate():
+        for chunk in JobModel.iter_results(job_id):
+            lines = [
+                json.dumps({'beatStart': start, 'label': label, 'confidence': confidence})
+                for start, label, confidence in zip(chunk['beatStart'], chunk['label'], chunk['confidence'])
+            ]
+            if lines:
+                yield '\n'.join(lines) + '\n'
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Job-Beats': str((job.get('summary') or {}).get('beats', 0))}
+    )
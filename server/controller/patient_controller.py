@@ -90,9 +90,29 @@
 
 
 
-from flask import request, jsonify
+import json
+import queue
+from itertools import chain
+from flask import request, jsonify, Response, stream_with_context
 from model.reportModel import PatientModel
-from typing import Dict, Any, Tuple, Union
+from http_cache import make_etag, not_modified_response, cached_json, cached_json_array, cached_ndjson
+from json_provider import wants_ndjson
+from report_dates import parse_report_date, parse_range_end
+from report_events import report_events
+from typing import Dict, Any, Iterator, Optional, Tuple, Union
+
+TIMELINE_DEFAULT_LIMIT = 100
+TIMELINE_MAX_LIMIT = 1000
+
+def _peek(documents: Iterator[Dict[str, Any]]) -> Optional[Iterator[Dict[str, Any]]]:
+    """
+    Read the first document before the response starts, so database errors
+    still become a 500 and empty results can be told apart; None if empty.
+    """
+    first = next(documents, None)
+    if first is None:
+        return None
+    return chain([first], documents)
 
 def add_patient_controller() -> Tuple[Dict[str, Any], int]:
     """
@@ -112,6 +132,9 @@ def add_patient_controller() -> Tuple[Dict[str, Any], int]:
                     'message': f'Missing required field: {field}'
                 }), 400
         
+        if data.get('date'):
+            parse_report_date(data['date'])
+        
         # Remove check for existing patient to allow multiple reports per patient
         # Each report will have the same patientId but a unique _id in MongoDB
         
@@ -120,6 +143,11 @@ def add_patient_controller() -> Tuple[Dict[str, Any], int]:
         
         return jsonify(new_patient), 201
     
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -130,15 +158,28 @@ def get_all_patients_controller() -> Tuple[Dict[str, Any], int]:
     """
     Controller function to get all patient records.
     Corresponds to GET /api/v1/patients
+    The array is streamed from the cursor in chunks, so memory use does not
+    grow with the collection. With Accept: application/x-ndjson (or
+    ?format=ndjson) records are sent one per line instead.
     """
     try:
-        patients = PatientModel.get_all()
+        ndjson = wants_ndjson()
+        # Answer unchanged polls from the version counter alone
+        version = PatientModel.get_collection_version()
+        etag = make_etag('patients', version['revision'])
+        if ndjson:
+            etag += '-ndjson'
+        not_modified = not_modified_response(etag, version['updatedAt'])
+        if not_modified:
+            return not_modified
         
         # If no patients found, return an empty array (not an error)
-        if not patients:
-            return jsonify([]), 200
+        patients = _peek(PatientModel.iter_all()) or []
         
-        return jsonify(patients), 200
+        if ndjson:
+            return cached_ndjson(patients, etag, version['updatedAt']), 200
+        
+        return cached_json_array(patients, etag, version['updatedAt']), 200
     
     except Exception as e:
         return jsonify({
@@ -160,7 +201,12 @@ def get_patient_controller(patient_id: str) -> Tuple[Dict[str, Any], int]:
                 'message': f'Patient with ID {patient_id} not found'
             }), 404
         
-        return jsonify(patient), 200
+        etag = make_etag('patient', patient.get('_id'), patient.get('revision', 0))
+        not_modified = not_modified_response(etag, patient.get('updatedAt'))
+        if not_modified:
+            return not_modified
+        
+        return cached_json(patient, etag, patient.get('updatedAt')), 200
     
     except Exception as e:
         return jsonify({
@@ -204,7 +250,7 @@ def update_patient_status_controller(patient_id: str) -> Tuple[Dict[str, Any], i
         
         # Now we have the patient/report, update its status
         # Use MongoDB ID if available for more precise targeting
-        report_id = patient.get('_id', patient_id)
+        report_id = str(patient.get('_id', patient_id))
         updated_patient = PatientModel.update_status_by_id(report_id, status)
         
         if not updated_patient:
@@ -238,11 +284,7 @@ def edit_patient_controller(patient_id: str) -> Tuple[Dict[str, Any], int]:
             
             # If still not found, try to find by UUID id field
             if not patient:
-                all_reports = PatientModel.get_all()
-                for report in all_reports:
-                    if report.get('id') == patient_id:
-                        patient = report
-                        break
+                patient = PatientModel.get_by_uuid(patient_id)
             
             if not patient:
                 return jsonify({
@@ -250,6 +292,9 @@ def edit_patient_controller(patient_id: str) -> Tuple[Dict[str, Any], int]:
                     'message': f'Report with ID {patient_id} not found'
                 }), 404
         
+        if 'date' in data:
+            parse_report_date(data['date'])
+        
         # Prevent changing patientId if present in the original report
         if 'patientId' in data and patient.get('patientId') and data['patientId'] != patient.get('patientId'):
             return jsonify({
@@ -258,7 +303,7 @@ def edit_patient_controller(patient_id: str) -> Tuple[Dict[str, Any], int]:
             }), 400
         
         # Determine which ID to use for the update
-        if patient.get('_id') == patient_id:
+        if str(patient.get('_id')) == patient_id:
             # It's a MongoDB _id
             updated_patient = PatientModel.update_by_mongodb_id(patient_id, data)
         elif patient.get('id') == patient_id:
@@ -276,6 +321,11 @@ def edit_patient_controller(patient_id: str) -> Tuple[Dict[str, Any], int]:
         
         return jsonify(updated_patient), 200
     
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -286,24 +336,118 @@ def get_patient_reports_by_user_id_controller(user_id: str):
     """
     Controller function to get all reports for a specific user by their numeric ID.
     Corresponds to GET /api/v1/patients/user/:user_id
+    Supports NDJSON streaming like GET /api/v1/patients.
     """
     try:
+        ndjson = wants_ndjson()
         # Convert the user_id to int if possible
         try:
             user_id_int = int(user_id)
         except ValueError:
             user_id_int = user_id
         
+        version = PatientModel.get_collection_version()
+        etag = make_etag('reports', user_id_int, version['revision'])
+        if ndjson:
+            etag += '-ndjson'
+        not_modified = not_modified_response(etag, version['updatedAt'])
+        if not_modified:
+            return not_modified
+        
         # Get reports for the user
-        reports = PatientModel.get_by_user_id(user_id_int)
+        reports = _peek(PatientModel.iter_by_user_id(user_id_int))
         
-        if not reports or len(reports) == 0:
+        if reports is None:
             return jsonify({"message": "No reports found for this user", "reports": []}), 404
         
-        return jsonify({"message": "Reports retrieved successfully", "reports": reports}), 200
+        if ndjson:
+            return cached_ndjson(reports, etag, version['updatedAt']), 200
+        
+        return cached_json_array(
+            reports,
+            etag,
+            version['updatedAt'],
+            head='{"message":"Reports retrieved successfully","reports":',
+            tail='}'
+        ), 200
         
     except Exception as e:
         return jsonify({
             'success': False,
             'message': f'Error retrieving patient reports: {str(e)}'
-        }), 500
\ No newline at end of file
+        }), 500
+
+def get_patient_timeline_controller(user_id: str) -> Tuple[Dict[str, Any], int]:
+    """
+    Controller function to get a user's reports in date order, optionally
+    within a date range (from inclusive, to inclusive of the whole day).
+    Corresponds to GET /api/v1/patients/user/:user_id/timeline?from=&to=&limit=
+    """
+    try:
+        start = parse_report_date(request.args['from']) if request.args.get('from') else None
+        end = parse_range_end(request.args['to']) if request.args.get('to') else None
+        limit = request.args.get('limit', str(TIMELINE_DEFAULT_LIMIT))
+        if not limit.isdigit() or not 1 <= int(limit) <= TIMELINE_MAX_LIMIT:
+            raise ValueError(f"'limit' must be an integer between 1 and {TIMELINE_MAX_LIMIT}")
+        limit = int(limit)
+        if start and end and end <= start:
+            raise ValueError("'to' must not be before 'from'")
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    try:
+        version = PatientModel.get_collection_version()
+        etag = make_etag('timeline', user_id, request.args.get('from', ''), request.args.get('to', ''),
+                         limit, version['revision'])
+        not_modified = not_modified_response(etag, version['updatedAt'])
+        if not_modified:
+            return not_modified
+        
+        # One extra row tells the client whether the range holds more
+        reports = PatientModel.get_timeline(user_id, start, end, limit + 1)
+        
+        return cached_json({
+            'reports': reports[:limit],
+            'count': min(len(reports), limit),
+            'hasMore': len(reports) > limit
+        }, etag, version['updatedAt']), 200
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': f'Error retrieving patient timeline: {str(e)}'
+        }), 500
+
+def stream_patient_updates_controller():
+    """
+    Controller function to push report changes as Server-Sent Events.
+    Corresponds to GET /api/v1/patients/stream?doctorName=&patientId=
+    """
+    subscription = report_events.subscribe(
+        doctor_name=request.args.get('doctorName') or None,
+        patient_id=request.args.get('patientId') or None
+    )
+    
+    def generate():
+        try:
+            # Tell EventSource how long to wait before reconnecting
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = subscription.events.get(timeout=15)
+                except queue.Empty:
+                    # Comment frame keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: report\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            report_events.unsubscribe(subscription)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
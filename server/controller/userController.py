@@ -1,6 +1,9 @@
+import logging
 from flask import request, jsonify
 from model.userModel import UserModel, bcrypt
 
+logger = logging.getLogger(__name__)
+
 def register_controller():
     try:
         data = request.get_json()
@@ -52,7 +55,7 @@ def login_controller():
 
         # Check if password is correct
         if not bcrypt.check_password_hash(user["password"], password):
-            print("Password mismatch!")  # Debugging
+            logger.debug("Password mismatch", extra={"email": email})
             return jsonify({"error": "Invalid email or password"}), 401
 
         # Create a user object to send back (including user type)
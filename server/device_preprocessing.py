@@ -0,0 +1,184 @@
+from fractions import Fraction
+from typing import Optional
+import numpy as np
+
+# Rate the model was trained at (MIT-BIH); every device is brought to this
+MODEL_SAMPLE_RATE = 360.0
+# Device rates accepted from clients. Resampling work grows as 1/rate, so
+# an arbitrarily low declared rate would be a memory exhaustion vector.
+MIN_DEVICE_RATE = 50.0
+MAX_DEVICE_RATE = 2000.0
+
+
+def check_sample_rate(rate: float) -> float:
+    """A client-declared device rate, or ValueError outside MIN/MAX_DEVICE_RATE"""
+    rate = float(rate)
+    if not MIN_DEVICE_RATE <= rate <= MAX_DEVICE_RATE:
+        raise ValueError(f"Sample rate must be between {MIN_DEVICE_RATE:g} and {MAX_DEVICE_RATE:g} Hz")
+    return rate
+
+
+def lowpass_taps(up: int, down: int, taps_per_phase: int = 24, beta: float = 8.0) -> np.ndarray:
+    """Kaiser-windowed sinc at the upsampled rate, cut off below the lower Nyquist"""
+    count = taps_per_phase * up
+    cutoff = 1.0 / max(up, down)
+    n = np.arange(count) - (count - 1) / 2.0
+    taps = cutoff * np.sinc(cutoff * n) * np.kaiser(count, beta)
+    # Unity DC gain per output phase
+    return taps * up / taps.sum()
+
+
+class StreamingResampler:
+    """
+    Rational polyphase resampler (up/down from the rate ratio) that can be
+    fed arbitrarily sized chunks; the last taps_per_phase-1 input samples
+    and the output phase are carried between calls, so chunked and one-shot
+    output are identical. Output lags input by the filter's group delay.
+    """
+
+    def __init__(self, source_rate: float, target_rate: float = MODEL_SAMPLE_RATE, taps_per_phase: int = 24):
+        ratio = Fraction(target_rate / source_rate).limit_denominator(1000)
+        self.up, self.down = ratio.numerator, ratio.denominator
+        self.passthrough = self.up == self.down
+        taps = lowpass_taps(self.up, self.down, taps_per_phase)
+        # phases[p, k] multiplies input sample i - k for outputs of phase p
+        self.phases = taps.reshape(taps_per_phase, self.up).T
+        self.taps_per_phase = taps_per_phase
+        # Group delay in output samples, for callers that need alignment
+        self.delay = (len(taps) - 1) / 2.0 / self.down
+        self._history = np.zeros(taps_per_phase - 1)
+        self._consumed = 0
+        self._next_output = 0
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if self.passthrough:
+            return chunk
+        x = np.concatenate([self._history, chunk])
+        base = self._consumed - len(self._history)
+        total = self._consumed + len(chunk)
+
+        # Every output whose newest input sample has arrived
+        last = (total * self.up - 1) // self.down
+        n = np.arange(self._next_output, last + 1)
+        positions = n * self.down
+        inputs = positions // self.up - base
+        index = inputs[:, None] - np.arange(self.taps_per_phase)
+        y = np.einsum('ij,ij->i', self.phases[positions % self.up], x[index]) if len(n) else np.empty(0)
+
+        self._next_output = last + 1
+        self._consumed = total
+        self._history = x[-(self.taps_per_phase - 1):]
+        return y
+
+
+class BaselineRemover:
+    """
+    Subtract a centred moving average of `seconds` length (baseline wander
+    and DC offset). Output lags input by half the window.
+    """
+
+    def __init__(self, sample_rate: float, seconds: float = 0.6):
+        self.width = max(int(seconds * sample_rate) | 1, 3)
+        self.delay = self.width // 2
+        self._tail = None
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if self._tail is None:
+            if not len(chunk):
+                return chunk
+            # Prime with the first sample so start-up has no step
+            self._tail = np.full(self.width - 1, chunk[0])
+        x = np.concatenate([self._tail, chunk])
+        sums = np.cumsum(np.concatenate([[0.0], x]))
+        baseline = (sums[self.width:] - sums[:-self.width]) / self.width
+        centre = x[self.delay:self.delay + len(baseline)]
+        self._tail = x[-(self.width - 1):]
+        return centre - baseline
+
+
+class PeakNormalizer:
+    """
+    Scale so the tracked peak |amplitude| sits at `target`. The peak is a
+    decaying peak-hold with a `half_life` in seconds, updated per chunk.
+    """
+
+    def __init__(self, sample_rate: float, target: float = 1.0, half_life: float = 8.0):
+        self.target = target
+        self.decay = 0.5 ** (1.0 / (half_life * sample_rate))
+        self.peak = None
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if not len(chunk):
+            return chunk
+        chunk_peak = float(np.abs(chunk).max())
+        if self.peak is None:
+            self.peak = chunk_peak
+        else:
+            self.peak = max(self.peak * self.decay ** len(chunk), chunk_peak)
+        return chunk * (self.target / self.peak) if self.peak > 0 else chunk
+
+
+class DevicePreprocessor:
+    """
+    Per-device stage ahead of segmentation: resample from the device's
+    declared rate to the model's, then optionally remove baseline wander and
+    normalise amplitude. A device already at the model's rate with both
+    options off passes through untouched.
+    """
+
+    def __init__(self, source_rate: float = MODEL_SAMPLE_RATE, remove_baseline: bool = False,
+                 normalize: bool = False, target_rate: float = MODEL_SAMPLE_RATE):
+        self.source_rate = source_rate
+        self.target_rate = target_rate
+        self.remove_baseline = remove_baseline
+        self.normalize = normalize
+        self.resampler = StreamingResampler(source_rate, target_rate)
+        self.baseline = BaselineRemover(target_rate) if remove_baseline else None
+        self.normalizer = PeakNormalizer(target_rate) if normalize else None
+
+    @property
+    def passthrough(self) -> bool:
+        return self.resampler.passthrough and self.baseline is None and self.normalizer is None
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        y = self.resampler.process(chunk)
+        if self.baseline is not None:
+            y = self.baseline.process(y)
+        if self.normalizer is not None:
+            y = self.normalizer.process(y)
+        return y
+
+
+def prepare_window(values, source_rate: Optional[float] = None, remove_baseline: bool = False,
+                   normalize: bool = False, max_samples: Optional[int] = None,
+                   target_rate: float = MODEL_SAMPLE_RATE) -> np.ndarray:
+    """
+    One-shot version for a single submitted beat (/predict): resample to the
+    model's target_rate with the filter delay compensated, so the R peak stays
+    at the same relative position. Only the first max_samples outputs (the
+    model's window) are computed.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if source_rate and source_rate != target_rate:
+        source_rate = check_sample_rate(source_rate)
+        resampler = StreamingResampler(source_rate, target_rate)
+        delay = int(round(resampler.delay))
+        # Flush the filter with edge padding, then drop the delayed lead-in
+        pad = int(np.ceil(delay * source_rate / target_rate)) + 1
+        padded = np.concatenate([values, np.full(pad, values[-1])])
+        expected = int(round(len(values) * target_rate / source_rate))
+        if max_samples is not None:
+            expected = min(expected, max_samples)
+        # Feed only the inputs the kept outputs depend on
+        needed = (delay + expected) * resampler.down // resampler.up + 1
+        resampler._history[:] = values[0]
+        values = resampler.process(padded[:needed])[delay:delay + expected]
+    if remove_baseline:
+        values = values - np.median(values)
+    if normalize:
+        peak = np.abs(values).max()
+        values = values / peak if peak > 0 else values
+    return values
@@ -0,0 +1,212 @@
+import json
+import os
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+# Input contract of the bundled model; other models bring their own (see InputSpec)
+WINDOW_SIZE = 200
+INPUT_SHAPE = (10, 20, 1)
+
+# ECGArrhythmiaDetector fires when the window's centre sample crosses this
+BEAT_THRESHOLD = 0.55
+BEAT_PEAK_INDEX = 100
+
+CLASS_LABELS = {
+    0: '/',
+    1: 'L',
+    2: 'N',
+    3: 'R',
+    4: 'V'
+}
+
+
+class InputSpec:
+    """
+    How a model's input is built from ECG samples, derived from its
+    input_shape: the last axis is leads and the rest, flattened row-major,
+    is `window` consecutive samples. (10, 20, 1) is 200 samples of one lead;
+    (360, 2) would be 360 samples of two. Windows are time-major with leads
+    interleaved ([t0 lead0, t0 lead1, t1 lead0, ...]), so filling the input
+    is a single reshape.
+
+    A JSON sidecar next to the model file, <model>.spec.json, may override
+    anything that cannot be read off the shape: peak_index, sample_rate,
+    threshold, trigger_lead and class labels. Deploying a new model then
+    needs no code change.
+    """
+
+    def __init__(self, input_shape: Tuple[int, ...] = INPUT_SHAPE, peak_index: Optional[int] = None,
+                 sample_rate: float = 360.0, threshold: float = BEAT_THRESHOLD, trigger_lead: int = 0,
+                 classes: Optional[Dict[int, str]] = None):
+        self.input_shape = tuple(int(d) for d in input_shape)
+        self.leads = self.input_shape[-1] if len(self.input_shape) > 1 else 1
+        self.window = int(np.prod(self.input_shape)) // self.leads
+        self.peak_index = self.window // 2 if peak_index is None else int(peak_index)
+        self.sample_rate = float(sample_rate)
+        self.threshold = float(threshold)
+        self.trigger_lead = int(trigger_lead)
+        self.classes = dict(classes or CLASS_LABELS)
+        if not 0 <= self.peak_index < self.window or not 0 <= self.trigger_lead < self.leads:
+            raise ValueError(f"Inconsistent input spec for shape {self.input_shape}")
+
+    @classmethod
+    def for_model(cls, model, path: Optional[str] = None) -> 'InputSpec':
+        """Spec from the model's input_shape, with the sidecar's overrides when there is one"""
+        options = {}
+        sidecar = spec_path(path) if path else None
+        if sidecar and os.path.exists(sidecar):
+            with open(sidecar) as f:
+                options = json.load(f)
+        if 'classes' in options:
+            options['classes'] = {int(index): label for index, label in options['classes'].items()}
+        input_shape = options.pop('input_shape', None) or tuple(model.input_shape[1:])
+        return cls(input_shape, **options)
+
+    @property
+    def size(self) -> int:
+        """Values in one flattened window"""
+        return self.window * self.leads
+
+    def prepare(self, windows) -> np.ndarray:
+        """
+        Shape windows into the model's (n,) + input_shape input. Accepts
+        (n, window, leads), or (n, values) already interleaved; short windows
+        are zero-padded and long ones truncated.
+        """
+        windows = np.asarray(windows, dtype=np.float32)
+        if windows.ndim == 3:
+            framed = np.zeros((len(windows), self.window, self.leads), dtype=np.float32)
+            clipped = windows[:, :self.window, :self.leads]
+            framed[:, :clipped.shape[1], :clipped.shape[2]] = clipped
+            return framed.reshape((-1,) + self.input_shape)
+        if windows.shape[1] > self.size:
+            windows = windows[:, :self.size]
+        elif windows.shape[1] < self.size:
+            windows = np.pad(windows, ((0, 0), (0, self.size - windows.shape[1])), mode='constant')
+        return windows.reshape((-1,) + self.input_shape)
+
+    def label(self, index: int) -> str:
+        return self.classes.get(int(index), f"Class {index}")
+
+    def to_dict(self) -> Dict:
+        return {
+            'input_shape': list(self.input_shape),
+            'leads': self.leads,
+            'window': self.window,
+            'peak_index': self.peak_index,
+            'sample_rate': self.sample_rate,
+            'threshold': self.threshold,
+            'trigger_lead': self.trigger_lead,
+            'classes': {str(index): label for index, label in self.classes.items()}
+        }
+
+
+def spec_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + '.spec.json'
+
+
+DEFAULT_SPEC = InputSpec()
+
+
+def preprocess_batch(windows: np.ndarray, spec: InputSpec = DEFAULT_SPEC) -> np.ndarray:
+    """Shape (n, window) float windows into the model's input, (n, 10, 20, 1) by default"""
+    return spec.prepare(windows)
+
+
+class StreamWindow:
+    """
+    The last `window` frames of a stream, one value per lead. Each frame is
+    written twice into a buffer of twice the length, so the current window
+    is always one contiguous, interleaved slice: appending is O(1) and
+    reading never copies.
+    """
+
+    def __init__(self, window: int = WINDOW_SIZE, leads: int = 1):
+        self.window = window
+        self.leads = leads
+        # float64 so samples published back to viewers keep their original values
+        self._data = np.zeros((2 * window, leads))
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, frame) -> None:
+        i = self._next
+        self._data[i] = frame
+        self._data[i + self.window] = frame
+        self._next = (i + 1) % self.window
+        self._count = min(self._count + 1, self.window)
+
+    def frames(self) -> np.ndarray:
+        """(len, leads) view, oldest first"""
+        end = self._next + self.window
+        return self._data[end - self._count:end]
+
+    def value(self, index: int, lead: int = 0) -> float:
+        return float(self._data[self._next + self.window - self._count + index, lead])
+
+    def clear(self) -> None:
+        self._count = 0
+
+
+def decode_predictions(probabilities: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (class index, confidence) per row, matching ECGArrhythmiaDetector.predict"""
+    probabilities = np.asarray(probabilities)
+    if probabilities.shape[1] == 1:
+        positive = probabilities[:, 0]
+        labels = (positive >= 0.5).astype(np.uint8)
+        confidence = np.where(labels == 1, positive, 1 - positive)
+    else:
+        labels = np.argmax(probabilities, axis=1).astype(np.uint8)
+        confidence = probabilities[np.arange(len(labels)), labels]
+    return labels, confidence
+
+
+class BeatSegmenter:
+    """
+    Vectorised version of the segmentation in ECGArrhythmiaDetector.process_sample:
+    a window is a beat when its peak_index sample exceeds the threshold, and
+    the buffer is cleared after every beat. State is carried across chunks so a
+    long recording can be fed piece by piece.
+    """
+
+    def __init__(self, threshold: float = BEAT_THRESHOLD, window: int = WINDOW_SIZE,
+                 peak_index: int = BEAT_PEAK_INDEX):
+        self.threshold = threshold
+        self.window = window
+        self.peak_index = peak_index
+        self._tail = np.empty(0, dtype=np.float32)
+        self._tail_start = 0      # global index of _tail[0]
+        self._next_start = 0      # earliest global window start after the last beat
+
+    def feed(self, chunk: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (global start index, windows) for every beat completed by this chunk"""
+        signal = np.concatenate([self._tail, np.asarray(chunk, dtype=np.float32)])
+        base = self._tail_start
+
+        last_start = len(signal) - self.window
+        first_start = max(self._next_start - base, 0)
+        starts = []
+        if last_start >= first_start:
+            peaks = signal[first_start + self.peak_index:last_start + self.peak_index + 1]
+            candidates = np.flatnonzero(peaks > self.threshold) + first_start
+            next_allowed = first_start
+            for start in candidates.tolist():
+                if start >= next_allowed:
+                    starts.append(start)
+                    next_allowed = start + self.window
+            self._next_start = base + next_allowed
+
+        starts = np.asarray(starts, dtype=np.int64)
+        if len(starts):
+            windows = signal[starts[:, None] + np.arange(self.window)]
+        else:
+            windows = np.empty((0, self.window), dtype=np.float32)
+
+        # Keep only what a future window could still start in
+        keep_from = max(min(self._next_start - base, len(signal)), len(signal) - self.window + 1, 0)
+        self._tail = signal[keep_from:].copy()
+        self._tail_start = base + keep_from
+        return starts + base, windows
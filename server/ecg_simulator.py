@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import json
+import time
+from typing import Optional
+import numpy as np
+import websockets
+from synthetic_ecg import synthetic_stream
+
+
+class ECGDeviceSimulator:
+    """
+    Stands in for the bedside ECG device. Each connection to ws://host:port/<n>
+    receives stream n as {"value", "ts", "sample_rate"} messages at sample_rate,
+    the same protocol ECGArrhythmiaDetector expects from real hardware. With
+    leads > 1 each message carries {"leads": [[lead 0], [lead 1], ...]}
+    instead; the extra leads are attenuated copies of the first.
+    Streams are synthetic by default, or replayed from a recording file.
+    """
+
+    def __init__(self, streams: int = 1, sample_rate: float = 360.0, heart_rate: float = 72.0,
+                 recording: Optional[str] = None, tick: float = 0.01, leads: int = 1):
+        self.sample_rate = sample_rate
+        self.tick = tick
+        self.gains = [1.0 - 0.2 * lead for lead in range(leads)]
+        if recording:
+            from batch_classify import iter_recording
+            signal = np.concatenate(list(iter_recording(recording)))
+            # Offset each stream so they are not beat-synchronous
+            self.signals = [np.roll(signal, i * len(signal) // max(streams, 1)) for i in range(streams)]
+        else:
+            self.signals = [
+                synthetic_stream(60.0, sample_rate, heart_rate * np.random.default_rng(i).uniform(0.85, 1.15), seed=i)
+                for i in range(streams)
+            ]
+        self.sent = 0
+
+    def _stream_index(self, websocket) -> int:
+        path = websocket.request.path if hasattr(websocket, 'request') else '/'
+        try:
+            return int(path.strip('/') or 0) % len(self.signals)
+        except ValueError:
+            return 0
+
+    async def handler(self, websocket):
+        signal = self.signals[self._stream_index(websocket)].tolist()
+        position = 0
+        started = time.monotonic()
+        sent = 0
+        try:
+            while True:
+                # Send however many samples are due so the rate holds under load
+                due = int((time.monotonic() - started) * self.sample_rate)
+                while sent < due:
+                    value = signal[position]
+                    if len(self.gains) > 1:
+                        message = {"leads": [[value * gain] for gain in self.gains]}
+                    else:
+                        message = {"value": value}
+                    await websocket.send(json.dumps({**message, "ts": time.time(), "sample_rate": self.sample_rate}))
+                    position = (position + 1) % len(signal)
+                    sent += 1
+                    self.sent += 1
+                await asyncio.sleep(self.tick)
+        except websockets.ConnectionClosed:
+            pass
+
+    async def serve(self, host: str = "0.0.0.0", port: int = 8181):
+        async with websockets.serve(self.handler, host, port):
+            print(f"Simulating {len(self.signals)} ECG stream(s) at {self.sample_rate:g} Hz on ws://{host}:{port}/<n>")
+            await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve synthetic or replayed ECG streams like the bedside device")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8181)
+    parser.add_argument("--streams", type=int, default=1)
+    parser.add_argument("--sample-rate", type=float, default=360.0)
+    parser.add_argument("--heart-rate", type=float, default=72.0)
+    parser.add_argument("--recording", help="Replay this file (.txt/.csv/.npy/.f32) instead of synthetic beats")
+    parser.add_argument("--leads", type=int, default=1, help="Send this many leads per sample for multi-lead models")
+    args = parser.parse_args()
+
+    simulator = ECGDeviceSimulator(args.streams, args.sample_rate, args.heart_rate, args.recording, leads=args.leads)
+    try:
+        asyncio.run(simulator.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
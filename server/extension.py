@@ -1,6 +1,8 @@
 from flask_pymongo import PyMongo
 from flask_bcrypt import Bcrypt
+from compression import Compress
 
-# Initialize MongoDB and Bcrypt globally
+# Initialize MongoDB, Bcrypt and response compression globally
 mongo = PyMongo()
 bcrypt = Bcrypt()
+compress = Compress()
@@ -0,0 +1,69 @@
+from datetime import datetime, timezone
+from typing import Any, Iterable, Optional
+from flask import request, jsonify, make_response
+from json_provider import ndjson_response, json_array_response
+
+
+def make_etag(*parts: Any) -> str:
+    """Build a cheap version token from revision counters and ids"""
+    return "-".join(str(part) for part in parts)
+
+
+def _as_utc(last_modified: Optional[datetime]) -> Optional[datetime]:
+    """Mongo returns naive UTC datetimes; HTTP dates need an explicit zone"""
+    if last_modified is None:
+        return None
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    # HTTP dates have one-second resolution
+    return last_modified.replace(microsecond=0)
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None):
+    """
+    Return a 304 response when the client already holds this version,
+    otherwise None so the caller goes on to build the full body.
+    If-None-Match takes precedence over If-Modified-Since (RFC 7232).
+    """
+    last_modified = _as_utc(last_modified)
+
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        matched = last_modified <= request.if_modified_since
+    else:
+        matched = False
+
+    if not matched:
+        return None
+
+    response = make_response("", 304)
+    return _with_validators(response, etag, last_modified)
+
+
+def cached_json(payload: Any, etag: str, last_modified: Optional[datetime] = None):
+    """jsonify the payload and attach ETag / Last-Modified validators"""
+    return _with_validators(jsonify(payload), etag, _as_utc(last_modified))
+
+
+def cached_json_array(documents: Iterable[Any], etag: str, last_modified: Optional[datetime] = None,
+                      head: str = '', tail: str = ''):
+    """Stream documents as a JSON array with ETag / Last-Modified validators"""
+    return _with_validators(json_array_response(documents, head, tail), etag, _as_utc(last_modified))
+
+
+def cached_ndjson(documents: Iterable[Any], etag: str, last_modified: Optional[datetime] = None):
+    """Stream documents as NDJSON with ETag / Last-Modified validators"""
+    return _with_validators(ndjson_response(documents), etag, _as_utc(last_modified))
+
+
+def _with_validators(response, etag: str, last_modified: Optional[datetime]):
+    # Weak, because the compression hook may re-encode the body
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    # Let clients keep the body but always revalidate before using it
+    response.headers["Cache-Control"] = "no-cache"
+    # JSON and NDJSON bodies share a URL
+    response.vary.add("Accept")
+    return response
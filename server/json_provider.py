@@ -0,0 +1,111 @@
+from datetime import date
+from typing import Any, Iterable, Iterator
+from bson.objectid import ObjectId
+from flask import current_app, request, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder is the fallback
+    orjson = None
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+# Documents serialized per chunk of a streamed response
+NDJSON_BATCH = 200
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, date):
+        # Same RFC 822 form Flask has always sent for datetimes
+        return http_date(value)
+    return DefaultJSONProvider.default(value)
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that serializes Mongo documents as they come off the
+    cursor: ObjectId becomes its hex string and datetimes keep Flask's HTTP
+    date format, so models no longer copy every document to stringify _id.
+
+    Uses orjson when it is installed, falling back to the stdlib encoder for
+    anything orjson cannot express (indented output, integers over 64 bits).
+    """
+
+    default = staticmethod(_default)
+
+    if orjson is not None:
+        OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+        def dumps(self, obj: Any, **kwargs: Any) -> str:
+            # Flask only passes separators for compact output, which orjson always produces
+            if not set(kwargs) - {'separators'}:
+                option = self.OPTIONS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+                try:
+                    return orjson.dumps(obj, default=self.default, option=option).decode()
+                except TypeError:
+                    pass
+            return super().dumps(obj, **kwargs)
+
+        def loads(self, s: Any, **kwargs: Any) -> Any:
+            if kwargs:
+                return super().loads(s, **kwargs)
+            return orjson.loads(s)
+
+
+def init_app(app) -> None:
+    app.json = MongoJSONProvider(app)
+
+
+def wants_ndjson() -> bool:
+    """Client asked for one JSON document per line (Accept header or ?format=ndjson)"""
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+def _ndjson_lines(documents: Iterable[Any], batch: int) -> Iterator[str]:
+    dumps = current_app.json.dumps
+    lines = []
+    for document in documents:
+        lines.append(dumps(document))
+        if len(lines) >= batch:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def _json_array(documents: Iterable[Any], batch: int, head: str, tail: str) -> Iterator[str]:
+    dumps = current_app.json.dumps
+    chunk = head + '['
+    parts = []
+    for document in documents:
+        parts.append(dumps(document))
+        if len(parts) >= batch:
+            yield chunk + ','.join(parts)
+            # Every later chunk continues the array
+            chunk = ','
+            parts = []
+    yield (chunk + ','.join(parts) if parts else chunk.rstrip(',')) + ']' + tail + '\n'
+
+
+def json_array_response(documents: Iterable[Any], head: str = '', tail: str = '',
+                        batch: int = NDJSON_BATCH) -> Response:
+    """
+    Stream documents as one JSON array with chunked transfer encoding, so
+    the body is never held in memory whole. head/tail wrap the array, e.g.
+    '{"reports":' and '}'.
+    """
+    return Response(stream_with_context(_json_array(documents, batch, head, tail)), mimetype='application/json')
+
+
+def ndjson_response(documents: Iterable[Any], batch: int = NDJSON_BATCH) -> Response:
+    """
+    Stream documents (typically a live cursor) as NDJSON. The first lines go
+    out as soon as the first batch is read, instead of after the whole
+    result set has been loaded and encoded.
+    """
+    return Response(stream_with_context(_ndjson_lines(documents, batch)), mimetype=NDJSON_MIMETYPE)
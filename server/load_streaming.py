@@ -0,0 +1,204 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+import numpy as np
+import websockets
+
+
+class ViewerStats:
+    """What one stream's viewers saw during the measurement window"""
+
+    def __init__(self):
+        self.latencies = []
+        self.beats = set()
+        self.messages = 0
+        self.dropped = 0
+
+    def summary(self, duration: float) -> Dict:
+        latencies_ms = np.asarray(self.latencies) * 1000.0
+        result = {
+            'beats': len(self.beats),
+            'beats_per_s': len(self.beats) / duration,
+            'messages': self.messages,
+            'dropped': self.dropped
+        }
+        if len(latencies_ms):
+            result['latency_ms'] = {
+                'p50': float(np.percentile(latencies_ms, 50)),
+                'p95': float(np.percentile(latencies_ms, 95)),
+                'p99': float(np.percentile(latencies_ms, 99)),
+                'max': float(latencies_ms.max())
+            }
+        return result
+
+
+def cpu_seconds(pid: int) -> float:
+    """utime + stime of a process, from /proc"""
+    with open(f'/proc/{pid}/stat') as f:
+        # The command name may contain spaces; fields resume after ')'
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+async def viewer(url: str, stats: ViewerStats, measuring: asyncio.Event, ready: asyncio.Event,
+                 connect_timeout: float) -> None:
+    deadline = time.monotonic() + connect_timeout
+    while True:
+        try:
+            connection = await websockets.connect(url, max_queue=None)
+            break
+        except OSError:
+            # Detector still loading its model
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+    last_beat = None
+    async with connection:
+        async for message in connection:
+            received = time.time()
+            # Ready once data flows; a broadcaster accepts viewers before detectors are up
+            ready.set()
+            if not measuring.is_set():
+                continue
+            data = json.loads(message)
+            stats.messages += 1
+            stats.beats.add(data.get('beat'))
+            if data.get('sample_ts'):
+                stats.latencies.append(received - data['sample_ts'])
+            beat = data.get('beat')
+            # Beat numbers are consecutive per detector; a gap is a lost frame
+            if last_beat is not None and beat is not None and beat > last_beat + 1:
+                stats.dropped += beat - last_beat - 1
+            last_beat = beat
+
+
+async def run_load(viewer_urls: List[str], viewers_per_stream: int, duration: float, pids: List[Optional[int]],
+                   connect_timeout: float) -> Dict:
+    stats = defaultdict(ViewerStats)
+    measuring = asyncio.Event()
+    ready_events = []
+    tasks = []
+
+    for url in viewer_urls:
+        for _ in range(viewers_per_stream):
+            ready = asyncio.Event()
+            ready_events.append(ready)
+            tasks.append(asyncio.create_task(viewer(url, stats[url], measuring, ready, connect_timeout)))
+
+    await asyncio.wait_for(asyncio.gather(*(event.wait() for event in ready_events)), connect_timeout)
+    print(f"{len(tasks)} viewers connected to {len(viewer_urls)} stream(s); measuring for {duration:g}s")
+
+    cpu_before = [cpu_seconds(pid) if pid else None for pid in pids]
+    started = time.monotonic()
+    measuring.set()
+    await asyncio.sleep(duration)
+    measuring.clear()
+    elapsed = time.monotonic() - started
+    cpu_after = [cpu_seconds(pid) if pid else None for pid in pids]
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    streams = {}
+    for i, url in enumerate(viewer_urls):
+        summary = stats[url].summary(elapsed)
+        # Every viewer of a stream sees the same beats; report per-viewer drops
+        summary['dropped'] = stats[url].dropped / viewers_per_stream
+        if i < len(pids) and cpu_before[i] is not None:
+            summary['cpu_percent'] = (cpu_after[i] - cpu_before[i]) / elapsed * 100.0
+        streams[url] = summary
+
+    all_latencies = np.concatenate([np.asarray(s.latencies) for s in stats.values()] or [np.empty(0)]) * 1000.0
+    totals = {
+        'streams': len(viewer_urls),
+        'viewers': len(tasks),
+        'duration_s': elapsed,
+        'beats_per_s': sum(s['beats_per_s'] for s in streams.values()),
+        'dropped': sum(s['dropped'] for s in streams.values()),
+        'cpu_percent_per_stream': float(np.mean([s['cpu_percent'] for s in streams.values() if 'cpu_percent' in s]))
+        if any('cpu_percent' in s for s in streams.values()) else None
+    }
+    if len(all_latencies):
+        totals['latency_ms'] = {
+            'p50': float(np.percentile(all_latencies, 50)),
+            'p95': float(np.percentile(all_latencies, 95)),
+            'p99': float(np.percentile(all_latencies, 99))
+        }
+    return {'totals': totals, 'streams': streams}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end load test of the streaming detector and prediction broadcast")
+    parser.add_argument("--streams", type=int, default=2, help="Simulated devices, one detector process each")
+    parser.add_argument("--viewers", type=int, default=10, help="Viewer clients per stream")
+    parser.add_argument("--sample-rate", type=float, default=360.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--recording", help="Replay this recording instead of synthetic ECG")
+    parser.add_argument("--sim-port", type=int, default=8181)
+    parser.add_argument("--broadcast-port", type=int, default=8765, help="First detector broadcast port")
+    parser.add_argument("--broadcasters", type=int, default=0,
+                        help="Fan out through a bus hub and this many broadcaster.py processes on one port "
+                             "(0 keeps the detectors' own servers)")
+    parser.add_argument("--model", default="arrhythmia_detection_model1.h5")
+    parser.add_argument("--connect-timeout", type=float, default=180.0)
+    parser.add_argument("--no-spawn", action="store_true", help="Attach to already running detectors instead")
+    parser.add_argument("--viewer-urls", help="Comma-separated broadcast URLs (with --no-spawn)")
+    parser.add_argument("--pids", help="Comma-separated detector PIDs for CPU accounting (with --no-spawn)")
+    parser.add_argument("--output", help="Write the JSON report here as well")
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        if args.no_spawn:
+            viewer_urls = args.viewer_urls.split(',') if args.viewer_urls else [f"ws://localhost:{args.broadcast_port}"]
+            pids = [int(pid) for pid in args.pids.split(',')] if args.pids else []
+        else:
+            simulator = [sys.executable, 'ecg_simulator.py', '--streams', str(args.streams),
+                         '--port', str(args.sim_port), '--sample-rate', str(args.sample_rate)]
+            if args.recording:
+                simulator += ['--recording', args.recording]
+            processes.append(subprocess.Popen(simulator))
+
+            bus_url = f"unix:///tmp/ecg-load-bus-{os.getpid()}.sock"
+            if args.broadcasters:
+                processes.append(subprocess.Popen([sys.executable, 'broadcast_bus.py', '--url', bus_url]))
+                processes.append(subprocess.Popen(
+                    [sys.executable, 'broadcaster.py', '--bus', bus_url, '--port', str(args.broadcast_port),
+                     '--workers', str(args.broadcasters)]
+                ))
+
+            viewer_urls = []
+            detectors = []
+            for i in range(args.streams):
+                port = args.broadcast_port + i
+                command = [sys.executable, 'beat.py', '--no-store', '--model', args.model,
+                           '--device-url', f"ws://localhost:{args.sim_port}/{i}",
+                           '--device-id', f"sim-{i}", '--metrics-port', '0']
+                if args.broadcasters:
+                    command += ['--bus', bus_url]
+                    viewer_urls.append(f"ws://localhost:{args.broadcast_port}/devices/sim-{i}")
+                else:
+                    command += ['--broadcast-port', str(port)]
+                    viewer_urls.append(f"ws://localhost:{port}")
+                detectors.append(subprocess.Popen(command, stdout=subprocess.DEVNULL))
+            processes.extend(detectors)
+            pids = [p.pid for p in detectors]
+
+        report = asyncio.run(run_load(viewer_urls, args.viewers, args.duration, pids, args.connect_timeout))
+        print(json.dumps(report, indent=2))
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(report, f, indent=2)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
@@ -0,0 +1,52 @@
+import json
+import logging
+import os
+import sys
+import time
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_FIELDS = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Render `extra=` fields as key=value pairs (text) or as one JSON object
+    per line (LOG_FORMAT=json), so log lines can be filtered by field.
+    """
+
+    def __init__(self, as_json: bool = False):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = {k: v for k, v in record.__dict__.items() if k not in _RECORD_FIELDS}
+        timestamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))
+
+        if self.as_json:
+            payload = {
+                'ts': f"{timestamp}.{int(record.msecs):03d}",
+                'level': record.levelname,
+                'logger': record.name,
+                'msg': record.getMessage(),
+                **fields
+            }
+            if record.exc_info:
+                payload['exc'] = self.formatException(record.exc_info)
+            return json.dumps(payload, default=str)
+
+        line = f"{timestamp} {record.levelname:<7} {record.name}: {record.getMessage()}"
+        if fields:
+            line += ' ' + ' '.join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += '\n' + self.formatException(record.exc_info)
+        return line
+
+
+def configure_logging() -> None:
+    """Configure the root logger from LOG_LEVEL (default INFO) and LOG_FORMAT (text|json)"""
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(StructuredFormatter(as_json=os.environ.get('LOG_FORMAT', 'text') == 'json'))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(os.environ.get('LOG_LEVEL', 'INFO').upper())
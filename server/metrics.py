@@ -0,0 +1,253 @@
+import bisect
+import functools
+import inspect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(labels.get(n, '') for n in self.label_names)
+
+    def render(self) -> str:
+        return f'# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n' + ''.join(self._samples())
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield f'{self.name}{_labels(self.label_names, key)} {value}\n'
+
+
+class Gauge(_Metric):
+    """A gauge set directly, or computed at scrape time from a callback"""
+    kind = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+        self._functions = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def set_function(self, fn: Callable[[], float], **labels) -> None:
+        with self._lock:
+            self._functions[self._key(labels)] = fn
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                items.append((key, fn()))
+            except Exception:
+                continue
+        for key, value in items:
+            yield f'{self.name}{_labels(self.label_names, key)} {value}\n'
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        """
+        Decorator timing each call into this histogram. A call that returns a
+        generator is observed once the generator finishes or is closed, for
+        the time spent producing its items rather than consuming them.
+        """
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException:
+                    self.observe(time.perf_counter() - started, **labels)
+                    raise
+                spent = time.perf_counter() - started
+                if inspect.isgenerator(result):
+                    return self._timed_items(result, spent, labels)
+                self.observe(spent, **labels)
+                return result
+            return wrapper
+        return decorator
+
+    def _timed_items(self, items, spent: float, labels):
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    spent += time.perf_counter() - started
+                yield item
+        finally:
+            items.close()
+            self.observe(spent, **labels)
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(s[0]), s[1], s[2])) for key, s in self._series.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _labels(self.label_names, key, 'le="%s"' % bound)
+                yield f'{self.name}_bucket{labels} {cumulative}\n'
+            labels = _labels(self.label_names, key, 'le="+Inf"')
+            yield f'{self.name}_bucket{labels} {count}\n'
+            yield f'{self.name}_sum{_labels(self.label_names, key)} {total}\n'
+            yield f'{self.name}_count{_labels(self.label_names, key)} {count}\n'
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        return ''.join(metric.render() for metric in metrics)
+
+
+REGISTRY = Registry()
+
+# HTTP layer (server.py)
+REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'Request latency by route',
+                            ('method', 'route', 'status'))
+
+# Persistence layer (PatientModel / UserModel)
+DB_LATENCY = Histogram('db_operation_duration_seconds', 'MongoDB operation latency by model method',
+                       ('operation',))
+
+# Inference, shared by /predict and the streaming detector
+INFERENCE_LATENCY = Histogram('inference_duration_seconds', 'Model call latency', ('source',))
+INFERENCE_BATCH_SIZE = Histogram('inference_batch_size', 'Beats per model call', ('source',), buckets=BATCH_BUCKETS)
+
+# Streaming detector (beat.py)
+DETECTOR_BEATS = Counter('detector_beats_total', 'Beats classified by the streaming detector', ('device', 'class'))
+DETECTOR_REJECTED = Counter('detector_rejected_windows_total', 'Beat windows failing the signal quality gate',
+                            ('device', 'reason'))
+DETECTOR_QUEUE_DEPTH = Gauge('detector_queue_depth', 'Items waiting in detector queues', ('device', 'queue'))
+
+
+def db_timed(operation: str):
+    """Decorator recording a model method's Mongo time under `operation`"""
+    return DB_LATENCY.time(operation=operation)
+
+
+def observe_inference(source: str, batch_size: int, seconds: float) -> None:
+    INFERENCE_BATCH_SIZE.observe(batch_size, source=source)
+    INFERENCE_LATENCY.observe(seconds, source=source)
+
+
+def init_app(app) -> None:
+    """Time every Flask request by its route template and serve GET /metrics"""
+    from flask import g, request, Response
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_latency(response):
+        started = g.pop('_metrics_started', None)
+        if started is not None:
+            # The rule, not the path, so ids don't explode label cardinality
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_LATENCY.observe(time.perf_counter() - started,
+                                    method=request.method, route=route, status=response.status_code)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = '0.0.0.0') -> ThreadingHTTPServer:
+    """Serve /metrics from a daemon thread, for processes without Flask"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,68 @@
+import argparse
+import time
+from typing import Dict
+from pymongo import UpdateOne
+from model.reportModel import PatientModel
+from report_dates import parse_report_date
+
+
+def backfill_report_dates(collection, batch_size: int = 1000, dry_run: bool = False,
+                          progress=None) -> Dict[str, int]:
+    """
+    Convert report `date` fields still stored as '%Y-%m-%d' strings into
+    datetimes, batch_size documents per bulk write.
+
+    Walks the collection in _id order from the last _id seen, so each batch
+    is an index scan rather than a re-read from the start, and the run can
+    be interrupted and repeated safely. Each update matches the string it
+    read, so a report edited meanwhile is never overwritten. Dates that do
+    not parse are left alone and counted.
+    """
+    converted = unparseable = 0
+    last_id = None
+    while True:
+        query = {'date': {'$type': 'string'}}
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+        batch = list(collection.find(query, {'date': 1}).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+        last_id = batch[-1]['_id']
+
+        updates = []
+        for report in batch:
+            try:
+                date = parse_report_date(report['date'])
+            except ValueError:
+                unparseable += 1
+                continue
+            updates.append(UpdateOne({'_id': report['_id'], 'date': report['date']}, {'$set': {'date': date}}))
+
+        if updates and not dry_run:
+            converted += collection.bulk_write(updates, ordered=False).modified_count
+        elif dry_run:
+            converted += len(updates)
+        if progress:
+            progress(converted, unparseable)
+    return {'converted': converted, 'unparseable': unparseable}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill report dates stored as strings to datetimes")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="Count what would change without writing")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    # The timeline's range scans need this index; creating it first is harmless if it exists
+    if not args.dry_run:
+        PatientModel.ensure_indexes()
+    counts = backfill_report_dates(
+        PatientModel.patients_collection,
+        batch_size=args.batch_size,
+        dry_run=args.dry_run,
+        progress=lambda converted, unparseable: print(f"\r{converted} converted, {unparseable} unparseable",
+                                                     end="", flush=True)
+    )
+    print(f"\n{'Would convert' if args.dry_run else 'Converted'} {counts['converted']} reports "
+          f"({counts['unparseable']} unparseable) in {time.perf_counter() - started:.1f}s")
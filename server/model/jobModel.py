@@ -0,0 +1,228 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from uuid import uuid4
+from typing import Dict, List, Optional, Any, Iterator
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from metrics import db_timed
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle; the last three are final
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINAL_STATES = (COMPLETED, FAILED, CANCELLED)
+
+
+class JobModel:
+    """
+    Batch classification jobs and their per-beat results in MongoDB.
+
+    The jobs collection doubles as the queue: claim_next() moves the best
+    queued job to running in one atomic update, so several server processes
+    can share it without handing out a job twice. Each user's running jobs
+    are also listed in batch_job_users, which is what enforces the per-user
+    limit across workers.
+    """
+
+    client = MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017/heartdisease'))
+    db = client.get_default_database('heartdisease')
+    jobs_collection = db['batch_jobs']
+    results_collection = db['batch_job_results']
+    users_collection = db['batch_job_users']
+
+    # Fields never returned to clients
+    PRIVATE_FIELDS = ('_id', 'source', 'worker', 'heartbeatAt')
+
+    @classmethod
+    def ensure_indexes(cls) -> None:
+        cls.jobs_collection.create_index([('status', 1), ('priority', -1), ('createdAt', 1)])
+        cls.jobs_collection.create_index([('userId', 1), ('createdAt', -1)])
+        cls.results_collection.create_index([('jobId', 1), ('seq', 1)], unique=True)
+        cls.users_collection.create_index('running.job')
+
+    @classmethod
+    def to_json(cls, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Public view of a job document"""
+        public = {k: v for k, v in job.items() if k not in cls.PRIVATE_FIELDS}
+        public['id'] = job['_id']
+        return public
+
+    @classmethod
+    @db_timed('JobModel.create')
+    def create(cls, user_id: str, source: Dict[str, Any], priority: int, options: Dict[str, Any],
+               patient_id: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a new job"""
+        job = {
+            '_id': str(uuid4()),
+            'userId': user_id,
+            'patientId': patient_id,
+            'source': source,
+            'options': options,
+            'priority': priority,
+            'status': QUEUED,
+            'cancelRequested': False,
+            'progress': {'beats': 0, 'samples': 0, 'totalSamples': source.get('totalSamples')},
+            'createdAt': datetime.utcnow(),
+            'startedAt': None,
+            'finishedAt': None,
+            'error': None,
+            'summary': None
+        }
+        cls.jobs_collection.insert_one(job)
+        return job
+
+    @classmethod
+    @db_timed('JobModel.get')
+    def get(cls, job_id: str) -> Optional[Dict[str, Any]]:
+        return cls.jobs_collection.find_one({'_id': job_id})
+
+    @classmethod
+    @db_timed('JobModel.list_for_user')
+    def list_for_user(cls, user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return list(cls.jobs_collection.find({'userId': user_id}).sort('createdAt', -1).limit(limit))
+
+    @classmethod
+    @db_timed('JobModel.claim_next')
+    def claim_next(cls, worker: str, user_limit: int) -> Optional[Dict[str, Any]]:
+        """
+        Start the highest-priority queued job whose owner is under user_limit.
+
+        The owner's slot is taken first, by a conditional push onto their
+        'running' list, and only then is the job moved to running; each step
+        is one atomic update, so concurrent workers cannot both pass the limit.
+        """
+        skipped = [user['_id'] for user in cls.users_collection.find(
+            {f'running.{user_limit - 1}': {'$exists': True}}, {'_id': 1})]
+        while True:
+            candidate = cls.jobs_collection.find_one(
+                {'status': QUEUED, 'userId': {'$nin': skipped}},
+                {'userId': 1},
+                sort=[('priority', -1), ('createdAt', 1)]
+            )
+            if candidate is None:
+                return None
+            if not cls._take_slot(candidate['userId'], candidate['_id'], user_limit):
+                skipped.append(candidate['userId'])
+                continue
+
+            now = datetime.utcnow()
+            job = cls.jobs_collection.find_one_and_update(
+                {'_id': candidate['_id'], 'status': QUEUED},
+                {'$set': {'status': RUNNING, 'startedAt': now, 'heartbeatAt': now, 'worker': worker}},
+                return_document=ReturnDocument.AFTER
+            )
+            if job:
+                return job
+            # Claimed or cancelled by someone else in between
+            cls._release_slot(candidate['_id'])
+
+    @classmethod
+    def _take_slot(cls, user_id: str, job_id: str, user_limit: int) -> bool:
+        """Record job_id as running for user_id unless they already have user_limit jobs"""
+        try:
+            # No match (user at the limit) makes the upsert insert a duplicate _id
+            cls.users_collection.update_one(
+                {'_id': user_id, f'running.{user_limit - 1}': {'$exists': False}},
+                {'$push': {'running': {'job': job_id, 'at': datetime.utcnow()}}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    @classmethod
+    def _release_slot(cls, job_id: str) -> None:
+        cls.users_collection.update_one({'running.job': job_id}, {'$pull': {'running': {'job': job_id}}})
+
+    @classmethod
+    @db_timed('JobModel.update_progress')
+    def update_progress(cls, job_id: str, beats: int, samples: int) -> bool:
+        """Record progress and a heartbeat; returns True when cancellation was requested"""
+        job = cls.jobs_collection.find_one_and_update(
+            {'_id': job_id},
+            {'$set': {'progress.beats': beats, 'progress.samples': samples, 'heartbeatAt': datetime.utcnow()}},
+            projection={'cancelRequested': 1}
+        )
+        return bool(job and job.get('cancelRequested'))
+
+    @classmethod
+    @db_timed('JobModel.heartbeat')
+    def heartbeat(cls, job_ids: List[str]) -> None:
+        if job_ids:
+            cls.jobs_collection.update_many({'_id': {'$in': job_ids}}, {'$set': {'heartbeatAt': datetime.utcnow()}})
+
+    @classmethod
+    @db_timed('JobModel.requeue_stale')
+    def requeue_stale(cls, max_age: float) -> int:
+        """
+        Return running jobs whose worker stopped heartbeating (crash, restart)
+        to the queue, and free user slots left behind by a worker that died
+        between taking a slot and claiming its job
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        requeued = 0
+        for stale in list(cls.jobs_collection.find({'status': RUNNING, 'heartbeatAt': {'$lt': cutoff}}, {'_id': 1})):
+            job = cls.jobs_collection.find_one_and_update(
+                {'_id': stale['_id'], 'status': RUNNING, 'heartbeatAt': {'$lt': cutoff}},
+                {'$set': {'status': QUEUED, 'worker': None, 'progress.beats': 0, 'progress.samples': 0}}
+            )
+            if job:
+                cls._release_slot(job['_id'])
+                requeued += 1
+
+        for user in cls.users_collection.find({'running.at': {'$lt': cutoff}}):
+            for entry in user['running']:
+                if entry['at'] < cutoff and not cls.jobs_collection.find_one(
+                        {'_id': entry['job'], 'status': RUNNING}, {'_id': 1}):
+                    cls._release_slot(entry['job'])
+        return requeued
+
+    @classmethod
+    @db_timed('JobModel.request_cancel')
+    def request_cancel(cls, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job outright, or flag a running one for its worker"""
+        now = datetime.utcnow()
+        job = cls.jobs_collection.find_one_and_update(
+            {'_id': job_id, 'status': QUEUED},
+            {'$set': {'status': CANCELLED, 'cancelRequested': True, 'finishedAt': now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if job:
+            return job
+        return cls.jobs_collection.find_one_and_update(
+            {'_id': job_id, 'status': RUNNING},
+            {'$set': {'cancelRequested': True}},
+            return_document=ReturnDocument.AFTER
+        ) or cls.get(job_id)
+
+    @classmethod
+    @db_timed('JobModel.finish')
+    def finish(cls, job_id: str, status: str, summary: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> None:
+        cls.jobs_collection.update_one(
+            {'_id': job_id},
+            {'$set': {'status': status, 'summary': summary, 'error': error, 'finishedAt': datetime.utcnow()},
+             '$unset': {'worker': ''}}
+        )
+        cls._release_slot(job_id)
+
+    @classmethod
+    @db_timed('JobModel.save_results')
+    def save_results(cls, job_id: str, chunks: Iterator[Dict[str, Any]]) -> int:
+        """Store per-beat results as ordered chunk documents; replaces any earlier attempt"""
+        cls.results_collection.delete_many({'jobId': job_id})
+        count = 0
+        for seq, chunk in enumerate(chunks):
+            cls.results_collection.insert_one({'jobId': job_id, 'seq': seq, **chunk})
+            count += 1
+        return count
+
+    @classmethod
+    def iter_results(cls, job_id: str) -> Iterator[Dict[str, Any]]:
+        """Result chunks in order, fetched lazily"""
+        return cls.results_collection.find({'jobId': job_id}, {'_id': 0, 'jobId': 0}).sort('seq', 1)
@@ -78,11 +78,19 @@
 
 
 
+import os
+import logging
 from datetime import datetime
 from uuid import uuid4
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, Iterator, List, Optional, Any, Union
 from pymongo import MongoClient
 from bson.objectid import ObjectId
+from report_events import report_events
+from report_dates import parse_report_date, format_report_date, DATE_FORMAT
+from metrics import db_timed
+from profiling import profiled
+
+logger = logging.getLogger(__name__)
 
 class PatientModel:
     """
@@ -91,9 +99,16 @@ class PatientModel:
     """
     
     # MongoDB connection
-    client = MongoClient('mongodb://localhost:27017/heartdisease')
-    db = client['heartdisease']
+    client = MongoClient(os.environ.get('MONGO_URI', 'mongodb://localhost:27017/heartdisease'))
+    db = client.get_default_database('heartdisease')
     patients_collection = db['patients']
+    versions_collection = db['collection_versions']
+    
+    # Fields maintained by the model itself; never accepted from clients
+    VERSION_FIELDS = ('_id', 'revision', 'updatedAt')
+    
+    # Documents fetched per cursor round trip by the iter_* methods
+    CURSOR_BATCH_SIZE = int(os.environ.get('REPORT_CURSOR_BATCH_SIZE', 500))
     
     def __init__(self, patient_data: Dict[str, Any]):
         """Initialize a new patient record"""
@@ -103,7 +118,8 @@ class PatientModel:
         self.doctorName = patient_data.get('doctorName', '')
         self.heartClass = patient_data.get('heartClass', 'N')
         self.description = patient_data.get('description', '')
-        self.date = patient_data.get('date', datetime.now().strftime('%Y-%m-%d'))
+        # Stored as a datetime so timelines are indexed range scans
+        self.date = parse_report_date(patient_data.get('date') or datetime.now().strftime(DATE_FORMAT))
         self.status = patient_data.get('status', 'pending')
         self.result = patient_data.get('result', '')
         
@@ -125,46 +141,96 @@ class PatientModel:
             'result': self.result
         }
     
+    @staticmethod
+    def _versioned_update(update_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Build a $set update that also bumps the document revision"""
+        fields = {k: v for k, v in update_data.items() if k not in PatientModel.VERSION_FIELDS}
+        if 'date' in fields:
+            fields['date'] = parse_report_date(fields['date'])
+        fields['updatedAt'] = datetime.utcnow()
+        return {'$set': fields, '$inc': {'revision': 1}}
+    
+    @staticmethod
+    def _to_client(report: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Present the stored datetime date in the 'YYYY-MM-DD' form clients send"""
+        if report and 'date' in report:
+            report['date'] = format_report_date(report['date'])
+        return report
+    
+    @classmethod
+    def _find_one(cls, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return cls._to_client(cls.patients_collection.find_one(query))
+    
+    @classmethod
+    def ensure_indexes(cls) -> None:
+        # Serves get_timeline's range scans and the patientId lookups
+        cls.patients_collection.create_index([('patientId', 1), ('date', 1)])
+    
+    @classmethod
+    def _bump_collection_version(cls) -> None:
+        """Advance the collection-wide revision after any successful write"""
+        cls.versions_collection.update_one(
+            {'_id': 'patients'},
+            {'$inc': {'revision': 1}, '$set': {'updatedAt': datetime.utcnow()}},
+            upsert=True
+        )
+    
+    @classmethod
+    @db_timed('PatientModel.get_collection_version')
+    def get_collection_version(cls) -> Dict[str, Any]:
+        """Return the collection revision counter and last write time"""
+        version = cls.versions_collection.find_one({'_id': 'patients'})
+        if not version:
+            return {'revision': 0, 'updatedAt': None}
+        
+        return {'revision': version.get('revision', 0), 'updatedAt': version.get('updatedAt')}
+    
     @classmethod
+    @db_timed('PatientModel.save')
     def save(cls, patient_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create and save a new patient record"""
         patient = PatientModel(patient_data)
         patient_dict = patient.to_dict()
+        patient_dict['revision'] = 1
+        patient_dict['updatedAt'] = datetime.utcnow()
         
         # Insert into MongoDB
         result = cls.patients_collection.insert_one(patient_dict)
+        cls._bump_collection_version()
+        report_events.publish_local('insert', patient_dict)
         
         # Ensure the MongoDB _id is not in the response
         patient_dict.pop('_id', None)
         
-        return patient_dict
+        return cls._to_client(patient_dict)
     
     @classmethod
-    def get_all(cls) -> List[Dict[str, Any]]:
-        """Retrieve all patient records"""
-        patients = list(cls.patients_collection.find())
-        
-        # Convert MongoDB _id to string for JSON serialization
-        for patient in patients:
-            if '_id' in patient:
-                patient['_id'] = str(patient['_id'])
-        
-        return patients
+    @db_timed('PatientModel.iter_all')
+    @profiled('PatientModel.iter_all')
+    def iter_all(cls, batch_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yield all patient records, holding only one cursor batch in memory.
+        Closing the generator early (e.g. a client disconnect) closes the cursor.
+        """
+        with cls.patients_collection.find().batch_size(batch_size or cls.CURSOR_BATCH_SIZE) as cursor:
+            for report in cursor:
+                yield cls._to_client(report)
     
     @classmethod
+    @db_timed('PatientModel.get_by_id')
+    @profiled('PatientModel.get_by_id')
     def get_by_id(cls, patient_id: str) -> Optional[Dict[str, Any]]:
         """Find a patient by their ID"""
-        patient = cls.patients_collection.find_one({'patientId': patient_id})
-        
-        if patient:
-            # Convert MongoDB _id to string for JSON serialization
-            if '_id' in patient:
-                patient['_id'] = str(patient['_id'])
-            return patient
-        
-        return None
+        return cls._find_one({'patientId': patient_id})
+    
+    @classmethod
+    @db_timed('PatientModel.get_by_uuid')
+    def get_by_uuid(cls, uuid_id: str) -> Optional[Dict[str, Any]]:
+        """Find a report by its UUID id field"""
+        return cls._find_one({'id': uuid_id})
     
     @classmethod
+    @db_timed('PatientModel.update')
     def update(cls, patient_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update an existing patient record by patientId"""
         # Ensure _id is not in the update data
@@ -173,17 +239,20 @@ class PatientModel:
         # Update in MongoDB
         result = cls.patients_collection.update_one(
             {'patientId': patient_id},
-            {'$set': update_data}
+            cls._versioned_update(update_data)
         )
         
         if result.modified_count > 0:
+            cls._bump_collection_version()
             # Get the updated patient
             updated_patient = cls.get_by_id(patient_id)
+            report_events.publish_local('update', updated_patient, update_data)
             return updated_patient
         
         return None
     
     @classmethod
+    @db_timed('PatientModel.update_status')
     def update_status(cls, patient_id: str, status: str) -> Optional[Dict[str, Any]]:
         """Update only the status of a patient"""
         if status not in ['pending', 'completed']:
@@ -192,33 +261,50 @@ class PatientModel:
         # Update in MongoDB
         result = cls.patients_collection.update_one(
             {'patientId': patient_id},
-            {'$set': {'status': status}}
+            cls._versioned_update({'status': status})
         )
         
         if result.modified_count > 0:
+            cls._bump_collection_version()
             # Get the updated patient
             updated_patient = cls.get_by_id(patient_id)
+            report_events.publish_local('update', updated_patient, {'status': status})
             return updated_patient
         
         return None
 
     @classmethod
-    def get_by_user_id(cls, user_id: Union[str, int]) -> List[Dict[str, Any]]:
-        """Find all reports for a specific user ID"""
-        # Convert user_id to string if it's not already
-        user_id_str = str(user_id)
-        
-        # Find all reports where the patientId matches the user_id
-        reports = list(cls.patients_collection.find({'patientId': user_id_str}))
-        
-        # Convert MongoDB _id to string for JSON serialization
-        for report in reports:
-            if '_id' in report:
-                report['_id'] = str(report['_id'])
-        
-        return reports
+    @db_timed('PatientModel.iter_by_user_id')
+    @profiled('PatientModel.iter_by_user_id')
+    def iter_by_user_id(cls, user_id: Union[str, int], batch_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield a user's reports one cursor batch at a time, like iter_all()"""
+        # patientId is stored as a string
+        cursor = cls.patients_collection.find({'patientId': str(user_id)})
+        with cursor.batch_size(batch_size or cls.CURSOR_BATCH_SIZE):
+            for report in cursor:
+                yield cls._to_client(report)
+    
+    @classmethod
+    @db_timed('PatientModel.get_timeline')
+    @profiled('PatientModel.get_timeline')
+    def get_timeline(cls, user_id: Union[str, int], start: Optional[datetime] = None,
+                     end: Optional[datetime] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        A user's reports dated in [start, end), oldest first, at most `limit`.
+        Answered by a range scan of the (patientId, date) index; reports whose
+        date is still a string (not yet migrated) are left out.
+        """
+        date_range = {'$type': 'date'}
+        if start is not None:
+            date_range['$gte'] = start
+        if end is not None:
+            date_range['$lt'] = end
+        cursor = cls.patients_collection.find({'patientId': str(user_id), 'date': date_range})
+        return [cls._to_client(report) for report in cursor.sort('date', 1).limit(limit)]
 
     @classmethod
+    @db_timed('PatientModel.get_by_mongodb_id')
+    @profiled('PatientModel.get_by_mongodb_id')
     def get_by_mongodb_id(cls, report_id: str) -> Optional[Dict[str, Any]]:
         """Find a report by its MongoDB _id (as a string)"""
         try:
@@ -227,19 +313,13 @@ class PatientModel:
             obj_id = ObjectId(report_id)
             
             # Query using MongoDB _id
-            report = cls.patients_collection.find_one({'_id': obj_id})
-            
-            if report:
-                # Convert MongoDB _id to string for JSON serialization
-                report['_id'] = str(report['_id'])
-                return report
-            
-            return None
+            return cls._find_one({'_id': obj_id})
         except Exception:
             # If conversion fails or other error, return None
             return None
     
     @classmethod
+    @db_timed('PatientModel.update_status_by_id')
     def update_status_by_id(cls, report_id: str, status: str) -> Optional[Dict[str, Any]]:
         """Update the status of a report by its unique ID (either UUID or MongoDB _id)"""
         if status not in ['pending', 'completed']:
@@ -255,15 +335,15 @@ class PatientModel:
                 # Update in MongoDB by _id
                 result = cls.patients_collection.update_one(
                     {'_id': obj_id},
-                    {'$set': {'status': status}}
+                    cls._versioned_update({'status': status})
                 )
                 
                 if result.modified_count > 0:
+                    cls._bump_collection_version()
                     # Get the updated report
-                    updated_report = cls.patients_collection.find_one({'_id': obj_id})
+                    updated_report = cls._find_one({'_id': obj_id})
                     if updated_report:
-                        # Convert MongoDB _id to string for JSON serialization
-                        updated_report['_id'] = str(updated_report['_id'])
+                        report_events.publish_local('update', updated_report, {'status': status})
                         return updated_report
         except Exception:
             # If conversion fails, continue with UUID approach
@@ -272,34 +352,33 @@ class PatientModel:
         # Try using report_id as the 'id' field (UUID)
         result = cls.patients_collection.update_one(
             {'id': report_id},
-            {'$set': {'status': status}}
+            cls._versioned_update({'status': status})
         )
         
         if result.modified_count > 0:
+            cls._bump_collection_version()
             # Get the updated report
-            updated_report = cls.patients_collection.find_one({'id': report_id})
-            if updated_report and '_id' in updated_report:
-                # Convert MongoDB _id to string for JSON serialization
-                updated_report['_id'] = str(updated_report['_id'])
+            updated_report = cls._find_one({'id': report_id})
+            report_events.publish_local('update', updated_report, {'status': status})
             return updated_report
         
         # If no update happened with either approach, fall back to patientId for backwards compatibility
         result = cls.patients_collection.update_one(
             {'patientId': report_id},
-            {'$set': {'status': status}}
+            cls._versioned_update({'status': status})
         )
         
         if result.modified_count > 0:
+            cls._bump_collection_version()
             # Get the updated report
-            updated_report = cls.patients_collection.find_one({'patientId': report_id})
-            if updated_report and '_id' in updated_report:
-                # Convert MongoDB _id to string for JSON serialization
-                updated_report['_id'] = str(updated_report['_id'])
+            updated_report = cls._find_one({'patientId': report_id})
+            report_events.publish_local('update', updated_report, {'status': status})
             return updated_report
             
         return None
 
     @classmethod
+    @db_timed('PatientModel.update_by_mongodb_id')
     def update_by_mongodb_id(cls, mongodb_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update an existing patient record by MongoDB _id"""
         try:
@@ -313,22 +392,23 @@ class PatientModel:
             # Update in MongoDB by _id
             result = cls.patients_collection.update_one(
                 {'_id': obj_id},
-                {'$set': update_data}
+                cls._versioned_update(update_data)
             )
             
             if result.modified_count > 0:
+                cls._bump_collection_version()
                 # Get the updated report
-                updated_report = cls.patients_collection.find_one({'_id': obj_id})
+                updated_report = cls._find_one({'_id': obj_id})
                 if updated_report:
-                    # Convert MongoDB _id to string for JSON serialization
-                    updated_report['_id'] = str(updated_report['_id'])
+                    report_events.publish_local('update', updated_report, update_data)
                     return updated_report
             return None
         except Exception as e:
-            print(f"Error updating by MongoDB ID: {e}")
+            logger.warning("Error updating by MongoDB ID", extra={"report_id": mongodb_id, "error": str(e)})
             return None
             
     @classmethod
+    @db_timed('PatientModel.update_by_uuid')
     def update_by_uuid(cls, uuid_id: str, update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Update an existing patient record by UUID id field"""
         try:
@@ -338,17 +418,16 @@ class PatientModel:
             # Update in MongoDB by UUID id field
             result = cls.patients_collection.update_one(
                 {'id': uuid_id},
-                {'$set': update_data}
+                cls._versioned_update(update_data)
             )
             
             if result.modified_count > 0:
+                cls._bump_collection_version()
                 # Get the updated report
-                updated_report = cls.patients_collection.find_one({'id': uuid_id})
-                if updated_report and '_id' in updated_report:
-                    # Convert MongoDB _id to string for JSON serialization
-                    updated_report['_id'] = str(updated_report['_id'])
+                updated_report = cls._find_one({'id': uuid_id})
+                report_events.publish_local('update', updated_report, update_data)
                 return updated_report
             return None
         except Exception as e:
-            print(f"Error updating by UUID: {e}")
+            logger.warning("Error updating by UUID", extra={"report_id": uuid_id, "error": str(e)})
             return None
\ No newline at end of file
@@ -1,11 +1,16 @@
+import logging
 from extension import mongo, bcrypt   # Import initialized mongo & bcrypt
+from metrics import db_timed
 from bson import ObjectId
 import uuid
 import random
 
+logger = logging.getLogger(__name__)
+
 # User Model
 class UserModel:
     @staticmethod
+    @db_timed('UserModel.generate_user_id')
     def generate_user_id():
         """Generate a unique user ID"""
         # Get the highest user_id from the database
@@ -22,6 +27,7 @@ class UserModel:
         return highest_user["user_id"] + 1
 
     @staticmethod
+    @db_timed('UserModel.create_user')
     def create_user(email, username, password, type="patient", licenseNumber=None):
         """Create a new user with a hashed password"""
         if mongo.db is None:
@@ -52,6 +58,7 @@ class UserModel:
         return {"message": "User registered successfully", "user_id": str(inserted_id), "numeric_id": user_id}, 201
 
     @staticmethod
+    @db_timed('UserModel.find_user_by_email')
     def find_user_by_email(email):
         """Find a user by email"""
         if mongo.db is None:
@@ -76,6 +83,7 @@ class UserModel:
         return None
 
     @staticmethod
+    @db_timed('UserModel.find_user_by_id')
     def find_user_by_id(user_id):
         """Find a user by ID"""
         if mongo.db is None:
@@ -100,10 +108,11 @@ class UserModel:
                 return user_data
             return None
         except Exception as e:
-            print(f"Error finding user by ID: {e}")
+            logger.warning("Error finding user by ID", extra={"user_id": user_id, "error": str(e)})
             return None
 
     @staticmethod
+    @db_timed('UserModel.find_user_by_numeric_id')
     def find_user_by_numeric_id(numeric_id):
         """Find a user by numeric user_id"""
         if mongo.db is None:
@@ -128,10 +137,11 @@ class UserModel:
                 return user_data
             return None
         except Exception as e:
-            print(f"Error finding user by numeric ID: {e}")
+            logger.warning("Error finding user by numeric ID", extra={"numeric_id": numeric_id, "error": str(e)})
             return None
 
     @staticmethod
+    @db_timed('UserModel.find_patients_by_username')
     def find_patients_by_username(search_term, limit=5):
         """Find patients by username for autocomplete
         Args:
@@ -160,5 +170,5 @@ class UserModel:
                 
             return patients
         except Exception as e:
-            print(f"Error finding patients by username: {e}")
+            logger.warning("Error finding patients by username", extra={"error": str(e)})
             return []
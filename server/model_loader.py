@@ -0,0 +1,82 @@
+import os
+import threading
+from typing import Optional
+import numpy as np
+
+DEFAULT_MODEL_PATH = 'arrhythmia_detection_model1.h5'
+
+
+class TFLiteModel:
+    """
+    A TFLite flatbuffer behind the slice of the Keras API the server uses:
+    predict(x) on float input, returning float class probabilities. int8
+    models have their input quantized and output dequantized here, so
+    callers never see the quantization parameters.
+    """
+
+    def __init__(self, path: str, num_threads: Optional[int] = None):
+        try:
+            # The standalone runtime is enough to serve and much smaller than TF
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+
+        self.path = path
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch = int(self._input['shape'][0])
+        # One interpreter per model; invoke() is not safe to call concurrently
+        self._lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return (None,) + tuple(int(d) for d in self._input['shape'][1:])
+
+    @property
+    def quantized_input(self) -> bool:
+        return self._input['dtype'] in (np.int8, np.uint8)
+
+    def _quantize(self, x: np.ndarray) -> np.ndarray:
+        if not self.quantized_input:
+            return x.astype(self._input['dtype'], copy=False)
+        scale, zero_point = self._input['quantization']
+        info = np.iinfo(self._input['dtype'])
+        return np.clip(np.round(x / scale + zero_point), info.min, info.max).astype(self._input['dtype'])
+
+    def _dequantize(self, y: np.ndarray) -> np.ndarray:
+        if self._output['dtype'] not in (np.int8, np.uint8):
+            return y.astype(np.float32, copy=False)
+        scale, zero_point = self._output['quantization']
+        return (y.astype(np.float32) - zero_point) * scale
+
+    def predict(self, x, batch_size: Optional[int] = None, verbose: int = 0) -> np.ndarray:
+        x = self._quantize(np.asarray(x, dtype=np.float32))
+        with self._lock:
+            if len(x) != self._batch:
+                self.interpreter.resize_tensor_input(self._input['index'], [len(x)] + list(x.shape[1:]))
+                self.interpreter.allocate_tensors()
+                self._input = self.interpreter.get_input_details()[0]
+                self._output = self.interpreter.get_output_details()[0]
+                self._batch = len(x)
+            self.interpreter.set_tensor(self._input['index'], x)
+            self.interpreter.invoke()
+            return self._dequantize(self.interpreter.get_tensor(self._output['index']))
+
+    def __call__(self, x, training: bool = False) -> np.ndarray:
+        return self.predict(x)
+
+
+def load_model(path: Optional[str] = None):
+    """
+    Load a Keras .h5/SavedModel or a quantized .tflite model (see
+    quantize_model.py). Defaults to MODEL_PATH, then the bundled model.
+    """
+    path = path or os.environ.get('MODEL_PATH', DEFAULT_MODEL_PATH)
+    if path.endswith('.tflite'):
+        return TFLiteModel(path, num_threads=int(os.environ.get('TFLITE_THREADS', 0)) or None)
+
+    import tensorflow as tf
+    return tf.keras.models.load_model(path)
@@ -0,0 +1,225 @@
+import hashlib
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+import numpy as np
+from ecg_pipeline import InputSpec, DEFAULT_SPEC, decode_predictions
+from metrics import Counter, INFERENCE_LATENCY
+from model_loader import load_model, DEFAULT_MODEL_PATH
+
+logger = logging.getLogger(__name__)
+
+SHADOW_PREDICTIONS = Counter('shadow_predictions_total', 'Requests also scored by the shadow model',
+                             ('candidate', 'agreement'))
+
+# Shadow scoring is best effort; beyond this backlog samples are skipped
+MAX_SHADOW_BACKLOG = 32
+
+
+def model_fingerprint(path: str) -> str:
+    """A version tag from the file name and the first bytes of its content hash"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return f"{os.path.splitext(os.path.basename(path))[0]}@{digest.hexdigest()[:8]}"
+
+
+class ModelVersion:
+    """A loaded, warmed-up model, the input it expects and where it came from"""
+
+    def __init__(self, model, version: str, path: Optional[str] = None, warmup_ms: float = 0.0,
+                 spec: InputSpec = DEFAULT_SPEC, outputs: Optional[int] = None):
+        self.model = model
+        self.version = version
+        self.path = path
+        self.spec = spec
+        # Width of the probability vector
+        self.outputs = outputs or len(spec.classes)
+        self.warmup_ms = warmup_ms
+        self.loaded_at = time.time()
+        self.latencies = deque(maxlen=1000)
+
+    def predict(self, inputs: np.ndarray) -> np.ndarray:
+        started = time.perf_counter()
+        probabilities = self.model.predict(inputs, verbose=0)
+        self.latencies.append(time.perf_counter() - started)
+        return probabilities
+
+    def to_dict(self) -> Dict:
+        info = {
+            'version': self.version,
+            'path': self.path,
+            'input': self.spec.to_dict(),
+            'loaded_at': self.loaded_at,
+            'warmup_ms': self.warmup_ms
+        }
+        if self.latencies:
+            ms = np.asarray(self.latencies) * 1000.0
+            info['latency_ms'] = {
+                'p50': float(np.percentile(ms, 50)),
+                'p95': float(np.percentile(ms, 95)),
+                'samples': len(ms)
+            }
+        return info
+
+
+class ModelRegistry:
+    """
+    Holds the active model and swaps in new versions without a restart.
+
+    load() builds and warms a version off to the side and only then replaces
+    the active reference, so in-flight predictions finish on the version they
+    started with. The previous version is kept for rollback(). An optional
+    shadow candidate scores a fraction of traffic on a background thread;
+    its labels and latency are compared with the active model's and never
+    affect the response.
+    """
+
+    def __init__(self, loader: Callable = load_model):
+        self.loader = loader
+        self.active: Optional[ModelVersion] = None
+        self.previous: Optional[ModelVersion] = None
+        self.shadow: Optional[ModelVersion] = None
+        self.shadow_rate = 0.0
+        self.loading: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._shadow_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='shadow')
+        self._shadow_backlog = 0
+        self._agreement = {'agree': 0, 'disagree': 0}
+
+    def _build(self, path: str, version: Optional[str]) -> ModelVersion:
+        version = version or model_fingerprint(path)
+        started = time.perf_counter()
+        model = self.loader(path)
+        spec = InputSpec.for_model(model, path)
+        # The first calls trace graphs and allocate buffers; pay that here
+        for batch in (1, 8):
+            outputs = model.predict(np.zeros((batch,) + spec.input_shape, dtype=np.float32), verbose=0).shape[-1]
+        warmup_ms = (time.perf_counter() - started) * 1000.0
+        logger.info("Model loaded", extra={"version": version, "path": path, "warmup_ms": round(warmup_ms),
+                                           "input_shape": spec.input_shape})
+        return ModelVersion(model, version, path, warmup_ms, spec, outputs)
+
+    def install(self, model_version: ModelVersion, role: str = 'active') -> None:
+        with self._lock:
+            if role == 'shadow':
+                self.shadow = model_version
+                self._agreement = {'agree': 0, 'disagree': 0}
+            else:
+                self.previous, self.active = self.active, model_version
+
+    def load(self, path: Optional[str] = None, version: Optional[str] = None, role: str = 'active') -> ModelVersion:
+        """Load and warm a model synchronously, then make it the active (or shadow) version"""
+        model_version = self._build(path or os.environ.get('MODEL_PATH', DEFAULT_MODEL_PATH), version)
+        self.install(model_version, role)
+        return model_version
+
+    def load_async(self, path: str, version: Optional[str] = None, role: str = 'active') -> str:
+        """Start load() on a background thread; progress is reported in status()['loading']"""
+        key = version or os.path.basename(path)
+
+        def run():
+            try:
+                loaded = self.load(path, version, role)
+                self.loading[key] = {'state': 'ready', 'version': loaded.version, 'role': role}
+            except Exception as e:
+                logger.exception("Model load failed", extra={"path": path})
+                self.loading[key] = {'state': 'failed', 'error': str(e), 'role': role}
+
+        self.loading[key] = {'state': 'loading', 'path': path, 'role': role}
+        threading.Thread(target=run, name=f"model-load-{key}", daemon=True).start()
+        return key
+
+    def rollback(self) -> Optional[ModelVersion]:
+        with self._lock:
+            if self.previous is None:
+                return None
+            self.active, self.previous = self.previous, self.active
+            return self.active
+
+    def promote_shadow(self) -> Optional[ModelVersion]:
+        with self._lock:
+            if self.shadow is None:
+                return None
+            self.previous, self.active, self.shadow = self.active, self.shadow, None
+            self.shadow_rate = 0.0
+            return self.active
+
+    def set_shadow_rate(self, rate: float) -> None:
+        if not 0.0 <= rate <= 1.0:
+            raise ValueError("Shadow rate must be between 0 and 1")
+        self.shadow_rate = rate
+
+    def clear_shadow(self) -> None:
+        with self._lock:
+            self.shadow = None
+            self.shadow_rate = 0.0
+
+    def predict(self, inputs: np.ndarray) -> Tuple[np.ndarray, str]:
+        """Score preprocessed inputs on the active model; returns (probabilities, version)"""
+        active = self.active
+        if active is None:
+            raise RuntimeError("No model loaded")
+        probabilities = active.predict(inputs)
+
+        shadow = self.shadow
+        # A candidate with a different input contract cannot score the same tensor
+        if (shadow is not None and self.shadow_rate and shadow.spec.input_shape == active.spec.input_shape
+                and random.random() < self.shadow_rate):
+            self._submit_shadow(shadow, inputs, probabilities)
+        return probabilities, active.version
+
+    def _submit_shadow(self, shadow: ModelVersion, inputs: np.ndarray, reference: np.ndarray) -> None:
+        with self._lock:
+            if self._shadow_backlog >= MAX_SHADOW_BACKLOG:
+                return
+            self._shadow_backlog += 1
+        self._shadow_pool.submit(self._score_shadow, shadow, inputs, reference)
+
+    def _score_shadow(self, shadow: ModelVersion, inputs: np.ndarray, reference: np.ndarray) -> None:
+        try:
+            started = time.perf_counter()
+            candidate = shadow.predict(inputs)
+            INFERENCE_LATENCY.observe(time.perf_counter() - started, source='shadow')
+
+            agree = int((decode_predictions(candidate)[0] == decode_predictions(reference)[0]).sum())
+            disagree = len(inputs) - agree
+            with self._lock:
+                if shadow is self.shadow:
+                    self._agreement['agree'] += agree
+                    self._agreement['disagree'] += disagree
+            SHADOW_PREDICTIONS.inc(agree, candidate=shadow.version, agreement='agree')
+            SHADOW_PREDICTIONS.inc(disagree, candidate=shadow.version, agreement='disagree')
+        except Exception:
+            logger.exception("Shadow prediction failed", extra={"version": shadow.version})
+        finally:
+            with self._lock:
+                self._shadow_backlog -= 1
+
+    def status(self) -> Dict:
+        with self._lock:
+            active, previous, shadow = self.active, self.previous, self.shadow
+            agreement = dict(self._agreement)
+        status = {
+            'active': active.to_dict() if active else None,
+            'previous': previous.version if previous else None,
+            'loading': dict(self.loading)
+        }
+        if shadow:
+            scored = agreement['agree'] + agreement['disagree']
+            status['shadow'] = {
+                **shadow.to_dict(),
+                'rate': self.shadow_rate,
+                'scored': scored,
+                'label_agreement': agreement['agree'] / scored if scored else None
+            }
+        return status
+
+
+MODELS = ModelRegistry()
@@ -2,7 +2,12 @@
 from flask import Flask, request, jsonify
 import tensorflow as tf
 # model = load_model("arrhythmia_detection_model1.h5")
-model = tf.keras.models.load_model('arrhythmia_detection_model1.h5')
+import os
+from model_loader import DEFAULT_MODEL_PATH, load_model
+from ecg_pipeline import InputSpec
+model = load_model()
+# Window length and input shape come from whichever model MODEL_PATH points to
+spec = InputSpec.for_model(model, os.environ.get('MODEL_PATH', DEFAULT_MODEL_PATH))
 from routes.userRoutes import user_blueprint 
 import numpy as np
 
@@ -12,16 +17,8 @@ import numpy as np
 
 
 def preprocess_input(arrhythmia):
-    expected_shape = (10, 20, 1)  # Your model's input shape
-    actual_length = len(arrhythmia)
-    
-    if actual_length > 200:  # Adjust according to (10,20)
-        arrhythmia = arrhythmia[:200]  # Trim
-    elif actual_length < 200:   
-        arrhythmia = np.pad(arrhythmia, (0, 200 - actual_length), mode='constant')  # Pad
-    
-    arrhythmia = np.array(arrhythmia).reshape(1, 10, 20, 1)  # Reshape for model input
-    return arrhythmia
+    # Trimmed or zero-padded to the model's window, then shaped to its input
+    return spec.prepare(np.asarray(arrhythmia, dtype=np.float32)[None, :])
 
 
 def predict(arrhythmia):
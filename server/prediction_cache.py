@@ -0,0 +1,107 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import numpy as np
+from metrics import Counter, Gauge
+
+CACHE_REQUESTS = Counter('prediction_cache_requests_total', 'Prediction cache lookups', ('cache', 'result'))
+CACHE_ENTRIES = Gauge('prediction_cache_entries', 'Entries held by the prediction cache', ('cache',))
+
+
+class PredictionCache:
+    """
+    Thread-safe LRU of model outputs in front of ModelRegistry.predict.
+
+    Entries are keyed by the model version and a hash of the preprocessed
+    (n, 10, 20, 1) input rounded to `decimals`, so the same beat re-sent by a
+    device, a dashboard retry or a replayed recording is scored once per
+    model version. Entries older than `ttl` seconds are treated as misses.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0, decimals: int = 4, name: str = 'default'):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.decimals = decimals
+        self.name = name
+        self._entries: 'OrderedDict[Tuple[str, bytes], Tuple[float, np.ndarray]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        CACHE_ENTRIES.set_function(lambda: len(self._entries), cache=name)
+
+    @classmethod
+    def from_env(cls, name: str = 'default') -> 'PredictionCache':
+        return cls(
+            max_entries=int(os.environ.get('PREDICTION_CACHE_SIZE', 10000)),
+            ttl=float(os.environ.get('PREDICTION_CACHE_TTL', 300)),
+            name=name
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def key(self, inputs: np.ndarray, model_version: str) -> Tuple[str, bytes]:
+        # Rounded in float, not scaled to an integer type, so large values cannot wrap
+        # around onto each other's keys; + 0.0 folds -0.0 into 0.0
+        rounded = np.round(np.asarray(inputs, dtype=np.float32), self.decimals) + np.float32(0.0)
+        return model_version, hashlib.blake2b(rounded.tobytes(), digest_size=16).digest()
+
+    def get(self, key: Tuple[str, bytes]) -> Optional[np.ndarray]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                result = entry[1]
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                result = None
+        CACHE_REQUESTS.inc(cache=self.name, result='hit' if result is not None else 'miss')
+        return result
+
+    def put(self, key: Tuple[str, bytes], probabilities: np.ndarray) -> None:
+        probabilities = np.array(probabilities, copy=True)
+        probabilities.setflags(write=False)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), probabilities)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def predict(self, registry, inputs: np.ndarray) -> Tuple[np.ndarray, str]:
+        """registry.predict(inputs), answered from the cache when this input was seen before"""
+        active = registry.active
+        if not self.enabled or active is None:
+            return registry.predict(inputs)
+
+        cached = self.get(self.key(inputs, active.version))
+        if cached is not None:
+            return cached, active.version
+
+        probabilities, version = registry.predict(inputs)
+        # Keyed by the version that actually answered, in case of a swap mid-call
+        self.put(self.key(inputs, version), probabilities)
+        return probabilities, version
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None
+            }
@@ -0,0 +1,179 @@
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pymongo import MongoClient
+from pymongo.errors import (AutoReconnect, BulkWriteError, CollectionInvalid, NetworkTimeout, OperationFailure,
+                            PyMongoError, ServerSelectionTimeoutError)
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionSink:
+    """
+    Write-behind storage for streaming beat predictions.
+
+    submit() only enqueues and never blocks the inference thread. A background
+    thread drains the bounded queue and writes batches with insert_many when
+    either batch_size records are waiting or flush_interval seconds have
+    passed. If MongoDB is unreachable, batches are spilled to JSON-lines files
+    in spill_dir and replayed once the database is back. Records the server
+    rejects would be rejected again on replay, so they are counted and
+    dropped instead.
+    """
+
+    def __init__(self,
+                 mongo_uri: str = 'mongodb://localhost:27017/heartdisease',
+                 collection: str = 'beat_predictions',
+                 max_queue: int = 10000,
+                 batch_size: int = 500,
+                 flush_interval: float = 1.0,
+                 spill_dir: str = 'prediction_spill'):
+        self.client = MongoClient(mongo_uri, serverSelectionTimeoutMS=2000)
+        self.db = self.client.get_default_database('heartdisease')
+        self.collection_name = collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_dir = spill_dir
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.spilled = 0
+        self.rejected = 0
+        self._stop = threading.Event()
+        self._collection = None
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, prediction: Dict[str, Any], device_id: Optional[str] = None,
+               patient_id: Optional[str] = None) -> None:
+        """Queue one prediction; drops the oldest record when the queue is full"""
+        record = {
+            'ts': datetime.utcnow(),
+            'meta': {'deviceId': device_id, 'patientId': patient_id},
+            **prediction
+        }
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                # Backpressure: shed the stalest record rather than stall inference
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Flush what is queued and stop the writer thread"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _get_collection(self):
+        if self._collection is None:
+            try:
+                self.db.create_collection(
+                    self.collection_name,
+                    timeseries={'timeField': 'ts', 'metaField': 'meta', 'granularity': 'seconds'}
+                )
+            except (CollectionInvalid, OperationFailure):
+                # Already exists, or a server without time-series support
+                pass
+            self._collection = self.db[self.collection_name]
+        return self._collection
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self.queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            lost = batch
+            try:
+                if self._write(batch):
+                    lost = []
+                    self._replay_spill()
+                else:
+                    self._spill(batch)
+                    lost = []
+            except Exception as e:
+                # A full disk or unreadable spill directory must not end the writer thread
+                self.dropped += len(lost)
+                logger.error("Prediction sink failed", extra={"lost": len(lost), "error": str(e)})
+
+    def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        """Insert a batch; False only when the database could not be reached and it should be spilled"""
+        try:
+            self._get_collection().insert_many(batch, ordered=False)
+            self.written += len(batch)
+        except (AutoReconnect, ServerSelectionTimeoutError, NetworkTimeout) as e:
+            logger.warning("Prediction sink write failed, spilling to disk", extra={"batch": len(batch), "error": str(e)})
+            # Forget the handle so the collection is re-created on recovery
+            self._collection = None
+            return False
+        except BulkWriteError as e:
+            # Unordered: the rest of the batch was inserted; the rejects would fail again
+            failed = len(e.details.get('writeErrors', []))
+            self.written += len(batch) - failed
+            self.rejected += failed
+            logger.error("Prediction sink records rejected, dropping them",
+                         extra={"batch": len(batch), "rejected": failed, "error": str(e)})
+        except PyMongoError as e:
+            self.rejected += len(batch)
+            logger.error("Prediction sink batch rejected, dropping it", extra={"batch": len(batch), "error": str(e)})
+        return True
+
+    def _spill(self, batch: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        _write_spill_file(os.path.join(self.spill_dir, f"spill-{time.time_ns()}.jsonl"), batch)
+        self.spilled += len(batch)
+
+    def _replay_spill(self) -> None:
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, 'spill-*.jsonl'))):
+            try:
+                with open(path) as f:
+                    batch = [json.loads(line) for line in f if line.strip()]
+                for record in batch:
+                    record['ts'] = datetime.fromisoformat(record['ts'])
+            except (ValueError, KeyError) as e:
+                # Set a corrupt file aside rather than retry it before every batch
+                logger.error("Unreadable prediction spill file", extra={"path": path, "error": str(e)})
+                os.replace(path, path + '.bad')
+                continue
+
+            if batch and not self._write(batch):
+                # Still unreachable
+                return
+            os.remove(path)
+            self.spilled -= len(batch)
+
+
+def _write_spill_file(path: str, records: List[Dict[str, Any]]) -> None:
+    # Written aside and renamed, so a crash never leaves a half-written file to replay
+    with open(path + '.tmp', 'w') as f:
+        for record in records:
+            record = {**record, 'ts': record['ts'].isoformat()}
+            record.pop('_id', None)
+            f.write(json.dumps(record) + '\n')
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,209 @@
+import atexit
+import cProfile
+import functools
+import inspect
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+MODES = ('off', 'cprofile', 'sample')
+
+
+class Profiler:
+    """
+    Profiles a random fraction of calls to @profiled functions.
+
+    mode 'cprofile' runs the sampled call under cProfile and accumulates one
+    pstats file per name (<name>.prof, for snakeviz/flameprof). mode 'sample'
+    has a background thread capture the stack of threads inside a sampled call
+    every `interval` seconds and accumulates collapsed stacks (<name>.folded,
+    for flamegraph.pl or speedscope). With mode 'off' a wrapped call costs one
+    attribute check.
+    """
+
+    def __init__(self, mode: str = 'off', rate: float = 0.01, output_dir: str = 'profiles',
+                 interval: float = 0.005):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.mode = 'off'
+        self.rate = rate
+        self.enabled = False
+        self._lock = threading.Lock()
+        # cProfile cannot run two profilers at once on 3.12+, so one at a time
+        self._cprofile_lock = threading.Lock()
+        self._local = threading.local()
+        self._stats: Dict[str, pstats.Stats] = {}
+        self._stacks: Dict[str, Counter] = defaultdict(Counter)
+        self._active: Dict[int, str] = {}
+        self._calls: Counter = Counter()
+        self._sampler: Optional[threading.Thread] = None
+        self.configure(mode, rate)
+
+    @classmethod
+    def from_env(cls) -> 'Profiler':
+        return cls(
+            mode=os.environ.get('PROFILE_MODE', 'off'),
+            rate=float(os.environ.get('PROFILE_SAMPLE_RATE', 0.01)),
+            output_dir=os.environ.get('PROFILE_DIR', 'profiles'),
+            interval=float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000.0
+        )
+
+    def configure(self, mode: Optional[str] = None, rate: Optional[float] = None) -> None:
+        if mode is not None:
+            if mode not in MODES:
+                raise ValueError(f"Unknown profiling mode {mode!r}, expected one of {', '.join(MODES)}")
+            self.mode = mode
+        if rate is not None:
+            if not 0.0 <= rate <= 1.0:
+                raise ValueError("Sample rate must be between 0 and 1")
+            self.rate = rate
+        self.enabled = self.mode != 'off' and self.rate > 0
+        if self.mode == 'sample':
+            self._ensure_sampler()
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'mode': self.mode,
+                'rate': self.rate,
+                'output_dir': os.path.abspath(self.output_dir),
+                'profiled_calls': dict(self._calls),
+                'pending': sorted(set(self._stats) | set(self._stacks))
+            }
+
+    def wrap(self, name: str, fn):
+        # A generator's work happens as it is iterated, not when it is called
+        generator = inspect.isgeneratorfunction(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not self.enabled or random.random() >= self.rate or getattr(self._local, 'active', False):
+                return fn(*args, **kwargs)
+            if generator:
+                return self._profile_items(name, fn(*args, **kwargs))
+            return self._profile_call(name, fn, args, kwargs)
+        return wrapper
+
+    def _profile_items(self, name: str, items):
+        """Profile each step of a generator, leaving out the consumer's time between steps"""
+        with self._lock:
+            self._calls[name] += 1
+        try:
+            while True:
+                try:
+                    item = self._profile_call(name, next, (items,), {}, count=False)
+                except StopIteration:
+                    return
+                yield item
+        finally:
+            items.close()
+
+    def _profile_call(self, name: str, fn, args, kwargs, count: bool = True):
+        self._local.active = True
+        try:
+            if self.mode == 'cprofile':
+                if not self._cprofile_lock.acquire(blocking=False):
+                    return fn(*args, **kwargs)
+                if count:
+                    with self._lock:
+                        self._calls[name] += 1
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                    try:
+                        return fn(*args, **kwargs)
+                    finally:
+                        profile.disable()
+                finally:
+                    self._cprofile_lock.release()
+                    self._merge_stats(name, profile)
+
+            thread_id = threading.get_ident()
+            with self._lock:
+                if count:
+                    self._calls[name] += 1
+                self._active[thread_id] = name
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active.pop(thread_id, None)
+        finally:
+            self._local.active = False
+
+    def _merge_stats(self, name: str, profile: cProfile.Profile) -> None:
+        with self._lock:
+            if name in self._stats:
+                self._stats[name].add(profile)
+            else:
+                self._stats[name] = pstats.Stats(profile)
+
+    def _ensure_sampler(self) -> None:
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._sample_loop, name='profiler-sampler', daemon=True)
+            self._sampler.start()
+
+    def _sample_loop(self) -> None:
+        while self.mode == 'sample':
+            time.sleep(self.interval)
+            with self._lock:
+                active = list(self._active.items())
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for thread_id, name in active:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    stack = _collapse(frame)
+                    with self._lock:
+                        self._stacks[name][stack] += 1
+
+    def dump(self) -> List[str]:
+        """Write accumulated profiles to output_dir, reset them, and return the paths"""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            stacks, self._stacks = self._stacks, defaultdict(Counter)
+        if not stats and not stacks:
+            return []
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        written = []
+        for name, collected in stats.items():
+            path = os.path.join(self.output_dir, f"{name}-{stamp}.prof")
+            collected.dump_stats(path)
+            written.append(path)
+        for name, counts in stacks.items():
+            path = os.path.join(self.output_dir, f"{name}-{stamp}.folded")
+            with open(path, 'w') as f:
+                for stack, count in counts.most_common():
+                    f.write(f"{stack} {count}\n")
+            written.append(path)
+        return written
+
+
+def _collapse(frame) -> str:
+    """Render a frame's stack root-first in flamegraph's collapsed format"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+PROFILER = Profiler.from_env()
+# Whatever was collected since the last dump is written on shutdown
+atexit.register(PROFILER.dump)
+
+
+def profiled(name: str):
+    """Decorator profiling a sampled fraction of calls when PROFILER is enabled"""
+    def decorator(fn):
+        return PROFILER.wrap(name, fn)
+    return decorator
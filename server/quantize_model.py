@@ -0,0 +1,164 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from typing import Dict, Iterator, List, Optional
+import numpy as np
+from ecg_pipeline import DEFAULT_SPEC, InputSpec, decode_predictions, spec_path
+from synthetic_ecg import load_sample_beat, synthetic_beats
+
+MODES = ('dynamic', 'int8', 'float16')
+
+
+def calibration_windows(count: int = 500, seed: int = 0) -> np.ndarray:
+    """The recorded sample beat plus synthetic beats, as (n, WINDOW_SIZE) windows"""
+    return np.vstack([load_sample_beat()[None, :], synthetic_beats(count - 1, seed=seed)])
+
+
+def evaluation_windows(count: int = 1000, seed: int = 1, recording: Optional[str] = None,
+                       spec: InputSpec = DEFAULT_SPEC) -> np.ndarray:
+    """Held-out beats for the parity check: a recording's beats if given, else fresh synthetic ones"""
+    if recording:
+        from batch_classify import iter_recording
+        from ecg_pipeline import BeatSegmenter
+        segmenter = BeatSegmenter(spec.threshold, spec.window, spec.peak_index)
+        windows = [segmenter.feed(chunk)[1] for chunk in iter_recording(recording)]
+        return np.vstack(windows)[:count]
+    return np.vstack([load_sample_beat()[None, :], synthetic_beats(count - 1, seed=seed)])
+
+
+def quantize(keras_model, mode: str, calibration: np.ndarray, spec: InputSpec = DEFAULT_SPEC) -> bytes:
+    """
+    Convert to TFLite. 'dynamic' stores int8 weights with float activations,
+    'int8' is full integer post-training quantization calibrated on
+    `calibration` (shaped by `spec`), and 'float16' halves the weights only.
+    """
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if mode == 'int8':
+        def representative_dataset() -> Iterator[List[np.ndarray]]:
+            for window in calibration:
+                yield [spec.prepare(window[None, :])]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    elif mode == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode != 'dynamic':
+        raise ValueError(f"Unknown quantization mode {mode!r}, expected one of {', '.join(MODES)}")
+
+    return converter.convert()
+
+
+def single_beat_latency(model, inputs: np.ndarray, warmup: int = 20) -> Dict[str, float]:
+    """
+    One direct call per beat. Keras predict() adds per-call setup that a
+    TFLite invoke does not have, so both models are called as model(x).
+    """
+    from bench_inference import percentiles, time_calls
+    return percentiles(time_calls(lambda x: np.asarray(model(x[None], training=False)), list(inputs), warmup))
+
+
+def parity_report(reference, candidate, windows: np.ndarray, spec: InputSpec = DEFAULT_SPEC) -> Dict:
+    """Compare candidate labels against the reference model's labels on the same windows"""
+    inputs = spec.prepare(windows)
+    reference_probs = np.asarray(reference.predict(inputs, verbose=0))
+    candidate_probs = np.asarray(candidate.predict(inputs, verbose=0))
+    reference_labels, _ = decode_predictions(reference_probs)
+    candidate_labels, _ = decode_predictions(candidate_probs)
+
+    per_class = {}
+    for index, label in spec.classes.items():
+        mask = reference_labels == index
+        if mask.any():
+            per_class[label] = {
+                'beats': int(mask.sum()),
+                'agreement': float((candidate_labels[mask] == index).mean())
+            }
+
+    return {
+        'beats': len(windows),
+        'label_agreement': float((reference_labels == candidate_labels).mean()),
+        'per_class': per_class,
+        'max_probability_delta': float(np.abs(reference_probs - candidate_probs).max())
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantize the arrhythmia model to TFLite and check it against the original")
+    parser.add_argument("--model", default="arrhythmia_detection_model1.h5")
+    parser.add_argument("--mode", choices=MODES, default="int8")
+    parser.add_argument("--output", help="Defaults to <model>.<mode>.tflite")
+    parser.add_argument("--calibration-beats", type=int, default=500)
+    parser.add_argument("--eval-beats", type=int, default=1000)
+    parser.add_argument("--recording", help="Evaluate on beats segmented from this recording")
+    parser.add_argument("--latency-beats", type=int, default=300)
+    parser.add_argument("--cold-start-runs", type=int, default=1, help="Fresh-process loads for memory figures (0 skips)")
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="Fail below this label agreement")
+    parser.add_argument("--report", help="Write the JSON report here as well")
+    args = parser.parse_args()
+
+    import tensorflow as tf
+    from model_loader import TFLiteModel
+
+    output = args.output or f"{os.path.splitext(args.model)[0]}.{args.mode}.tflite"
+    keras_model = tf.keras.models.load_model(args.model)
+    spec = InputSpec.for_model(keras_model, args.model)
+
+    started = time.perf_counter()
+    with open(output, 'wb') as f:
+        f.write(quantize(keras_model, args.mode, calibration_windows(args.calibration_beats), spec))
+    if os.path.exists(spec_path(args.model)):
+        # The quantized model is served with the same overrides as the original
+        shutil.copyfile(spec_path(args.model), spec_path(output))
+    print(f"Wrote {output} in {time.perf_counter() - started:.1f}s")
+
+    quantized = TFLiteModel(output)
+    windows = evaluation_windows(args.eval_beats, recording=args.recording, spec=spec)
+    latency_inputs = spec.prepare(windows[:args.latency_beats])
+
+    original_latency = single_beat_latency(keras_model, latency_inputs)
+    quantized_latency = single_beat_latency(quantized, latency_inputs)
+    original_size = os.path.getsize(args.model)
+    quantized_size = os.path.getsize(output)
+
+    report = {
+        'mode': args.mode,
+        'model': os.path.abspath(args.model),
+        'output': os.path.abspath(output),
+        'parity': parity_report(keras_model, quantized, windows, spec),
+        'size_bytes': {'original': original_size, 'quantized': quantized_size},
+        'size_reduction': 1 - quantized_size / original_size,
+        'latency_ms': {'original': original_latency, 'quantized': quantized_latency},
+        'speedup_p50': original_latency['p50'] / quantized_latency['p50']
+    }
+
+    if args.cold_start_runs:
+        from bench_inference import bench_cold_start
+        original_memory = bench_cold_start(args.model, args.cold_start_runs)['memory_mb']['rss']
+        quantized_cold = bench_cold_start(output, args.cold_start_runs)
+        quantized_memory = quantized_cold['memory_mb']['rss']
+        report['memory_mb'] = {
+            'original': original_memory,
+            'quantized': quantized_memory,
+            'saving': original_memory - quantized_memory,
+            # 'tensorflow.lite' means the quantized figure still includes TensorFlow
+            'quantized_loader': quantized_cold['loader']
+        }
+
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    agreement = report['parity']['label_agreement']
+    if agreement < args.min_agreement:
+        print(f"Label agreement {agreement:.2%} is below {args.min_agreement:.2%}")
+        sys.exit(1)
@@ -0,0 +1,213 @@
+import logging
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import wraps
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+from flask import jsonify, request
+from metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = Counter('rate_limited_total', 'Requests rejected by a rate limit', ('route',))
+INFERENCE_SHED = Counter('inference_shed_total', 'Requests turned away because every inference slot was busy')
+INFERENCE_IN_FLIGHT = Gauge('inference_in_flight', 'Requests currently holding an inference slot')
+
+PERIODS = {'s': 1.0, 'sec': 1.0, 'm': 60.0, 'min': 60.0, 'h': 3600.0, 'hour': 3600.0}
+RULE = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*/\s*([a-z]+)\s*(?::\s*(\d+))?\s*$')
+# Idle buckets are dropped after this many take() calls
+SWEEP_EVERY = 1024
+
+
+class Rule(NamedTuple):
+    rate: float  # tokens per second
+    burst: int
+
+
+def parse_rule(text: str) -> Optional[Rule]:
+    """'20/s', '10/m:5' (burst 5) or 'off'; None disables the limit"""
+    if text.strip().lower() in ('off', '0', ''):
+        return None
+    match = RULE.match(text.lower())
+    if not match or match.group(2) not in PERIODS or float(match.group(1)) <= 0:
+        raise ValueError(f"Invalid rate limit '{text}'; expected e.g. '20/s', '10/m:5' or 'off'")
+    count = float(match.group(1))
+    return Rule(count / PERIODS[match.group(2)], int(match.group(3) or max(1, math.ceil(count))))
+
+
+def _refill(tokens: float, updated: float, now: float, rule: Rule) -> float:
+    return min(rule.burst, tokens + (now - updated) * rule.rate)
+
+
+class LocalBuckets:
+    """Token buckets in this process's memory"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float, float]] = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def take(self, key: str, rule: Rule) -> float:
+        """Take a token: 0.0 when allowed, otherwise seconds until one is available"""
+        now = time.monotonic()
+        with self._lock:
+            self._calls += 1
+            if self._calls % SWEEP_EVERY == 0:
+                # A bucket that has refilled completely is the same as no bucket
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+            tokens, updated, _ = self._buckets.get(key, (rule.burst, now, now))
+            tokens = _refill(tokens, updated, now, rule)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            self._buckets[key] = (tokens, now, now + (rule.burst - tokens) / rule.rate)
+        return 0.0 if allowed else (1.0 - tokens) / rule.rate
+
+
+class SqliteBuckets:
+    """
+    Token buckets in a SQLite file, shared by every worker process on the
+    host (gunicorn workers, several server.py instances). Each take() is one
+    short write transaction. If the database is unavailable or locked for
+    too long the request is allowed; the limiter must not become an outage.
+    """
+
+    def __init__(self, path: str, timeout: float = 0.5):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._calls = 0
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS buckets '
+                         '(key TEXT PRIMARY KEY, tokens REAL, updated REAL, full_at REAL)')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        return conn
+
+    def take(self, key: str, rule: Rule) -> float:
+        # Wall clock: monotonic time is not comparable across processes
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+                tokens = _refill(*row, now, rule) if row else float(rule.burst)
+                allowed = tokens >= 1.0
+                if allowed:
+                    tokens -= 1.0
+                conn.execute('INSERT OR REPLACE INTO buckets VALUES (?, ?, ?, ?)',
+                             (key, tokens, now, now + (rule.burst - tokens) / rule.rate))
+                self._calls += 1
+                if self._calls % SWEEP_EVERY == 0:
+                    conn.execute('DELETE FROM buckets WHERE full_at <= ?', (now,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as e:
+            logger.warning("Rate limit store unavailable, allowing request", extra={"error": str(e)})
+            return 0.0
+        return 0.0 if allowed else (1.0 - tokens) / rule.rate
+
+
+def client_ip() -> str:
+    """
+    The caller's address. Client-supplied ids (X-User-Id and the like) are
+    not used: a caller could send a new one per request and never run out
+    of tokens. Key on a user only once requests carry an authenticated one.
+    """
+    return request.remote_addr or 'unknown'
+
+
+class RateLimiter:
+    """
+    Per-route token-bucket limits, keyed by a function of the request
+    (client_ip by default).
+
+    Each route's rule comes from RATE_LIMIT_<NAME> (e.g. RATE_LIMIT_PREDICT=
+    '50/s:100'), falling back to the default given at the route. RATE_LIMITS=off
+    turns every limit off. With RATE_LIMIT_DB set, buckets live in that SQLite
+    file and are shared by all workers on the host; otherwise each process
+    keeps its own.
+    """
+
+    def __init__(self, buckets=None, enabled: bool = True):
+        self.buckets = buckets or LocalBuckets()
+        self.enabled = enabled
+
+    @classmethod
+    def from_env(cls) -> 'RateLimiter':
+        path = os.environ.get('RATE_LIMIT_DB')
+        return cls(
+            buckets=SqliteBuckets(path) if path else LocalBuckets(),
+            enabled=os.environ.get('RATE_LIMITS', 'on').lower() not in ('off', '0', 'false')
+        )
+
+    def limit(self, name: str, default: str, key: Callable[[], str] = client_ip):
+        rule = parse_rule(os.environ.get(f'RATE_LIMIT_{name.upper()}', default))
+
+        def decorator(fn):
+            if rule is None or not self.enabled:
+                return fn
+
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                retry_after = self.buckets.take(f"{name}:{key()}", rule)
+                if retry_after:
+                    RATE_LIMITED.inc(route=name)
+                    response = jsonify({"error": "Too many requests", "retryAfter": round(retry_after, 3)})
+                    response.headers['Retry-After'] = str(math.ceil(retry_after))
+                    return response, 429
+                return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+class AdmissionGate:
+    """
+    Caps concurrent inference in this process. A request waits at most
+    `wait` seconds for a slot and is then turned away, so overload shows up
+    as fast 503s rather than a growing queue of slow requests. slots <= 0
+    admits everything.
+    """
+
+    def __init__(self, slots: int, wait: float = 0.05):
+        self.slots = slots
+        self.wait = wait
+        self._semaphore = threading.BoundedSemaphore(slots) if slots > 0 else None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        INFERENCE_IN_FLIGHT.set_function(lambda: self._in_flight)
+
+    @classmethod
+    def from_env(cls) -> 'AdmissionGate':
+        return cls(
+            slots=int(os.environ.get('INFERENCE_MAX_CONCURRENCY', max(2, (os.cpu_count() or 4) // 2))),
+            wait=float(os.environ.get('INFERENCE_ADMISSION_WAIT_MS', 50)) / 1000.0
+        )
+
+    def acquire(self) -> bool:
+        if self._semaphore is not None and not self._semaphore.acquire(timeout=self.wait):
+            INFERENCE_SHED.inc()
+            return False
+        with self._lock:
+            self._in_flight += 1
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+
+RATE_LIMITS = RateLimiter.from_env()
+INFERENCE_GATE = AdmissionGate.from_env()
@@ -0,0 +1,45 @@
+from datetime import datetime, time, timedelta, timezone
+from typing import Any
+
+# How report dates travel to and from clients
+DATE_FORMAT = '%Y-%m-%d'
+
+
+def parse_report_date(value: Any) -> datetime:
+    """
+    A report date from a client ('YYYY-MM-DD' or an ISO 8601 timestamp) as
+    the naive UTC datetime Mongo stores; ValueError for anything else.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str) and value.strip():
+        text = value.strip()
+        if text.endswith(('Z', 'z')):
+            text = text[:-1] + '+00:00'
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            raise ValueError(f"Invalid date '{value}'. Expected YYYY-MM-DD or an ISO 8601 timestamp.")
+    else:
+        raise ValueError(f"Invalid date {value!r}. Expected YYYY-MM-DD or an ISO 8601 timestamp.")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_range_end(value: str) -> datetime:
+    """Exclusive upper bound for a ?to= value; a bare day includes the whole day"""
+    end = parse_report_date(value)
+    if len(value.strip()) == len('YYYY-MM-DD'):
+        end += timedelta(days=1)
+    return end
+
+
+def format_report_date(value: Any) -> Any:
+    """Stored date back to the client form: 'YYYY-MM-DD' for whole days, ISO 8601 otherwise"""
+    if not isinstance(value, datetime):
+        # Not yet migrated (see migrate_report_dates.py)
+        return value
+    if value.time() == time(0):
+        return value.strftime(DATE_FORMAT)
+    return value.isoformat() + 'Z'
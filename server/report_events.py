@@ -0,0 +1,129 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional
+from pymongo.errors import OperationFailure, PyMongoError
+from report_dates import format_report_date
+
+logger = logging.getLogger(__name__)
+
+
+class ReportSubscription:
+    """A single push client, filtered by doctorName and/or patientId"""
+
+    def __init__(self, doctor_name: Optional[str] = None, patient_id: Optional[str] = None, max_queue: int = 256):
+        self.doctor_name = doctor_name
+        self.patient_id = patient_id
+        self.events = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.doctor_name and event.get('doctorName') != self.doctor_name:
+            return False
+        if self.patient_id and event.get('patientId') != self.patient_id:
+            return False
+        return True
+
+
+class ReportEventBus:
+    """
+    Fans out small report deltas to subscribed clients.
+
+    When the patients collection supports change streams (replica set or
+    sharded cluster) a background thread tails it, so writes from every
+    worker process are seen. Otherwise the model publishes in-process after
+    each successful write.
+    """
+
+    # Fields small enough to ship with every delta
+    DELTA_FIELDS = ('id', 'patientId', 'patientName', 'doctorName', 'heartClass', 'status', 'date', 'revision')
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.change_stream_active = False
+
+    def subscribe(self, doctor_name: Optional[str] = None, patient_id: Optional[str] = None) -> ReportSubscription:
+        subscription = ReportSubscription(doctor_name, patient_id)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: ReportSubscription) -> None:
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            if not subscription.matches(event):
+                continue
+            try:
+                subscription.events.put_nowait(event)
+            except queue.Full:
+                # A stalled client must never block writers; it can re-fetch
+                subscription.dropped += 1
+
+    def publish_local(self, op: str, report: Optional[Dict[str, Any]], changed: Optional[Dict[str, Any]] = None) -> None:
+        """Called by the model after a write; a no-op while the change stream is live"""
+        if self.change_stream_active or not report:
+            return
+        self.publish(self.make_delta(op, report, changed))
+
+    @classmethod
+    def make_delta(cls, op: str, report: Dict[str, Any], changed: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        delta = {'op': op, '_id': str(report.get('_id', ''))}
+        for field in cls.DELTA_FIELDS:
+            if field in report:
+                delta[field] = report[field]
+        if 'date' in delta:
+            delta['date'] = format_report_date(delta['date'])
+        if changed:
+            delta['changed'] = {k: v for k, v in changed.items() if k not in ('_id', 'updatedAt')}
+        return delta
+
+    def start_change_stream(self, collection) -> None:
+        """Tail the collection's change stream in a daemon thread"""
+        threading.Thread(target=self._watch, args=(collection,), daemon=True).start()
+
+    def _watch(self, collection) -> None:
+        resume_token = None
+        while True:
+            try:
+                with collection.watch(
+                    [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace']}}}],
+                    full_document='updateLookup',
+                    resume_after=resume_token
+                ) as stream:
+                    self.change_stream_active = True
+                    logger.info("Report change stream active")
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        self._publish_change(change)
+            except (OperationFailure, NotImplementedError, TypeError) as e:
+                # Standalone servers (and stand-ins like mongomock) have no change streams
+                self.change_stream_active = False
+                logger.info("Change streams unavailable, using in-process publish", extra={"reason": str(e)})
+                return
+            except PyMongoError as e:
+                self.change_stream_active = False
+                logger.warning("Report change stream interrupted", extra={"error": str(e)})
+                time.sleep(2)
+
+    def _publish_change(self, change: Dict[str, Any]) -> None:
+        report = change.get('fullDocument')
+        if not report:
+            return
+
+        changed = None
+        if change['operationType'] == 'update':
+            changed = change.get('updateDescription', {}).get('updatedFields')
+        op = 'insert' if change['operationType'] == 'insert' else 'update'
+        self.publish(self.make_delta(op, report, changed))
+
+
+# Shared by the model (publisher) and the push endpoint (subscribers)
+report_events = ReportEventBus()
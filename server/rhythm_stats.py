@@ -0,0 +1,164 @@
+import math
+import threading
+from collections import deque
+from typing import Dict, Iterable, Optional
+import numpy as np
+from ecg_pipeline import CLASS_LABELS
+
+# R-R intervals outside this range (seconds) are missed or spurious beats
+MIN_RR = 0.25
+MAX_RR = 3.0
+
+
+class RollingWindow:
+    """
+    Beat aggregates over the last `span` seconds of stream time, kept in a
+    fixed ring of `buckets` time buckets so memory does not grow with the
+    beat rate. Sums of R-R intervals, their squares and squared successive
+    differences give mean heart rate, SDNN and RMSSD without storing beats.
+    """
+
+    def __init__(self, span: float, buckets: int = 60, labels: Optional[Dict[int, str]] = None):
+        self.labels = labels or CLASS_LABELS
+        self.span = span
+        self.buckets = buckets
+        self.width = span / buckets
+        self._ids = np.full(buckets, -1, dtype=np.int64)
+        self._classes = np.zeros((buckets, max(self.labels) + 1), dtype=np.int64)
+        # rr count, rr sum, rr sum of squares, successive-difference count, sum of squares
+        self._rr = np.zeros((buckets, 5))
+
+    def _bucket(self, t: float) -> int:
+        bucket_id = int(t // self.width)
+        slot = bucket_id % self.buckets
+        if self._ids[slot] != bucket_id:
+            self._ids[slot] = bucket_id
+            self._classes[slot] = 0
+            self._rr[slot] = 0.0
+        return slot
+
+    def add(self, t: float, class_index: Optional[int], rr: Optional[float], successive: Optional[float]) -> None:
+        slot = self._bucket(t)
+        if class_index is not None:
+            self._classes[slot, class_index] += 1
+        if rr is not None:
+            self._rr[slot, :3] += (1, rr, rr * rr)
+        if successive is not None:
+            self._rr[slot, 3:] += (1, successive * successive)
+
+    def summary(self, now: float) -> Dict:
+        current = int(now // self.width)
+        live = (self._ids > current - self.buckets) & (self._ids <= current)
+        classes = self._classes[live].sum(axis=0)
+        rr_n, rr_sum, rr_sumsq, sd_n, sd_sumsq = self._rr[live].sum(axis=0)
+
+        result = {
+            'beats': int(classes.sum()),
+            'classes': {self.labels.get(i, str(i)): int(count) for i, count in enumerate(classes)},
+            'heart_rate_bpm': None,
+            'sdnn_ms': None,
+            'rmssd_ms': None
+        }
+        if rr_n:
+            mean_rr = rr_sum / rr_n
+            result['heart_rate_bpm'] = round(60.0 / mean_rr, 1)
+            result['sdnn_ms'] = round(math.sqrt(max(rr_sumsq / rr_n - mean_rr * mean_rr, 0.0)) * 1000.0, 1)
+        if sd_n:
+            result['rmssd_ms'] = round(math.sqrt(sd_sumsq / sd_n) * 1000.0, 1)
+        return result
+
+
+class RhythmStats:
+    """
+    Per-stream rhythm summary built one beat at a time: heart rate and HRV
+    from R-R intervals, class histograms over rolling windows (1, 5 and 60
+    minutes by default) and runs of consecutive V beats.
+
+    Time is stream time (sample index / sample_rate), so replayed recordings
+    summarise the same way as live ones.
+    """
+
+    def __init__(self, sample_rate: float = 360.0, windows: Iterable[int] = (60, 300, 3600),
+                 labels: Optional[Dict[int, str]] = None):
+        labels = labels or CLASS_LABELS
+        self.sample_rate = sample_rate
+        self.windows = {f"{span // 60}m": RollingWindow(span, labels=labels) for span in windows}
+        self._lock = threading.Lock()
+        self._label_index = {label: index for index, label in labels.items()}
+        self.beats = 0
+        self.last_time = 0.0
+        self._last_peak = None
+        self._last_rr = None
+        # Peaks of skipped beats not yet passed by a recorded one
+        self._breaks = deque()
+        self.v_run = 0
+        self.longest_v_run = 0
+        self.v_couplets = 0
+        self.v_runs = 0
+
+    def add_beat(self, peak_sample: int, label: str) -> None:
+        t = peak_sample / self.sample_rate
+        class_index = self._label_index.get(label)
+
+        with self._lock:
+            rr = successive = None
+            # A beat skipped in between would make this interval two beats long
+            skipped = self._last_peak is not None and any(self._last_peak < peak < peak_sample for peak in self._breaks)
+            while self._breaks and self._breaks[0] < peak_sample:
+                self._breaks.popleft()
+            if self._last_peak is not None and not skipped:
+                interval = (peak_sample - self._last_peak) / self.sample_rate
+                if MIN_RR <= interval <= MAX_RR:
+                    rr = interval
+                    if self._last_rr is not None:
+                        successive = rr - self._last_rr
+            self._last_peak = peak_sample
+            # A gap breaks the R-R chain; the next interval starts fresh
+            self._last_rr = rr
+
+            for window in self.windows.values():
+                window.add(t, class_index, rr, successive)
+            self.beats += 1
+            self.last_time = t
+
+            if label == 'V':
+                self.v_run += 1
+                self.longest_v_run = max(self.longest_v_run, self.v_run)
+            else:
+                self._close_v_run()
+
+    def break_chain(self, peak_sample: Optional[int] = None) -> None:
+        """
+        A beat was seen but not classified (quality reject, shed). No R-R
+        interval is measured across its peak, so a dropped beat doesn't pass
+        for one slow one. Beats classified out of order by worker processes
+        are placed against the peak; without one the chain simply restarts.
+        """
+        with self._lock:
+            if peak_sample is None:
+                self._last_peak = None
+                self._last_rr = None
+            else:
+                self._breaks.append(peak_sample)
+
+    def _close_v_run(self) -> None:
+        if self.v_run == 2:
+            self.v_couplets += 1
+        elif self.v_run >= 3:
+            self.v_runs += 1
+        self.v_run = 0
+
+    def summary(self) -> Dict:
+        with self._lock:
+            now = self.last_time
+            return {
+                'beats': self.beats,
+                'stream_time_s': round(now, 3),
+                'windows': {name: window.summary(now) for name, window in self.windows.items()},
+                'ventricular': {
+                    'current_run': self.v_run,
+                    'longest_run': self.longest_v_run,
+                    'couplets': self.v_couplets,
+                    'runs': self.v_runs
+                }
+            }
@@ -1,3 +1,6 @@
+import os
+import time
+import logging
 from flask import Flask, jsonify, request
 from flask_cors import CORS  # ✅ Import CORS
 import tensorflow as tf
@@ -16,11 +19,45 @@ from controller.patient_controller import (
     get_patient_controller,
     update_patient_status_controller,
     edit_patient_controller,
-    get_patient_reports_by_user_id_controller
+    get_patient_reports_by_user_id_controller,
+    get_patient_timeline_controller,
+    stream_patient_updates_controller
 )
-from extension import mongo, bcrypt 
+from controller.admin_controller import (
+    get_profiling_controller,
+    update_profiling_controller,
+    dump_profiling_controller,
+    get_models_controller,
+    load_model_controller,
+    update_shadow_controller,
+    promote_shadow_controller,
+    rollback_model_controller
+)
+from controller.job_controller import (
+    submit_job_controller,
+    list_jobs_controller,
+    get_job_controller,
+    cancel_job_controller,
+    stream_job_results_controller
+)
+from model.reportModel import PatientModel
+from report_events import report_events
+from extension import mongo, bcrypt, compress
+from log_config import configure_logging
+import metrics
+import json_provider
+from profiling import profiled
+from model_registry import MODELS
+from batch_jobs import JOBS
+from prediction_cache import PredictionCache
+from device_preprocessing import prepare_window
+from beat_payload import decode_predict_request, PayloadError
+from rate_limit import RATE_LIMITS, INFERENCE_GATE, client_ip
+
 
 
+configure_logging()
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
@@ -28,33 +65,39 @@ app = Flask(__name__)
 CORS(app)  # ✅ Allows requests from any domain
 
 # MongoDB Configuration
-app.config["MONGO_URI"] = "mongodb://localhost:27017/heartdisease"
+app.config["MONGO_URI"] = os.environ.get("MONGO_URI", "mongodb://localhost:27017/heartdisease")
 mongo.init_app(app)  # ✅ Initialize Mongo
 bcrypt.init_app(app)  # ✅ Initialize Bcrypt
+json_provider.init_app(app)  # jsonify Mongo documents as-is (orjson when installed)
+metrics.init_app(app)  # Per-route latency and GET /metrics
+compress.init_app(app)  # Gzip/brotli for large JSON bodies
 
 
 if mongo.db is None:
-    print("MongoDB connection failed!")  # Debugging log
+    logger.error("MongoDB connection failed!")
 
 # Verify connection
 try:
     mongo.db.users.find_one()
-    print("MongoDB Connected Successfully!")
+    logger.info("MongoDB Connected Successfully!")
 except Exception as e:
-    print(f"MongoDB connection error: {e}")
+    logger.error("MongoDB connection error", extra={"error": str(e)})
 
+try:
+    PatientModel.ensure_indexes()
+except Exception as e:
+    logger.warning("Could not create report indexes", extra={"error": str(e)})
 
-# Load ML Model
-model = tf.keras.models.load_model('arrhythmia_detection_model1.h5')
+# Push report changes to dashboards (falls back to in-process publish)
+report_events.start_change_stream(PatientModel.patients_collection)
 
-# Class labels mapping
-CLASS_LABELS = {
-    0: '/', 
-    1: 'L', 
-    2: 'N', 
-    3: 'R',  
-    4: 'V'
-}
+# Load ML Model (MODEL_PATH may point at a quantized .tflite build);
+# later versions are swapped in through /api/v1/admin/models
+MODELS.load()
+# Identical beats (retries, re-submissions) are scored once per model version
+prediction_cache = PredictionCache.from_env('server')
+# Long recordings are classified by background workers (see batch_jobs.py)
+JOBS.start()
 
 @app.route('/')
 def hello_world():
@@ -64,10 +107,12 @@ def hello_world():
 
 # Routes
 @app.route("/api/v1/register", methods=["POST"])
+@RATE_LIMITS.limit('register', '5/m', key=client_ip)
 def register():
     return register_controller()
 
 @app.route("/api/v1/login", methods=["POST"])
+@RATE_LIMITS.limit('login', '10/m', key=client_ip)
 def login():
     return login_controller()
 
@@ -96,11 +141,20 @@ def add_patient():
 def get_all_patients():
     return get_all_patients_controller()
 
+# Push report updates to dashboards (Server-Sent Events)
+@app.route("/api/v1/patients/stream", methods=["GET"])
+def stream_patient_updates():
+    return stream_patient_updates_controller()
+
 # Route 6: Get Patient Reports by User ID
 @app.route("/api/v1/patients/user/<user_id>", methods=["GET"])
 def get_patient_reports_by_user_id(user_id):
     return get_patient_reports_by_user_id_controller(user_id)
 
+@app.route("/api/v1/patients/user/<user_id>/timeline", methods=["GET"])
+def get_patient_timeline(user_id):
+    return get_patient_timeline_controller(user_id)
+
 # ✅ Route 3: Get a Specific Patient by ID
 @app.route("/api/v1/patients/<patient_id>", methods=["GET"])
 def get_patient(patient_id):
@@ -120,62 +174,130 @@ def edit_patient(patient_id):
 @app.route("/api/v1/users/<user_id>", methods=["GET"])
 def get_user_by_id(user_id):
     from controller.userController import get_user_by_id_controller
-    print(get_user_by_id_controller(user_id))
     return get_user_by_id_controller(user_id)
 
+# Admin: runtime profiling switch (see profiling.py)
+@app.route("/api/v1/admin/profiling", methods=["GET"])
+def get_profiling():
+    return get_profiling_controller()
 
-# Data Preprocessing
-def preprocess_input(arrhythmia):
-    expected_shape = (10, 20, 1)  
-    actual_length = len(arrhythmia)
+@app.route("/api/v1/admin/profiling", methods=["PUT"])
+def update_profiling():
+    return update_profiling_controller()
+
+@app.route("/api/v1/admin/profiling/dump", methods=["POST"])
+def dump_profiling():
+    return dump_profiling_controller()
+
+# Admin: model versions, hot reload and shadow scoring (see model_registry.py)
+@app.route("/api/v1/admin/models", methods=["GET"])
+def get_models():
+    return get_models_controller()
+
+@app.route("/api/v1/admin/models", methods=["POST"])
+def load_new_model():
+    return load_model_controller()
+
+@app.route("/api/v1/admin/models/shadow", methods=["PUT"])
+def update_shadow():
+    return update_shadow_controller()
 
-    if actual_length > 200:
-        arrhythmia = arrhythmia[:200]  
-    elif actual_length < 200:   
-        arrhythmia = np.pad(arrhythmia, (0, 200 - actual_length), mode='constant')
+@app.route("/api/v1/admin/models/shadow/promote", methods=["POST"])
+def promote_shadow():
+    return promote_shadow_controller()
 
-    arrhythmia = np.array(arrhythmia).reshape(1, 10, 20, 1)  
-    return arrhythmia
+@app.route("/api/v1/admin/models/rollback", methods=["POST"])
+def rollback_model():
+    return rollback_model_controller()
+
+# Batch classification jobs (see batch_jobs.py)
+@app.route("/api/v1/jobs", methods=["POST"])
+def submit_job():
+    return submit_job_controller()
+
+@app.route("/api/v1/jobs", methods=["GET"])
+def list_jobs():
+    return list_jobs_controller()
+
+@app.route("/api/v1/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    return get_job_controller(job_id)
+
+@app.route("/api/v1/jobs/<job_id>/cancel", methods=["POST"])
+def cancel_job(job_id):
+    return cancel_job_controller(job_id)
+
+@app.route("/api/v1/jobs/<job_id>/results", methods=["GET"])
+def stream_job_results(job_id):
+    return stream_job_results_controller(job_id)
+
+
+# Data Preprocessing
+def preprocess_input(arrhythmia, spec=None):
+    """One beat, as samples or per-lead sample lists, shaped by the model's input spec"""
+    spec = spec or MODELS.active.spec
+    arrhythmia = np.asarray(arrhythmia, dtype=np.float32)
+    if arrhythmia.ndim == 2:
+        # Clients send [lead][sample]; the model takes samples with leads interleaved
+        return spec.prepare(arrhythmia.T[None, :, :])
+    return spec.prepare(arrhythmia[None, :])
 
 # Prediction Function
-def predict(arrhythmia):
-    arrhythmia = preprocess_input(arrhythmia)
-    prediction = model.predict(arrhythmia)
+def predict(arrhythmia, spec=None):
+    arrhythmia = preprocess_input(arrhythmia, spec)
+    started = time.perf_counter()
+    prediction, model_version = prediction_cache.predict(MODELS, arrhythmia)
+    metrics.observe_inference('server', len(arrhythmia), time.perf_counter() - started)
 
     if prediction.shape[1] == 1:
         predicted_class = int(prediction[0][0] >= 0.5)  
     else:
         predicted_class = int(np.argmax(prediction))  
     
-    return predicted_class
+    return predicted_class, model_version
 
 @app.route("/predict", methods=["POST"])
+@RATE_LIMITS.limit('predict', '50/s:100')
+@profiled('predict_route')
 def predict_route():
     try:
-        data = request.json
-        if not data or "beatData" not in data:
-            return jsonify({"error": "Invalid input. Expected 'beatData' key with a list of values."}), 400
-        
-        arrhythmia = data["beatData"]
-        if not isinstance(arrhythmia, list) or not all(isinstance(i, (int, float)) for i in arrhythmia):
-            return jsonify({"error": "Invalid data format. 'beatData' must be a list of numbers."}), 400
+        spec = MODELS.active.spec
+        # JSON (orjson when installed) or a raw float32 body, straight to a validated array
+        try:
+            arrhythmia, options = decode_predict_request(request, spec.leads)
+        except PayloadError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Beats recorded at another rate or scale are brought to the model's
+        if arrhythmia.shape[-1] and (options['sampleRate'] or options['removeBaseline'] or options['normalize']):
+            leads = arrhythmia if spec.leads > 1 else [arrhythmia]
+            leads = [prepare_window(lead, options['sampleRate'], options['removeBaseline'], options['normalize'],
+                                    max_samples=spec.window, target_rate=spec.sample_rate)
+                     for lead in leads]
+            arrhythmia = np.stack(leads) if spec.leads > 1 else leads[0]
         
-        print(f"Input data length: {len(arrhythmia)}")
-
-        processed_data = preprocess_input(arrhythmia)
-        print(f"Processed shape: {processed_data.shape}")
-
-        predicted_class_idx = predict(arrhythmia)
-        predicted_class_label = CLASS_LABELS.get(predicted_class_idx, "Unknown")
+        logger.debug("Predict request", extra={"input_length": arrhythmia.shape[-1]})
+
+        # Shed rather than queue once every inference slot is busy
+        if not INFERENCE_GATE.acquire():
+            response = jsonify({"error": "Server busy, retry shortly", "status": "error"})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        try:
+            predicted_class_idx, model_version = predict(arrhythmia, spec)
+        finally:
+            INFERENCE_GATE.release()
+        predicted_class_label = spec.classes.get(predicted_class_idx, "Unknown")
 
         return jsonify({
             "predicted_class_index": predicted_class_idx,
             "predicted_class_label": predicted_class_label,
+            "model_version": model_version,
             "status": "success"
         })
 
     except Exception as e:
-        print(f"Prediction error: {str(e)}")
+        logger.exception("Prediction error")
         return jsonify({"error": str(e), "status": "error"}), 500
 
 if __name__ == '__main__':
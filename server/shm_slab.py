@@ -0,0 +1,233 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+from multiprocessing import shared_memory
+from typing import Any, Iterator, Optional, Tuple
+import numpy as np
+from ecg_pipeline import WINDOW_SIZE, CLASS_LABELS
+
+logger = logging.getLogger(__name__)
+
+# Task queue sentinel; every real task is a (slot, generation) pair
+STOP = -1
+
+
+class BeatSlab:
+    """
+    Fixed pool of beat windows in one shared memory block: a (capacity,
+    window) float32 array of inputs followed by a (capacity, outputs)
+    float32 array of model outputs. Multi-lead windows are stored
+    interleaved, window = samples x leads (see InputSpec.size). Processes attached to the same block
+    exchange only slot indices; the windows and probabilities never go
+    through pickling.
+
+    Slots are handed out and returned by the creating process only.
+    """
+
+    def __init__(self, capacity: int = 256, window: int = WINDOW_SIZE, outputs: int = len(CLASS_LABELS),
+                 name: Optional[str] = None):
+        self.capacity = capacity
+        self.window = window
+        self.outputs = outputs
+        self.owner = name is None
+        size = capacity * (window + outputs) * np.dtype(np.float32).itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.windows = np.ndarray((capacity, window), dtype=np.float32, buffer=self.shm.buf)
+        self.results = np.ndarray((capacity, outputs), dtype=np.float32, buffer=self.shm.buf,
+                                  offset=self.windows.nbytes)
+        self._free = deque(range(capacity))
+        self._lock = threading.Lock()
+
+    @property
+    def spec(self) -> Tuple[int, int, int, str]:
+        """Arguments for attach() in another process"""
+        return self.capacity, self.window, self.outputs, self.shm.name
+
+    @classmethod
+    def attach(cls, capacity: int, window: int, outputs: int, name: str) -> 'BeatSlab':
+        return cls(capacity, window, outputs, name=name)
+
+    @property
+    def in_use(self) -> int:
+        return self.capacity - len(self._free)
+
+    def allocate(self) -> Optional[int]:
+        """A free slot index, or None when every slot is in flight"""
+        with self._lock:
+            return self._free.popleft() if self._free else None
+
+    def release(self, slot: int) -> None:
+        with self._lock:
+            self._free.append(slot)
+
+    def close(self) -> None:
+        # Views must go before the mapping can be closed
+        del self.windows, self.results
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _inference_worker(spec, model_path: str, tasks, done, max_batch: int) -> None:
+    """Worker process: score slots as they arrive, batching whatever is already queued"""
+    from model_registry import ModelRegistry
+
+    slab = BeatSlab.attach(*spec)
+    model = ModelRegistry().load(model_path)
+    done.put(('ready',))
+    stopping = False
+    while not stopping:
+        batch = [tasks.get()]
+        if batch[0] == STOP:
+            break
+        while len(batch) < max_batch:
+            try:
+                task = tasks.get_nowait()
+            except queue.Empty:
+                break
+            if task == STOP:
+                stopping = True
+                break
+            batch.append(task)
+        slots = [slot for slot, _ in batch]
+        slab.results[slots] = model.predict(model.spec.prepare(slab.windows[slots]))
+        for slot, generation in batch:
+            done.put(('done', slot, generation))
+    slab.close()
+
+
+class InferencePool:
+    """
+    Model inference in `workers` separate processes, fed through a BeatSlab.
+
+    submit() copies a window into a free slot and queues its index; the
+    caller's ingest thread never waits for the model. completed() yields
+    (slot, probabilities, context) in submission order, so per-stream state
+    such as R-R intervals sees beats in order even when workers finish out
+    of order. The probabilities and slab.windows[slot] are views into shared
+    memory, valid until the caller releases the slot.
+
+    Workers use the spawn start method: forking a process that has already
+    imported TensorFlow is not safe.
+
+    completed() checks every `check_interval` seconds that the workers are
+    alive. When one has died (OOM, a crash in TF) the workers are restarted
+    on fresh queues, since a process killed inside get() or put() can leave
+    a queue's lock held, and every slot still in flight is queued again.
+    Each submission carries a generation number, so a result for a slot
+    that has been requeued or reused since is ignored.
+    """
+
+    def __init__(self, model_path: str, workers: int = 2, capacity: int = 256, max_batch: int = 16,
+                 window: int = WINDOW_SIZE, outputs: int = len(CLASS_LABELS), check_interval: float = 1.0):
+        self.slab = BeatSlab(capacity, window, outputs)
+        self.model_path = model_path
+        self.max_batch = max_batch
+        self.check_interval = check_interval
+        self._mp = multiprocessing.get_context('spawn')
+        self.tasks = self._mp.Queue()
+        self.done = self._mp.Queue()
+        self.processes = [self._start_worker(i) for i in range(workers)]
+        for _ in self.processes:
+            self.done.get()
+        logger.info("Inference workers ready", extra={"workers": workers, "slots": capacity})
+        self.restarts = 0
+        self._closing = False
+        self._lock = threading.Lock()
+        self._order = deque()
+        self._finished = set()
+        self._generation = [0] * capacity
+        # Caller data per slot; stays in this process
+        self._context = [None] * capacity
+
+    def _start_worker(self, index: int):
+        process = self._mp.Process(target=_inference_worker,
+                                   args=(self.slab.spec, self.model_path, self.tasks, self.done, self.max_batch),
+                                   name=f"inference-{index}", daemon=True)
+        process.start()
+        return process
+
+    def submit(self, window, context: Any = None) -> Optional[int]:
+        """Queue one window for scoring; None when all slots are in flight"""
+        slot = self.slab.allocate()
+        if slot is None:
+            return None
+        window = np.asarray(window, dtype=np.float32)[:self.slab.window]
+        self.slab.windows[slot, :len(window)] = window
+        self.slab.windows[slot, len(window):] = 0.0
+        self._context[slot] = context
+        with self._lock:
+            self._generation[slot] += 1
+            self._order.append(slot)
+            self.tasks.put((slot, self._generation[slot]))
+        return slot
+
+    def _check_workers(self) -> None:
+        """Restart the workers if any has died and requeue every slot still in flight"""
+        dead = [process for process in self.processes if not process.is_alive()]
+        if not dead or self._closing:
+            return
+        for process in dead:
+            logger.error("Inference worker died, restarting workers",
+                         extra={"worker": process.name, "exitcode": process.exitcode})
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+            process.join(timeout=5)
+
+        with self._lock:
+            for old in (self.tasks, self.done):
+                # Nobody will read what is left in them
+                old.cancel_join_thread()
+                old.close()
+            self.tasks = self._mp.Queue()
+            self.done = self._mp.Queue()
+            self.processes = [self._start_worker(index) for index in range(len(self.processes))]
+            pending = [slot for slot in self._order if slot not in self._finished]
+            for slot in pending:
+                self.tasks.put((slot, self._generation[slot]))
+        self.restarts += len(dead)
+        logger.warning("Requeued in-flight beats", extra={"beats": len(pending)})
+
+    def completed(self) -> Iterator[Tuple[int, np.ndarray, Any]]:
+        """Block for results in submission order until close()"""
+        checked = time.monotonic()
+        while True:
+            try:
+                message = self.done.get(timeout=self.check_interval)
+            except queue.Empty:
+                message = None
+            if time.monotonic() - checked >= self.check_interval:
+                self._check_workers()
+                checked = time.monotonic()
+            if message is None or message[0] == 'ready':
+                continue
+            if message[0] == 'stop':
+                return
+            _, slot, generation = message
+            if generation != self._generation[slot] or slot in self._finished or slot not in self._order:
+                # Scored twice after a restart requeued it
+                continue
+            self._finished.add(slot)
+            while self._order and self._order[0] in self._finished:
+                ready = self._order.popleft()
+                self._finished.discard(ready)
+                yield ready, self.slab.results[ready], self._context[ready]
+
+    def release(self, slot: int) -> None:
+        self._context[slot] = None
+        self.slab.release(slot)
+
+    def close(self) -> None:
+        self._closing = True
+        for _ in self.processes:
+            self.tasks.put(STOP)
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        self.done.put(('stop',))
+        self.slab.close()
@@ -0,0 +1,114 @@
+import math
+from typing import Dict, Optional, Tuple
+import numpy as np
+from ecg_pipeline import WINDOW_SIZE
+
+
+class SignalQualityGate:
+    """
+    Streaming signal quality index over the last `window` samples.
+
+    Each update() is O(1): running sums over ring buffers give the window's
+    spread (flatline / lead-off), the share of samples at or beyond the
+    clipping level (saturation), the drift of a slow baseline estimate
+    across the window (baseline wander), and the energy of the second
+    difference relative to the signal (high-frequency noise). check()
+    compares them against the limits and names the first one that fails.
+    """
+
+    def __init__(self, window: int = WINDOW_SIZE, sample_rate: float = 360.0,
+                 min_std: float = 0.01,
+                 clip_level: float = 1.5,
+                 max_clipped: float = 0.02,
+                 max_wander: float = 0.3,
+                 max_noise: float = 0.6,
+                 baseline_seconds: float = 0.6):
+        self.window = window
+        self.sample_rate = sample_rate
+        self.baseline_seconds = baseline_seconds
+        self.min_std = min_std
+        self.clip_level = clip_level
+        self.max_clipped = max_clipped
+        self.max_wander = max_wander
+        self.max_noise = max_noise
+        # Single-pole low-pass; slower than QRS/T so it tracks the baseline only
+        self.alpha = 1.0 - math.exp(-1.0 / (baseline_seconds * sample_rate))
+
+        self._x = np.zeros(window)
+        self._d2 = np.zeros(window)
+        self._flag = np.zeros(window, dtype=np.int8)
+        self._baseline = np.zeros(window)
+        self._i = 0
+        self.count = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._d2sum = 0.0
+        self._flagged = 0
+        self._prev1 = None
+        self._prev2 = None
+        self._level = None
+
+    def resized(self, window: int, sample_rate: float) -> 'SignalQualityGate':
+        """A fresh gate with the same limits for another window length and rate"""
+        return SignalQualityGate(window, sample_rate, min_std=self.min_std, clip_level=self.clip_level,
+                                 max_clipped=self.max_clipped, max_wander=self.max_wander,
+                                 max_noise=self.max_noise, baseline_seconds=self.baseline_seconds)
+
+    def update(self, value: float) -> None:
+        value = float(value)
+        i = self._i
+
+        d2 = 0.0
+        if self._prev2 is not None:
+            d2 = (value - 2.0 * self._prev1 + self._prev2) ** 2
+        flagged = int(abs(value) >= self.clip_level)
+        self._level = value if self._level is None else self._level + self.alpha * (value - self._level)
+
+        old = self._x[i]
+        self._sum += value - old
+        self._sumsq += value * value - old * old
+        self._d2sum += d2 - self._d2[i]
+        self._flagged += flagged - self._flag[i]
+
+        self._x[i] = value
+        self._d2[i] = d2
+        self._flag[i] = flagged
+        self._baseline[i] = self._level
+        self._prev2, self._prev1 = self._prev1, value
+        self._i = (i + 1) % self.window
+        self.count += 1
+
+        # Re-sum once per window so subtraction error cannot accumulate
+        if self._i == 0:
+            self._sum = float(self._x.sum())
+            self._sumsq = float(np.dot(self._x, self._x))
+            self._d2sum = float(self._d2.sum())
+
+    def metrics(self) -> Dict[str, float]:
+        n = min(self.count, self.window)
+        if n < 3:
+            return {}
+        mean = self._sum / n
+        std = math.sqrt(max(self._sumsq / n - mean * mean, 0.0))
+        oldest = self._baseline[self._i] if self.count >= self.window else self._baseline[0]
+        return {
+            'std': std,
+            'clipped': self._flagged / n,
+            'wander': abs(self._level - oldest),
+            'noise': math.sqrt(max(self._d2sum, 0.0) / n) / std if std > 0 else 0.0
+        }
+
+    def check(self) -> Tuple[bool, Optional[str], Dict[str, float]]:
+        """(acceptable, reason, metrics) for the current window"""
+        metrics = self.metrics()
+        if not metrics:
+            return False, 'warming_up', metrics
+        if metrics['std'] < self.min_std:
+            return False, 'flatline', metrics
+        if metrics['clipped'] > self.max_clipped:
+            return False, 'clipping', metrics
+        if metrics['wander'] > self.max_wander:
+            return False, 'baseline_wander', metrics
+        if metrics['noise'] > self.max_noise:
+            return False, 'noise', metrics
+        return True, None, metrics
@@ -0,0 +1,70 @@
+from typing import Optional
+import numpy as np
+from ecg_pipeline import WINDOW_SIZE, BEAT_PEAK_INDEX
+
+# (centre offset from the R peak in samples at 360 Hz, width, amplitude)
+_WAVES = {
+    'P': (-70, 9.0, 0.12),
+    'Q': (-8, 3.0, -0.10),
+    'R': (0, 4.0, 0.95),
+    'S': (8, 3.5, -0.14),
+    'T': (95, 18.0, 0.25),
+}
+
+
+def load_sample_beat(path: str = 'sample_ecg_data.txt') -> np.ndarray:
+    """The single hand-recorded beat shipped with the server"""
+    with open(path) as f:
+        return np.array(f.read().replace('\n', ',').strip(', ').split(','), dtype=np.float32)
+
+
+def _beat_shapes(count: int, rng: np.random.Generator) -> np.ndarray:
+    """Sum of Gaussian P, Q, R, S and T waves with per-beat jitter, zero baseline"""
+    t = np.arange(WINDOW_SIZE, dtype=np.float32) - BEAT_PEAK_INDEX
+    beats = np.zeros((count, WINDOW_SIZE), dtype=np.float32)
+
+    for centre, width, amplitude in _WAVES.values():
+        centres = centre * rng.uniform(0.9, 1.1, (count, 1))
+        widths = width * rng.uniform(0.8, 1.4, (count, 1))
+        amplitudes = amplitude * rng.uniform(0.8, 1.2, (count, 1))
+        beats += amplitudes * np.exp(-0.5 * ((t - centres) / widths) ** 2)
+    return beats
+
+
+def synthetic_beats(count: int, seed: Optional[int] = 0, noise: float = 0.01) -> np.ndarray:
+    """
+    Generate (count, WINDOW_SIZE) PQRST-shaped beats centred like the
+    detector's windows, with random amplitude, width, baseline and noise.
+    """
+    rng = np.random.default_rng(seed)
+    beats = _beat_shapes(count, rng)
+    beats += rng.uniform(-0.1, 0.0, (count, 1))
+    beats += rng.normal(0.0, noise, beats.shape)
+    return beats.astype(np.float32)
+
+
+def synthetic_stream(seconds: float, sample_rate: float = 360.0, heart_rate: float = 72.0,
+                     seed: Optional[int] = 0, noise: float = 0.01) -> np.ndarray:
+    """A continuous ECG trace built from synthetic beats at a jittered heart rate"""
+    if sample_rate != 360.0:
+        # Wave widths are in 360 Hz samples; resample the trace rather than stretch them
+        trace = synthetic_stream(seconds, 360.0, heart_rate, seed, noise)
+        times = np.arange(int(seconds * sample_rate)) / sample_rate
+        return np.interp(times, np.arange(len(trace)) / 360.0, trace).astype(np.float32)
+
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    signal = rng.normal(-0.05, noise, total).astype(np.float32)
+
+    mean_rr = sample_rate * 60.0 / heart_rate
+    peaks = []
+    position = float(BEAT_PEAK_INDEX)
+    while position < total:
+        peaks.append(int(position))
+        position += mean_rr * rng.uniform(0.9, 1.1)
+
+    for peak, beat in zip(peaks, _beat_shapes(len(peaks), rng)):
+        start = peak - BEAT_PEAK_INDEX
+        end = min(start + WINDOW_SIZE, total)
+        signal[start:end] += beat[:end - start]
+    return signal
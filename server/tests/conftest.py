@@ -0,0 +1,10 @@
+import os
+import sys
+import mongomock
+import pymongo
+
+# Server modules are imported flat, as server.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Models connect at import time; give them an in-memory server
+mongomock.patch(servers=(('localhost', 27017),)).start()
@@ -0,0 +1,94 @@
+import threading
+import time
+import pytest
+from model.jobModel import JobModel, QUEUED, RUNNING, COMPLETED
+
+
+@pytest.fixture(autouse=True)
+def empty_queue():
+    for collection in (JobModel.jobs_collection, JobModel.users_collection):
+        collection.delete_many({})
+
+
+class SlowCollection:
+    """A collection whose calls take a moment, like a real round trip, so claims interleave"""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attribute = getattr(self._collection, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            time.sleep(0.002)
+            return attribute(*args, **kwargs)
+        return call
+
+
+@pytest.fixture
+def slow_database(monkeypatch):
+    monkeypatch.setattr(JobModel, 'jobs_collection', SlowCollection(JobModel.jobs_collection))
+    monkeypatch.setattr(JobModel, 'users_collection', SlowCollection(JobModel.users_collection))
+
+
+def claim_concurrently(workers: int, user_limit: int):
+    barrier = threading.Barrier(workers)
+    claimed = []
+
+    def claim(name):
+        barrier.wait()
+        job = JobModel.claim_next(name, user_limit)
+        if job:
+            claimed.append(job)
+
+    threads = [threading.Thread(target=claim, args=(f'worker-{i}',)) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return claimed
+
+
+@pytest.mark.parametrize('round_', range(20))
+def test_concurrent_claims_respect_user_limit(round_, slow_database):
+    for _ in range(4):
+        JobModel.create('alice', {}, 5, {})
+
+    claimed = claim_concurrently(4, user_limit=1)
+
+    assert len(claimed) == 1
+    assert JobModel.jobs_collection.count_documents({'status': RUNNING}) == 1
+
+
+def test_other_users_are_not_blocked(slow_database):
+    JobModel.create('alice', {}, 9, {})
+    JobModel.create('alice', {}, 9, {})
+    JobModel.create('bob', {}, 1, {})
+
+    claimed = claim_concurrently(3, user_limit=1)
+
+    assert sorted(job['userId'] for job in claimed) == ['alice', 'bob']
+
+
+def test_finish_frees_the_slot():
+    JobModel.create('alice', {}, 5, {})
+    JobModel.create('alice', {}, 5, {})
+    first = JobModel.claim_next('worker', 1)
+    assert JobModel.claim_next('worker', 1) is None
+
+    JobModel.finish(first['_id'], COMPLETED)
+
+    second = JobModel.claim_next('worker', 1)
+    assert second is not None and second['_id'] != first['_id']
+
+
+def test_requeue_stale_frees_the_slot():
+    JobModel.create('alice', {}, 5, {})
+    job = JobModel.claim_next('worker', 1)
+    JobModel.jobs_collection.update_one({'_id': job['_id']}, {'$set': {'heartbeatAt': job['startedAt'].replace(year=2000)}})
+
+    assert JobModel.requeue_stale(60) == 1
+    assert JobModel.get(job['_id'])['status'] == QUEUED
+    assert JobModel.claim_next('worker', 1)['_id'] == job['_id']
@@ -0,0 +1,325 @@
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+
+# One index record per flushed chunk: wall-clock time of its first sample
+# and that sample's position in the device's continuous sample stream.
+INDEX_DTYPE = np.dtype([('start_time', '<f8'), ('first_sample', '<i8')])
+
+
+class WaveformWriter:
+    """
+    Append-only writer for one device. Samples are buffered in memory and
+    written as raw little-endian float32 or int16 to fixed-size segment files.
+    A device that changes its sample rate gets an entry in meta.json's
+    'rate_changes' ([first_sample, rate] pairs) from that sample on.
+    """
+
+    def __init__(self, device_dir: str, sample_rate: float = 360.0, dtype: str = 'float32',
+                 scale: float = 1.0 / 8192, segment_samples: int = 360 * 600, flush_samples: int = 360):
+        self.device_dir = device_dir
+        os.makedirs(device_dir, exist_ok=True)
+
+        meta_path = os.path.join(device_dir, 'meta.json')
+        if os.path.exists(meta_path):
+            # Existing archives keep their on-disk format
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+        else:
+            if dtype not in ('float32', 'int16'):
+                raise ValueError("dtype must be 'float32' or 'int16'")
+            self.meta = {
+                'sample_rate': sample_rate,
+                'dtype': dtype,
+                'scale': scale if dtype == 'int16' else 1.0,
+                'segment_samples': segment_samples
+            }
+            self._write_meta()
+
+        self.dtype = np.dtype(self.meta['dtype']).newbyteorder('<')
+        self.flush_samples = flush_samples
+        self.total_samples = _count_samples(device_dir, self.dtype, self.meta['segment_samples'])
+        self._pending = []
+        self._pending_start = None
+        self._lock = threading.Lock()
+
+    @property
+    def sample_rate(self) -> float:
+        """Rate of the samples currently being written"""
+        return rate_at(self.meta, self.total_samples + len(self._pending))
+
+    def _write_meta(self) -> None:
+        meta_path = os.path.join(self.device_dir, 'meta.json')
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def append(self, samples, start_time: Optional[float] = None, sample_rate: Optional[float] = None) -> None:
+        """
+        Buffer samples; start_time is the wall-clock time of the first one
+        and sample_rate the rate they were recorded at, if it may have changed
+        """
+        with self._lock:
+            if sample_rate and sample_rate != self.sample_rate:
+                self._set_rate_locked(float(sample_rate))
+            if self._pending_start is None:
+                self._pending_start = time.time() if start_time is None else start_time
+            self._pending.extend(np.atleast_1d(samples).tolist())
+            if len(self._pending) >= self.flush_samples:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _set_rate_locked(self, sample_rate: float) -> None:
+        # Samples already buffered were recorded at the old rate
+        self._flush_locked()
+        if self.total_samples == 0 and not self.meta.get('rate_changes'):
+            self.meta['sample_rate'] = sample_rate
+        else:
+            self.meta.setdefault('rate_changes', []).append([self.total_samples, sample_rate])
+        self._write_meta()
+
+    def _flush_locked(self) -> None:
+        if not self._pending:
+            return
+
+        values = np.asarray(self._pending, dtype=np.float32)
+        if self.dtype.kind == 'i':
+            values = np.clip(np.round(values / self.meta['scale']), -32768, 32767)
+        values = values.astype(self.dtype)
+
+        record = np.array([(self._pending_start, self.total_samples)], dtype=INDEX_DTYPE)
+        with open(os.path.join(self.device_dir, 'index.bin'), 'ab') as f:
+            f.write(record.tobytes())
+
+        segment_samples = self.meta['segment_samples']
+        offset = 0
+        while offset < len(values):
+            segment_no, position = divmod(self.total_samples, segment_samples)
+            count = min(segment_samples - position, len(values) - offset)
+            with open(_segment_path(self.device_dir, segment_no), 'ab') as f:
+                f.write(values[offset:offset + count].tobytes())
+            offset += count
+            self.total_samples += count
+
+        self._pending = []
+        self._pending_start = None
+
+
+class WaveformArchive:
+    """
+    Per-device ECG archive under root/<device_id>/ with memory-mapped reads.
+    Reading any time range only touches the segment files that overlap it.
+    """
+
+    def __init__(self, root: str = 'waveforms', **writer_options):
+        self.root = root
+        self.writer_options = writer_options
+        self._writers: Dict[str, WaveformWriter] = {}
+        self._lock = threading.Lock()
+
+    def _device_dir(self, device_id: str) -> str:
+        # Device ids are often URLs; keep them filesystem-safe
+        safe = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in str(device_id))
+        return os.path.join(self.root, safe)
+
+    def writer(self, device_id: str) -> WaveformWriter:
+        with self._lock:
+            if device_id not in self._writers:
+                self._writers[device_id] = WaveformWriter(self._device_dir(device_id), **self.writer_options)
+            return self._writers[device_id]
+
+    def append(self, device_id: str, samples, start_time: Optional[float] = None,
+               sample_rate: Optional[float] = None) -> None:
+        self.writer(device_id).append(samples, start_time, sample_rate)
+
+    def close(self) -> None:
+        with self._lock:
+            for writer in self._writers.values():
+                writer.flush()
+
+    def meta(self, device_id: str) -> Dict:
+        with open(os.path.join(self._device_dir(device_id), 'meta.json')) as f:
+            return json.load(f)
+
+    def _index(self, device_dir: str) -> np.ndarray:
+        path = os.path.join(device_dir, 'index.bin')
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype=INDEX_DTYPE)
+        return np.memmap(path, dtype=INDEX_DTYPE, mode='r')
+
+    def time_to_sample(self, device_id: str, timestamp: float) -> int:
+        """Map a wall-clock time onto the device's continuous sample counter"""
+        device_dir = self._device_dir(device_id)
+        index = self._index(device_dir)
+        if len(index) == 0:
+            return 0
+
+        meta = self.meta(device_id)
+        i = int(np.searchsorted(index['start_time'], timestamp, side='right')) - 1
+        if i < 0:
+            return int(index['first_sample'][0])
+
+        first = int(index['first_sample'][i])
+        # Gaps between chunks (device offline) must not run into the next chunk
+        if i + 1 < len(index):
+            upper = int(index['first_sample'][i + 1])
+        else:
+            dtype = np.dtype(meta['dtype']).newbyteorder('<')
+            upper = _count_samples(device_dir, dtype, meta['segment_samples'])
+
+        # A rate change always starts a new chunk, so one rate covers all of it
+        elapsed = min((timestamp - float(index['start_time'][i])) * rate_at(meta, first), upper - first)
+        return first + int(round(elapsed))
+
+    def rate_spans(self, device_id: str, first: int, last: int) -> List[Tuple[int, int, float]]:
+        """Split samples [first, last) into (first, last, sample_rate) runs of one rate"""
+        meta = self.meta(device_id)
+        changes = [change for change in meta.get('rate_changes', []) if first < change[0] < last]
+        bounds = [first] + [change[0] for change in changes] + [last]
+        return [(start, end, rate_at(meta, start)) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+    def read_samples(self, device_id: str, first: int, last: int) -> np.ndarray:
+        """Return samples [first, last) as float32 without loading whole segments"""
+        device_dir = self._device_dir(device_id)
+        meta = self.meta(device_id)
+        dtype = np.dtype(meta['dtype']).newbyteorder('<')
+        segment_samples = meta['segment_samples']
+
+        first = max(first, 0)
+        last = min(last, _count_samples(device_dir, dtype, segment_samples))
+        out = np.empty(max(last - first, 0), dtype=np.float32)
+
+        written = 0
+        position = first
+        while position < last:
+            segment_no, offset = divmod(position, segment_samples)
+            count = min(segment_samples - offset, last - position)
+            segment = np.memmap(_segment_path(device_dir, segment_no), dtype=dtype, mode='r')
+            out[written:written + count] = segment[offset:offset + count]
+            written += count
+            position += count
+
+        if dtype.kind == 'i':
+            out *= meta['scale']
+        return out
+
+    def read(self, device_id: str, start_time: float, end_time: float) -> np.ndarray:
+        """Return the samples recorded between two wall-clock times"""
+        first = self.time_to_sample(device_id, start_time)
+        last = self.time_to_sample(device_id, end_time)
+        return self.read_samples(device_id, first, last)
+
+
+class WaveformReplay:
+    """
+    Feed an archived time range back into a chunk consumer, e.g.
+    ECGArrhythmiaDetector.feed. speed is a multiple of real time;
+    speed <= 0 replays as fast as the consumer can keep up. Chunks never
+    straddle a change of the device's sample rate.
+    """
+
+    def __init__(self, archive: WaveformArchive, device_id: str, start_time: float, end_time: float,
+                 speed: float = 10.0, chunk_samples: int = 360):
+        self.archive = archive
+        self.device_id = device_id
+        self.first = archive.time_to_sample(device_id, start_time)
+        self.last = archive.time_to_sample(device_id, end_time)
+        self.spans = archive.rate_spans(device_id, self.first, self.last)
+        # Rate at the start of the range
+        self.sample_rate = self.spans[0][2] if self.spans else rate_at(archive.meta(device_id), self.first)
+        self.speed = speed
+        self.chunk_samples = chunk_samples
+
+    def rated_chunks(self) -> Iterator[Tuple[float, np.ndarray]]:
+        """(sample_rate, chunk) pairs covering the range"""
+        for first, last, rate in self.spans:
+            for position in range(first, last, self.chunk_samples):
+                yield rate, self.archive.read_samples(self.device_id, position, min(position + self.chunk_samples, last))
+
+    def chunks(self) -> Iterator[np.ndarray]:
+        for _, chunk in self.rated_chunks():
+            yield chunk
+
+    def run(self, consume: Callable[[np.ndarray], None], on_rate: Optional[Callable[[float], None]] = None) -> int:
+        """
+        Push the range through consume() one chunk at a time; returns the
+        number of samples replayed. on_rate(sample_rate) is called before the
+        first chunk and whenever the recorded rate changes.
+        """
+        replayed = 0
+        # Seconds of recording replayed so far
+        elapsed = 0.0
+        current_rate = None
+        started = time.monotonic()
+        for rate, chunk in self.rated_chunks():
+            if rate != current_rate:
+                current_rate = rate
+                if on_rate:
+                    on_rate(rate)
+            consume(chunk)
+            replayed += len(chunk)
+            elapsed += len(chunk) / rate
+
+            if self.speed > 0:
+                # Pace against the archive clock rather than sleeping per chunk
+                due = started + elapsed / self.speed
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        return replayed
+
+
+def rate_at(meta: Dict, sample: int) -> float:
+    """Sample rate in force at a position of the device's sample stream"""
+    rate = meta['sample_rate']
+    for first, changed in meta.get('rate_changes', []):
+        if first > sample:
+            break
+        rate = changed
+    return rate
+
+
+def _segment_path(device_dir: str, segment_no: int) -> str:
+    return os.path.join(device_dir, f'seg-{segment_no:06d}.bin')
+
+
+def _count_samples(device_dir: str, dtype: np.dtype, segment_samples: int) -> int:
+    segment_no = 0
+    total = 0
+    while os.path.exists(_segment_path(device_dir, segment_no)):
+        samples = os.path.getsize(_segment_path(device_dir, segment_no)) // dtype.itemsize
+        total += samples
+        if samples < segment_samples:
+            break
+        segment_no += 1
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay an archived ECG range through the arrhythmia detector")
+    parser.add_argument("device_id")
+    parser.add_argument("--root", default="waveforms")
+    parser.add_argument("--start", type=float, default=0.0, help="Unix time of the first sample (default: beginning)")
+    parser.add_argument("--end", type=float, default=float("inf"), help="Unix time to stop at (default: end)")
+    parser.add_argument("--speed", type=float, default=10.0, help="Multiple of real time, 0 for unpaced")
+    parser.add_argument("--model", default="arrhythmia_detection_model1.h5")
+    args = parser.parse_args()
+
+    from beat import ECGArrhythmiaDetector
+    from device_preprocessing import DevicePreprocessor
+
+    replay = WaveformReplay(WaveformArchive(args.root), args.device_id, args.start, args.end, speed=args.speed)
+    # Archives hold samples at the device's own rate
+    detector = ECGArrhythmiaDetector(model_path=args.model, device_id=args.device_id,
+                                     preprocessor=DevicePreprocessor(replay.sample_rate))
+
+    started = time.time()
+    count = replay.run(detector.feed, on_rate=detector.set_sample_rate)
+    print(f"Replayed {count} samples ({detector.beat_count} beats) in {time.time() - started:.1f}s")
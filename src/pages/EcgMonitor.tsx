@@ -14,6 +14,10 @@ import { Button } from "@/components/ui/button"
 import { Chart, registerables } from "chart.js"
 Chart.register(...registerables)
 
+// Device and prediction endpoints; override with VITE_* env vars (e.g. to point at ecg_simulator.py)
+const ECG_DEVICE_URL = import.meta.env.VITE_ECG_DEVICE_URL ?? "ws://192.168.0.110:81"
+const PREDICTION_WS_URL = import.meta.env.VITE_PREDICTION_WS_URL ?? "ws://localhost:8765"
+
 const EcgMonitor = () => {
   const navigate = useNavigate()
   // Configuration
@@ -330,7 +334,7 @@ const EcgMonitor = () => {
   // Connect to first WebSocket
   const connectWebSocket = () => {
     try {
-      websocketRef.current = new WebSocket("ws://192.168.0.110:81")
+      websocketRef.current = new WebSocket(ECG_DEVICE_URL)
 
       websocketRef.current.onopen = () => {
         setConnected(true)
@@ -406,7 +410,7 @@ const EcgMonitor = () => {
   // Connect to second WebSocket
   const connectSecondWebSocket = () => {
     try {
-      secondWebsocketRef.current = new WebSocket("ws://localhost:8765")
+      secondWebsocketRef.current = new WebSocket(PREDICTION_WS_URL)
 
       secondWebsocketRef.current.onopen = () => {
         setSecondConnected(true)